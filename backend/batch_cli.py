@@ -0,0 +1,234 @@
+# backend/batch_cli.py
+"""
+Пакетная обработка архива DXF-планов без HTTP.
+
+Примеры:
+    python batch_cli.py storage/plans
+    python batch_cli.py "uploads/plan_*.dxf" --mode v2 --workers 8 --out storage/batch_results
+
+Результат каждого файла пишется в <out>/<sha256 файла>.json. При повторном
+запуске уже обработанные хэши пропускаются, так что прерванный прогон
+можно просто перезапустить. Результат другого режима (--mode) не считается:
+такой файл обрабатывается заново, кроме результата режима both — он
+покрывает и v2, и geometry.
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import glob
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Tuple
+
+from result_store import file_sha256
+
+MODES = ("v2", "geometry", "both")
+DEFAULT_OUT_DIR = os.path.join("storage", "batch_results")
+
+
+# -----------------------------------------------------------
+# Поиск файлов и хэши
+# -----------------------------------------------------------
+
+def collect_plan_files(inputs: List[str]) -> List[Path]:
+    """Раскрывает каталоги и glob-шаблоны в отсортированный список DXF-файлов."""
+    found: Dict[str, Path] = {}
+    for item in inputs:
+        p = Path(item)
+        if p.is_dir():
+            candidates = [c for c in p.rglob("*") if c.suffix.lower() == ".dxf"]
+        elif p.is_file():
+            candidates = [p]
+        else:
+            candidates = [Path(c) for c in glob.glob(item, recursive=True)]
+        for c in candidates:
+            if c.is_file():
+                found[str(c.resolve())] = c
+    return [found[k] for k in sorted(found)]
+
+
+# -----------------------------------------------------------
+# Обработка одного файла (выполняется в процессе пула)
+# -----------------------------------------------------------
+
+def _process_plan(path: str, file_hash: str, mode: str, out_dir: str,
+                  section_path: str | None, verbose: bool,
+                  profile: bool = False, diagnostics: bool = False,
+                  low_memory: bool = False, memory_budget_mb: float | None = None,
+                  wall_workers: int = 1) -> Dict[str, Any]:
+    # Импорты внутри воркера: родительскому процессу ezdxf не нужен
+    import ezdxf
+    from dxf_parser_v2 import analyze_dxf_v2
+    from dxf_geometry import analyze_dxf_geometry
+    from profiling import BuildProfiler
+    from diagnostics import collect_diagnostics
+
+    if verbose:
+        # Отладочные сообщения анализаторов идут через logging
+        logging.basicConfig(level=logging.DEBUG, format="%(processName)s %(name)s: %(message)s")
+
+    out_base = Path(out_dir) / file_hash
+    t0 = time.perf_counter()
+    profiler = BuildProfiler() if profile else contextlib.nullcontext()
+    collector = collect_diagnostics() if diagnostics else contextlib.nullcontext()
+    memory = None
+    try:
+        with profiler, collector as diag:
+            if low_memory:
+                from low_memory import analyze_plan_low_memory
+                result = analyze_plan_low_memory(path, section_path, v2=mode in ("v2", "both"),
+                                                 geometry=mode in ("geometry", "both"),
+                                                 budget_mb=memory_budget_mb, doc_key=file_hash)
+                entities = result.pop("entities")
+                memory = result.pop("memory")
+            else:
+                doc = ezdxf.readfile(path)
+                entities = len(doc.modelspace())
+                result: Dict[str, Any] = {}
+                if mode in ("v2", "both"):
+                    result["v2"] = analyze_dxf_v2(doc, doc_key=file_hash)
+                if mode in ("geometry", "both"):
+                    result["geometry"] = analyze_dxf_geometry(path, section_path, doc=doc,
+                                                              wall_workers=wall_workers)
+    except Exception as e:
+        return {"path": path, "hash": file_hash, "ok": False, "error": str(e),
+                "entities": 0, "elapsed": time.perf_counter() - t0}
+
+    elapsed = time.perf_counter() - t0
+    record = {
+        "file_hash": file_hash,
+        "source_path": path,
+        "mode": mode,
+        "processed_at": datetime.utcnow().isoformat() + "Z",
+        "entities": entities,
+        "elapsed": round(elapsed, 4),
+        "result": result,
+    }
+    if profile:
+        profiler.save(out_base)
+        record["profile"] = profiler.summary()
+    if diag is not None:
+        record["diagnostics"] = diag.report()
+    if memory is not None:
+        record["memory"] = memory
+
+    # Пишем атомарно: недописанный файл не должен считаться обработанным
+    out_path = out_base.with_suffix(".json")
+    tmp_path = out_path.with_suffix(".json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(record, f, ensure_ascii=False)
+    os.replace(tmp_path, out_path)
+
+    return {"path": path, "hash": file_hash, "ok": True, "error": None,
+            "entities": entities, "elapsed": elapsed}
+
+
+# -----------------------------------------------------------
+# CLI
+# -----------------------------------------------------------
+
+def _is_done(out_path: Path, mode: str) -> bool:
+    """Есть ли уже результат, покрывающий режим mode."""
+    if not out_path.exists():
+        return False
+    try:
+        with open(out_path, encoding="utf-8") as f:
+            done_mode = json.load(f).get("mode")
+    except (OSError, ValueError):
+        # Повреждённый результат — обработать заново
+        return False
+    return done_mode in (mode, "both")
+
+
+def _plan_jobs(files: List[Path], out_dir: Path, mode: str) -> Tuple[List[Tuple[Path, str]], int]:
+    """Возвращает (задания, число пропущенных). Одинаковые файлы считаются один раз."""
+    jobs: List[Tuple[Path, str]] = []
+    seen = set()
+    skipped = 0
+    for path in files:
+        h = file_sha256(path)
+        if h in seen or _is_done(out_dir / f"{h}.json", mode):
+            skipped += 1
+            continue
+        seen.add(h)
+        jobs.append((path, h))
+    return jobs, skipped
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Пакетный анализ DXF-планов в пуле процессов.")
+    parser.add_argument("inputs", nargs="+", help="каталоги, файлы или glob-шаблоны DXF")
+    parser.add_argument("--mode", choices=MODES, default="both",
+                        help="v2 = analyze_dxf_v2, geometry = analyze_dxf_geometry, both = оба")
+    parser.add_argument("--out", default=DEFAULT_OUT_DIR, help="каталог для результатов")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--section", default=None, help="DXF разреза для режима geometry")
+    parser.add_argument("--verbose", action="store_true", help="отладочный лог анализаторов")
+    parser.add_argument("--profile", action="store_true",
+                        help="снять cProfile + tracemalloc, сохранить <hash>.prof рядом с результатом")
+    parser.add_argument("--diagnostics", action="store_true",
+                        help="добавить в результат счётчики стадий и примеры пропусков")
+    parser.add_argument("--low-memory", action="store_true",
+                        help="режим ограниченной памяти: документ освобождается до анализа, пары стен по плиткам")
+    parser.add_argument("--memory-budget", type=float, default=None, metavar="MB",
+                        help="бюджет RSS воркера в МБ (вместе с --low-memory), превышение — ошибка файла")
+    parser.add_argument("--wall-workers", type=int, default=1,
+                        help="процессов на поиск пар стен по плиткам внутри одного файла (режим geometry); "
+                             "у каждого воркера свой пул, workers × wall-workers не больше числа ядер")
+    args = parser.parse_args(argv)
+
+    out_dir = Path(args.out)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    files = collect_plan_files(args.inputs)
+    if not files:
+        print("Нет DXF-файлов для обработки.")
+        return 1
+
+    jobs, skipped = _plan_jobs(files, out_dir, args.mode)
+    print(f"Найдено файлов: {len(files)}, к обработке: {len(jobs)}, пропущено (дубликаты или уже обработаны): {skipped}")
+
+    done = failed = entities = 0
+    t0 = time.perf_counter()
+    if jobs:
+        workers = max(1, min(args.workers, len(jobs)))
+        # Каждый воркер держит свой пул поиска пар (dxf_walls.pair_pool)
+        wall_workers = max(1, min(args.wall_workers, (os.cpu_count() or 1) // workers))
+        if wall_workers < args.wall_workers:
+            print(f"--wall-workers снижено до {wall_workers}: {workers} воркеров на {os.cpu_count()} ядер")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(_process_plan, str(path), h, args.mode, str(out_dir),
+                            args.section, args.verbose, args.profile, args.diagnostics,
+                            args.low_memory, args.memory_budget, wall_workers)
+                for path, h in jobs
+            ]
+            for n, fut in enumerate(as_completed(futures), start=1):
+                res = fut.result()
+                name = Path(res["path"]).name
+                if res["ok"]:
+                    done += 1
+                    entities += res["entities"]
+                    print(f"[{n}/{len(jobs)}] OK   {name} ({res['entities']} ent., {res['elapsed']:.2f} s)")
+                else:
+                    failed += 1
+                    print(f"[{n}/{len(jobs)}] FAIL {name}: {res['error']}")
+    wall = time.perf_counter() - t0
+
+    rate_files = done / wall if wall > 0 else 0.0
+    rate_entities = entities / wall if wall > 0 else 0.0
+    print("-" * 50)
+    print(f"Обработано: {done}, ошибок: {failed}, пропущено: {skipped}, время: {wall:.2f} s")
+    print(f"Пропускная способность: {rate_files:.2f} files/s, {rate_entities:.0f} entities/s")
+    return 0 if failed == 0 else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,247 @@
+# backend/bench_regression.py
+"""
+Регрессионный бенчмарк на реальных планах с сохранённым baseline.
+
+Запускает полную сборку (чтение, стены, проёмы, помещения, топология, штриховки)
+на test_smart_walls.dxf и планах из storage/plans, считает медиану времени
+каждой стадии и хэш итоговой сцены, и сравнивает их с bench_baseline.json.
+
+Код возврата 1, если какая-то стадия медленнее baseline больше чем на
+--threshold (доля) или если изменился хэш сцены — оптимизация не должна
+незаметно менять результат. Намеренные изменения фиксируются через --update.
+
+--check-extents — отдельная проверка вместо бенчмарка: габариты dxf_inspect
+сверяются с ezdxf.bbox на тех же планах (ошибка инспектора не валит гейт
+производительности).
+
+Примеры:
+    python bench_regression.py
+    python bench_regression.py --repeats 5 --threshold 0.3
+    python bench_regression.py --update
+    python bench_regression.py --check-extents
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import platform
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import ezdxf
+from ezdxf import bbox
+
+from dxf_inspect import inspect_dxf
+from dxf_walls import analyze_walls
+from dxf_openings import analyze_openings
+from dxf_rooms import analyze_rooms
+from dxf_topology import analyze_topology
+from dxf_parser_v2 import extract_walls_v2
+
+BACKEND_DIR = Path(__file__).resolve().parent
+BASELINE_PATH = BACKEND_DIR / "bench_baseline.json"
+FIXTURES = [
+    BACKEND_DIR.parent / "test_smart_walls.dxf",
+    # Излом стен рядом с плотными линиями промежуточных углов (synthetic_plan --bent-walls)
+    BACKEND_DIR.parent / "test_bent_walls.dxf",
+    *sorted((BACKEND_DIR / "storage" / "plans").glob("*.dxf")),
+]
+
+STAGES = ("read", "walls", "openings", "rooms", "topology", "hatch")
+DEFAULT_THRESHOLD = 0.25
+# Абсолютный допуск: стадии в единицы миллисекунд слишком шумные для процентов
+MIN_DELTA_SECONDS = 0.005
+# Допуск выхода габаритов dxf_inspect за ezdxf.bbox, доля размера чертежа
+EXTENTS_TOLERANCE = 0.01
+
+
+# -----------------------------------------------------------
+# Хэш сцены
+# -----------------------------------------------------------
+
+def _canonical(value: Any) -> Any:
+    """Приводит результат к стабильному виду: float округляются, tuple → list."""
+    if isinstance(value, float):
+        return round(value, 6)
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    return value
+
+
+def scene_hash(scene: Dict[str, Any]) -> str:
+    payload = json.dumps(_canonical(scene), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# -----------------------------------------------------------
+# Прогон одного файла
+# -----------------------------------------------------------
+
+def run_build(path: Path) -> Dict[str, Any]:
+    """Одна полная сборка с замером каждой стадии."""
+    timings: Dict[str, float] = {}
+
+    def timed(stage: str, fn, *args):
+        t0 = time.perf_counter()
+        out = fn(*args)
+        timings[stage] = time.perf_counter() - t0
+        return out
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        doc = timed("read", ezdxf.readfile, str(path))
+        walls = timed("walls", analyze_walls, doc)
+        openings = timed("openings", analyze_openings, doc, walls["walls"])
+        rooms = timed("rooms", analyze_rooms, doc)
+        topology = timed("topology", analyze_topology, rooms["rooms"], walls["walls"], openings)
+        hatch_walls = timed("hatch", extract_walls_v2, doc)
+
+    scene = {"walls": walls, "openings": openings, "rooms": rooms,
+             "topology": topology, "hatch_walls": hatch_walls}
+    return {"timings": timings, "scene_hash": scene_hash(scene)}
+
+
+def measure_fixture(path: Path, repeats: int) -> Dict[str, Any]:
+    runs = [run_build(path) for _ in range(repeats)]
+    hashes = {r["scene_hash"] for r in runs}
+    if len(hashes) != 1:
+        raise RuntimeError(f"{path.name}: результат недетерминирован между прогонами")
+    return {
+        "sha256": hashlib.sha256(path.read_bytes()).hexdigest(),
+        "scene_hash": runs[0]["scene_hash"],
+        "stages": {s: round(statistics.median(r["timings"][s] for r in runs), 5) for s in STAGES},
+    }
+
+
+def _fixture_key(path: Path) -> str:
+    return path.relative_to(BACKEND_DIR.parent).as_posix()
+
+
+def measure_all(repeats: int) -> Dict[str, Dict[str, Any]]:
+    results: Dict[str, Dict[str, Any]] = {}
+    seen: Dict[str, str] = {}
+    for path in FIXTURES:
+        if not path.exists():
+            continue
+        key = _fixture_key(path)
+        digest = hashlib.sha256(path.read_bytes()).hexdigest()
+        if digest in seen:
+            # Копии одного и того же плана не перемеряем
+            print(f"{key}: копия {seen[digest]}, пропуск")
+            continue
+        seen[digest] = key
+        results[key] = measure_fixture(path, repeats)
+        stages = ", ".join(f"{s}={results[key]['stages'][s]:.4f}" for s in STAGES)
+        print(f"{key}: {stages}")
+    return results
+
+
+def check_extents(path: Path) -> List[str]:
+    """Габариты dxf_inspect внутри ezdxf.bbox (блоки сводка не разворачивает — меньше можно)."""
+    extents = inspect_dxf(str(path))["extents"]
+    with contextlib.redirect_stdout(io.StringIO()):
+        box = bbox.extents(ezdxf.readfile(str(path)).modelspace(), fast=True)
+    if extents is None or not box.has_data:
+        return []
+    lo, hi = box.extmin, box.extmax
+    tol = EXTENTS_TOLERANCE * max(hi.x - lo.x, hi.y - lo.y)
+    if (extents["min"][0] < lo.x - tol or extents["min"][1] < lo.y - tol
+            or extents["max"][0] > hi.x + tol or extents["max"][1] > hi.y + tol):
+        return [f"{_fixture_key(path)}: габариты dxf_inspect {extents['min']}–{extents['max']} "
+                f"выходят за ezdxf.bbox ({lo.x:.1f}, {lo.y:.1f})–({hi.x:.1f}, {hi.y:.1f})"]
+    return []
+
+
+# -----------------------------------------------------------
+# Сравнение с baseline
+# -----------------------------------------------------------
+
+def compare(current: Dict[str, Dict[str, Any]], baseline: Dict[str, Any],
+            threshold: float) -> List[str]:
+    failures: List[str] = []
+    base_fixtures = baseline.get("fixtures", {})
+    for key, cur in current.items():
+        base = base_fixtures.get(key)
+        if base is None:
+            print(f"{key}: нет в baseline (запустите с --update)")
+            continue
+        if base["sha256"] != cur["sha256"]:
+            failures.append(f"{key}: файл плана изменился, baseline неактуален")
+            continue
+        if base["scene_hash"] != cur["scene_hash"]:
+            failures.append(f"{key}: изменился результат сцены "
+                            f"({base['scene_hash'][:12]} → {cur['scene_hash'][:12]})")
+        for stage in STAGES:
+            b = base["stages"].get(stage)
+            c = cur["stages"][stage]
+            if b is None:
+                continue
+            if c > b * (1.0 + threshold) and c - b > MIN_DELTA_SECONDS:
+                failures.append(f"{key}: стадия {stage} {b:.4f} s → {c:.4f} s "
+                                f"(+{(c / b - 1.0) * 100 if b else float('inf'):.0f}%)")
+    return failures
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Регрессионный бенчмарк с baseline.")
+    parser.add_argument("--repeats", type=int, default=3, help="прогонов на файл (берётся медиана)")
+    parser.add_argument("--threshold", type=float, default=None,
+                        help=f"допустимое замедление стадии, доля (по умолчанию из baseline или {DEFAULT_THRESHOLD})")
+    parser.add_argument("--baseline", default=str(BASELINE_PATH))
+    parser.add_argument("--update", action="store_true", help="перезаписать baseline текущими замерами")
+    parser.add_argument("--check-extents", action="store_true",
+                        help="вместо бенчмарка сверить габариты dxf_inspect с ezdxf.bbox")
+    args = parser.parse_args(argv)
+
+    if args.check_extents:
+        failures = [f for path in FIXTURES for f in check_extents(path)]
+        for f in failures:
+            print(f"FAIL {f}")
+        if not failures:
+            print(f"OK: габариты dxf_inspect в пределах ezdxf.bbox ({len(FIXTURES)} планов)")
+        return 1 if failures else 0
+
+    baseline_path = Path(args.baseline)
+    baseline: Dict[str, Any] = {}
+    if baseline_path.exists():
+        baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    threshold = args.threshold
+    if threshold is None:
+        threshold = baseline.get("threshold", DEFAULT_THRESHOLD)
+
+    current = measure_all(max(1, args.repeats))
+
+    if args.update:
+        baseline = {
+            "threshold": threshold,
+            "repeats": args.repeats,
+            "machine": {"python": platform.python_version(), "platform": platform.platform()},
+            "fixtures": current,
+        }
+        baseline_path.write_text(json.dumps(baseline, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        print(f"Baseline записан: {baseline_path}")
+        return 0
+
+    if not baseline:
+        print(f"Baseline не найден: {baseline_path} (запустите с --update)")
+        return 1
+
+    failures = compare(current, baseline, threshold)
+    print("-" * 50)
+    if failures:
+        for f in failures:
+            print(f"FAIL {f}")
+        return 1
+    print(f"OK: регрессий нет (порог {threshold * 100:.0f}%)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+# backend/bench_scaling.py
+"""
+Бенчмарк масштабируемости стадий анализа на синтетических планах.
+
+Для каждого размера (по умолчанию 1k/10k/100k/1M сущностей) строится план
+из synthetic_plan и по очереди запускаются стадии. Для каждой стадии
+печатается время, пиковая память (tracemalloc) и показатель роста
+k = log(t2/t1) / log(n2/n1) относительно предыдущего размера: k≈1 —
+линейная стадия, k≈2 — квадратичная.
+
+Если стадия на меньшем размере уже превысила --budget секунд, на больших
+размерах она пропускается, а в отчёте остаётся оценка по последнему k.
+
+Пример:
+    python bench_scaling.py --sizes 1000,10000 --json scaling.json
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import io
+import json
+import math
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+import ezdxf
+
+from synthetic_plan import spec_for_entities, generate_plan
+from dxf_walls import analyze_walls, _collect_segments
+from wall_graph import build_wall_graph
+from dxf_rooms import extract_room_edges, build_room_graph, find_polygons
+from dxf_openings import analyze_openings
+from dxf_parser_v2 import extract_walls_v2
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+DEFAULT_BUDGET = 60.0
+
+
+# -----------------------------------------------------------
+# Стадии
+# -----------------------------------------------------------
+
+def _stages() -> List[Tuple[str, Callable[[Dict[str, Any]], Any]]]:
+    """Стадии получают общий контекст и могут класть в него промежуточные данные."""
+
+    def collect(ctx):
+        ctx["segments"] = _collect_segments(ctx["doc"])
+        return len(ctx["segments"])
+
+    def walls(ctx):
+        ctx["walls"] = analyze_walls(ctx["doc"])["walls"]
+        return len(ctx["walls"])
+
+    def wall_graph(ctx):
+        return len(build_wall_graph(ctx.get("segments", [])).connected_components())
+
+    def polygons(ctx):
+        edges = extract_room_edges(ctx["doc"].modelspace())
+        return len(find_polygons(build_room_graph(edges)))
+
+    def openings(ctx):
+        return len(analyze_openings(ctx["doc"], ctx.get("walls", [])))
+
+    def hatch(ctx):
+        return len(extract_walls_v2(ctx["doc"]))
+
+    return [
+        ("collect_segments", collect),
+        ("analyze_walls", walls),
+        ("wall_graph", wall_graph),
+        ("find_polygons", polygons),
+        ("analyze_openings", openings),
+        ("hatch_extraction", hatch),
+    ]
+
+
+def _measure(fn: Callable[[], Any], track_memory: bool) -> Tuple[float, int | None, Any]:
+    gc.collect()
+    if track_memory:
+        tracemalloc.start()
+    t0 = time.perf_counter()
+    try:
+        out = fn()
+    finally:
+        elapsed = time.perf_counter() - t0
+        peak = None
+        if track_memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    return elapsed, peak, out
+
+
+# -----------------------------------------------------------
+# Прогон
+# -----------------------------------------------------------
+
+def run_scaling(sizes: List[int], seed: int = 0, budget: float = DEFAULT_BUDGET,
+                track_memory: bool = True, with_read: bool = False) -> List[Dict[str, Any]]:
+    rows: List[Dict[str, Any]] = []
+    last: Dict[str, Tuple[int, float]] = {}
+    growth: Dict[str, float] = {}
+    over_budget: set = set()
+
+    for n in sizes:
+        spec = spec_for_entities(n, seed=seed)
+        t0 = time.perf_counter()
+        doc = generate_plan(spec)
+        gen_time = time.perf_counter() - t0
+        actual_n = len(doc.modelspace())
+        print(f"== {actual_n} сущностей (генерация {gen_time:.2f} s)")
+
+        if with_read:
+            buf = io.StringIO()
+            doc.write(buf)
+            text = buf.getvalue()
+            del buf
+            elapsed, peak, doc = _measure(lambda: ezdxf.read(io.StringIO(text)), track_memory)
+            del text
+            rows.append(_row("read", actual_n, elapsed, peak, None, last, growth))
+
+        ctx: Dict[str, Any] = {"doc": doc}
+        for name, stage in _stages():
+            if name in over_budget:
+                k = growth.get(name, 1.0)
+                prev_n, prev_t = last[name]
+                est = prev_t * (actual_n / prev_n) ** k
+                rows.append({"stage": name, "entities": actual_n, "seconds": None,
+                             "peak_mb": None, "items": None, "growth": k,
+                             "skipped": f"over budget, estimate {est:.0f} s"})
+                print(f"   {name:<18} пропущено (оценка {est:.0f} s при k={k:.2f})")
+                continue
+            elapsed, peak, out = _measure(lambda: stage(ctx), track_memory)
+            row = _row(name, actual_n, elapsed, peak, out, last, growth)
+            rows.append(row)
+            if elapsed > budget:
+                over_budget.add(name)
+        del ctx, doc
+        gc.collect()
+    return rows
+
+
+def _row(name: str, n: int, elapsed: float, peak: int | None, items: Any,
+         last: Dict[str, Tuple[int, float]], growth: Dict[str, float]) -> Dict[str, Any]:
+    k = None
+    if name in last:
+        prev_n, prev_t = last[name]
+        if prev_n != n and prev_t > 0 and elapsed > 0:
+            k = math.log(elapsed / prev_t) / math.log(n / prev_n)
+            growth[name] = k
+    last[name] = (n, elapsed)
+    peak_mb = round(peak / 2**20, 2) if peak is not None else None
+    k_txt = f"k={k:.2f}" if k is not None else ""
+    mem_txt = f"{peak_mb:>9.2f} MB" if peak_mb is not None else ""
+    print(f"   {name:<18} {elapsed:>9.3f} s {mem_txt} {k_txt}")
+    return {"stage": name, "entities": n, "seconds": round(elapsed, 4), "peak_mb": peak_mb,
+            "items": items, "growth": None if k is None else round(k, 3), "skipped": None}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарк масштабируемости стадий анализа.")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES),
+                        help="размеры планов в сущностях через запятую")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET,
+                        help="секунд на стадию; дороже — стадия не запускается на больших размерах")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="не включать tracemalloc (быстрее, но без пиковой памяти)")
+    parser.add_argument("--with-read", action="store_true", help="замерять и чтение DXF")
+    parser.add_argument("--json", default=None, help="сохранить результаты в JSON")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    rows = run_scaling(sizes, seed=args.seed, budget=args.budget,
+                       track_memory=not args.no_memory, with_read=args.with_read)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"seed": args.seed, "sizes": sizes, "rows": rows}, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,107 @@
+# backend/bench_startup.py
+"""
+Бюджет времени импорта API-процесса.
+
+В новом интерпретаторе (без прогретого кэша модулей) импортируется main
+и замеряется время импорта. Дополнительно проверяется, что тяжёлые модули
+анализа (ezdxf, numpy, анализаторы) при этом не загрузились — они
+импортируются лениво, в обработчиках или в прогреве воркеров.
+
+Берётся лучший из --repeats запусков: шум диска и планировщика только
+увеличивает время. Выход с кодом 1, если время больше --budget или
+загрузился хотя бы один тяжёлый модуль.
+
+Пример:
+    python bench_startup.py --budget 0.8
+    python bench_startup.py --importtime     # топ модулей по -X importtime
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+BACKEND_DIR = Path(__file__).resolve().parent
+
+DEFAULT_BUDGET = 0.8
+DEFAULT_REPEATS = 3
+
+# Модули, которых не должно быть в sys.modules после import main
+HEAVY_MODULES = (
+    "ezdxf", "numpy",
+    "dxf_parser_v2", "dxf_geometry", "dxf_walls", "dxf_openings", "dxf_rooms",
+    "dxf_topology", "mesh_export", "spatial_index",
+)
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import main
+elapsed = time.perf_counter() - t0
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{"elapsed": elapsed, "heavy": heavy}}))
+"""
+
+
+def measure_once() -> Dict[str, Any]:
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(heavy=HEAVY_MODULES)],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+    ).stdout
+    # main может писать в stdout при импорте — нужна последняя строка
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def importtime_top(top: int) -> List[tuple]:
+    """Самые дорогие модули по собственному времени (-X importtime, микросекунды)."""
+    err = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+    ).stderr
+    rows = []
+    for line in err.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((int(self_us), int(cumulative_us), name.strip()))
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Бюджет времени импорта API-процесса.")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET, help="секунды на import main")
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS)
+    parser.add_argument("--importtime", type=int, nargs="?", const=15, default=0, metavar="N",
+                        help="показать N самых дорогих модулей")
+    args = parser.parse_args(argv)
+
+    runs = [measure_once() for _ in range(max(1, args.repeats))]
+    best = min(r["elapsed"] for r in runs)
+    heavy = sorted({m for r in runs for m in r["heavy"]})
+
+    print(f"import main: {best:.3f} s (лучший из {len(runs)}, бюджет {args.budget:.3f} s)")
+    if args.importtime:
+        print(f"{'self, ms':>10} {'cumul, ms':>10}  module")
+        for self_us, cumulative_us, name in importtime_top(args.importtime):
+            print(f"{self_us / 1000:10.1f} {cumulative_us / 1000:10.1f}  {name}")
+
+    failures = []
+    if best > args.budget:
+        failures.append(f"время импорта {best:.3f} s > бюджета {args.budget:.3f} s")
+    if heavy:
+        failures.append(f"тяжёлые модули загружены при импорте: {', '.join(heavy)}")
+    print("-" * 50)
+    if failures:
+        for f in failures:
+            print(f"FAIL {f}")
+        return 1
+    print("OK: импорт в бюджете, тяжёлые модули не загружены")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
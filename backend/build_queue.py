@@ -0,0 +1,240 @@
+# backend/build_queue.py
+"""
+Очередь задач сборки для воркеров на других машинах.
+
+API кладёт задачу (путь и хэш плана, настройки анализа) в брокер, отдельные
+процессы queue_worker.py на любых машинах забирают её, собирают результат,
+пишут его в ResultStore и отмечают задачу выполненной.
+
+Жизненный цикл задачи: queued → running → done | failed.
+    - lease: воркер берёт задачу в аренду на lease_seconds;
+    - heartbeat: пока сборка идёт, воркер продлевает аренду; если продлить
+      не удалось — задачу уже забрал другой воркер;
+    - аренда истекла (воркер упал, машина пропала) — задача снова доступна
+      для lease; каждая аренда — попытка, после max_attempts задача failed;
+    - fail(retry=True) — ошибка сборки, задача возвращается в очередь, пока
+      есть попытки.
+
+BuildBroker — интерфейс брокера; SQLiteBroker — реализация по умолчанию на
+файле SQLite в общем каталоге (NFS/SMB с рабочими блокировками). Журнал —
+обычный rollback: WAL требует общей памяти и между машинами не работает.
+
+    broker = SQLiteBroker("shared/queue.sqlite3")
+    job = broker.submit({"plan_file": ..., "plan_hash": ...})
+    job = broker.lease("host:123", lease_seconds=60)
+"""
+from __future__ import annotations
+
+import json
+import sqlite3
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterator, Optional
+
+DEFAULT_LEASE_SECONDS = 60.0
+DEFAULT_MAX_ATTEMPTS = 3
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+@dataclass
+class Job:
+    id: str
+    payload: Dict[str, Any]
+    status: str
+    attempts: int
+    max_attempts: int
+    worker: Optional[str] = None
+    lease_until: Optional[float] = None
+    heartbeat_at: Optional[float] = None
+    result_id: Optional[str] = None
+    error: Optional[str] = None
+    error_type: Optional[str] = None
+    created_at: float = 0.0
+    updated_at: float = 0.0
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class BuildBroker(ABC):
+    """Интерфейс брокера очереди сборок."""
+
+    @abstractmethod
+    def submit(self, payload: Dict[str, Any], max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> Job:
+        """Новая задача в статусе queued."""
+
+    @abstractmethod
+    def lease(self, worker: str, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> Optional[Job]:
+        """Самая старая доступная задача (queued или с истёкшей арендой) или None."""
+
+    @abstractmethod
+    def heartbeat(self, job_id: str, worker: str, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> bool:
+        """Продление аренды; False — задача больше не принадлежит этому воркеру."""
+
+    @abstractmethod
+    def complete(self, job_id: str, worker: str, result_id: str) -> bool:
+        """Задача выполнена, результат — result_id в ResultStore."""
+
+    @abstractmethod
+    def fail(self, job_id: str, worker: str, error: str, error_type: str | None = None,
+             retry: bool = True) -> bool:
+        """Ошибка сборки: назад в очередь, если retry и остались попытки, иначе failed."""
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[Job]:
+        ...
+
+    @abstractmethod
+    def stats(self) -> Dict[str, int]:
+        """Число задач по статусам."""
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    worker TEXT,
+    lease_until REAL,
+    heartbeat_at REAL,
+    result_id TEXT,
+    error TEXT,
+    error_type TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+"""
+
+
+class SQLiteBroker(BuildBroker):
+    def __init__(self, db_path: str) -> None:
+        self.db_path = str(db_path)
+        # executescript сам завершает транзакцию — схема создаётся вне _connect
+        db = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            db.executescript(_SCHEMA)
+        finally:
+            db.close()
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # Соединение на операцию; BEGIN IMMEDIATE сразу берёт блокировку записи,
+        # поэтому два воркера не арендуют одну задачу
+        db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+        finally:
+            db.close()
+
+    @contextmanager
+    def _read(self) -> Iterator[sqlite3.Connection]:
+        # Только чтение: обычная транзакция с разделяемой блокировкой, опрос
+        # статуса не мешает воркерам арендовать и закрывать задачи
+        db = sqlite3.connect(self.db_path, timeout=30)
+        db.row_factory = sqlite3.Row
+        try:
+            yield db
+        finally:
+            db.close()
+
+    @staticmethod
+    def _job(row: sqlite3.Row) -> Job:
+        data = dict(row)
+        data["payload"] = json.loads(data["payload"])
+        return Job(**data)
+
+    def submit(self, payload: Dict[str, Any], max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> Job:
+        now = time.time()
+        job = Job(id=str(uuid.uuid4()), payload=payload, status=QUEUED, attempts=0,
+                  max_attempts=max(1, max_attempts), created_at=now, updated_at=now)
+        with self._connect() as db:
+            db.execute(
+                "INSERT INTO jobs (id, payload, status, attempts, max_attempts, created_at, updated_at) "
+                "VALUES (?, ?, ?, 0, ?, ?, ?)",
+                (job.id, json.dumps(payload, ensure_ascii=False), QUEUED, job.max_attempts, now, now),
+            )
+        return job
+
+    def lease(self, worker: str, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> Optional[Job]:
+        now = time.time()
+        with self._connect() as db:
+            # Аренда истекла на последней попытке — задача провалена
+            db.execute(
+                "UPDATE jobs SET status = ?, error = 'аренда истекла: воркер не отвечает', "
+                "error_type = 'LeaseExpired', worker = NULL, lease_until = NULL, updated_at = ? "
+                "WHERE status = ? AND lease_until < ? AND attempts >= max_attempts",
+                (FAILED, now, RUNNING, now),
+            )
+            row = db.execute(
+                "SELECT id FROM jobs WHERE status = ? OR (status = ? AND lease_until < ?) "
+                "ORDER BY created_at LIMIT 1",
+                (QUEUED, RUNNING, now),
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute(
+                "UPDATE jobs SET status = ?, worker = ?, lease_until = ?, heartbeat_at = ?, "
+                "attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (RUNNING, worker, now + lease_seconds, now, now, row["id"]),
+            )
+            return self._job(db.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone())
+
+    def heartbeat(self, job_id: str, worker: str, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> bool:
+        now = time.time()
+        with self._connect() as db:
+            cur = db.execute(
+                "UPDATE jobs SET lease_until = ?, heartbeat_at = ?, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND status = ?",
+                (now + lease_seconds, now, now, job_id, worker, RUNNING),
+            )
+            return cur.rowcount == 1
+
+    def complete(self, job_id: str, worker: str, result_id: str) -> bool:
+        with self._connect() as db:
+            cur = db.execute(
+                "UPDATE jobs SET status = ?, result_id = ?, error = NULL, error_type = NULL, "
+                "lease_until = NULL, updated_at = ? WHERE id = ? AND worker = ? AND status = ?",
+                (DONE, result_id, time.time(), job_id, worker, RUNNING),
+            )
+            return cur.rowcount == 1
+
+    def fail(self, job_id: str, worker: str, error: str, error_type: str | None = None,
+             retry: bool = True) -> bool:
+        with self._connect() as db:
+            cur = db.execute(
+                "UPDATE jobs SET status = CASE WHEN ? AND attempts < max_attempts THEN ? ELSE ? END, "
+                "error = ?, error_type = ?, worker = NULL, lease_until = NULL, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND status = ?",
+                (retry, QUEUED, FAILED, error, error_type, time.time(), job_id, worker, RUNNING),
+            )
+            return cur.rowcount == 1
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._read() as db:
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._job(row) if row else None
+
+    def stats(self) -> Dict[str, int]:
+        with self._read() as db:
+            rows = db.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        counts.update({r["status"]: r["n"] for r in rows})
+        return counts
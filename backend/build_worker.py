@@ -0,0 +1,157 @@
+# backend/build_worker.py
+"""
+Сборка результата и пул заранее прогретых процессов-воркеров.
+
+Сам модуль лёгкий: ezdxf, numpy и анализаторы импортируются только внутри
+функций, поэтому API-процесс может импортировать его при старте.
+
+Прогрев (warm_up) импортирует все модули анализа и прогоняет полную
+сборку на крошечном встроенном плане (генерируется synthetic_plan, пишется
+в DXF-текст и читается обратно) — первая настоящая сборка в воркере идёт
+уже с установившейся скоростью: модули загружены, кэши ezdxf заполнены.
+
+    pool = BuildPool(workers=4)
+    pool.prewarm()                      # не ждёт окончания прогрева
+    result, timings = await pool.run(plan_path)
+"""
+from __future__ import annotations
+
+import asyncio
+import io
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from contextlib import nullcontext
+from functools import partial
+from typing import Any, Dict, List, Tuple
+
+log = logging.getLogger(__name__)
+
+# Встроенный план для прогрева: пара стен, помещения, окна и двери
+WARMUP_SPEC = dict(walls=6, hatched_walls=2, rooms=2, windows=2, doors=2, nested_doors=1, seed=0)
+
+_warm = False
+
+
+def run_build(plan_path: str, timings: Dict[str, float] | None = None,
+              diagnostics_samples: int | None = None, low_memory: bool = False,
+              memory_budget_mb: float | None = None,
+              plan_hash: str | None = None) -> Tuple[Dict[str, Any], Dict[str, float]]:
+    """
+    Чтение DXF и анализ V2 с замером стадий. Если diagnostics_samples задан,
+    в результат добавляется отчёт диагностики (сбор идёт в том процессе, где
+    выполняется сборка — в том числе в воркере пула).
+
+    low_memory=True — сборка через low_memory (документ освобождается сразу
+    после извлечения), в результат добавляется отчёт "memory"; превышение
+    memory_budget_mb — MemoryBudgetExceeded.
+
+    plan_hash — sha256 файла плана, ключ кэша легенды (как в batch_cli);
+    без него ключом служат GUID заголовка (legend_cache_key).
+    """
+    import ezdxf
+    from dxf_parser_v2 import analyze_dxf_v2
+    from diagnostics import collect_diagnostics
+
+    timings = {} if timings is None else timings
+    collector = collect_diagnostics(diagnostics_samples) if diagnostics_samples is not None else nullcontext()
+
+    if low_memory:
+        from low_memory import analyze_plan_low_memory
+
+        with collector as diag:
+            t0 = time.perf_counter()
+            built = analyze_plan_low_memory(plan_path, v2=True, geometry=False, budget_mb=memory_budget_mb,
+                                            doc_key=plan_hash)
+            # Чтение и извлечение идут одним проходом — отдельного времени "read" нет
+            timings["analyze"] = round(time.perf_counter() - t0, 4)
+        result = built["v2"]
+        result["memory"] = built["memory"]
+        if diag is not None:
+            result["diagnostics"] = diag.report()
+        return result, timings
+
+    with collector as diag:
+        # --- ЗАГРУЗКА DXF ---
+        t0 = time.perf_counter()
+        try:
+            doc = ezdxf.readfile(plan_path)
+        except Exception as e:
+            raise ValueError(f"Ошибка чтения DXF файла: {e}")
+        timings["read"] = round(time.perf_counter() - t0, 4)
+
+        # --- АНАЛИЗ ГЕОМЕТРИИ (V2 HATCH-BASED) ---
+        # Возвращает структуру { "scene": { "walls": [...], ... } }
+        t0 = time.perf_counter()
+        result = analyze_dxf_v2(doc, doc_key=plan_hash)
+        timings["analyze"] = round(time.perf_counter() - t0, 4)
+
+    if diag is not None:
+        result["diagnostics"] = diag.report()
+    return result, timings
+
+
+def warm_up() -> float:
+    """Импорт модулей анализа и полная сборка встроенного плана. Возвращает время прогрева."""
+    global _warm
+    if _warm:
+        return 0.0
+    t0 = time.perf_counter()
+
+    import ezdxf
+    from synthetic_plan import SyntheticPlanSpec, generate_plan
+    from dxf_walls import analyze_walls
+    from dxf_openings import analyze_openings
+    from dxf_rooms import analyze_rooms
+    from dxf_topology import analyze_topology
+    from dxf_parser_v2 import analyze_dxf_v2
+    from mesh_export import build_plan_mesh, glb_bytes
+
+    # Через текст DXF, чтобы прогреть и загрузчик, а не только построение документа
+    stream = io.StringIO()
+    generate_plan(SyntheticPlanSpec(**WARMUP_SPEC)).write(stream)
+    doc = ezdxf.read(io.StringIO(stream.getvalue()))
+
+    walls = analyze_walls(doc)["walls"]
+    openings = analyze_openings(doc, walls)
+    rooms = analyze_rooms(doc)["rooms"]
+    analyze_topology(rooms, walls, openings)
+    analyze_dxf_v2(doc)
+    glb_bytes(build_plan_mesh(doc, walls, openings))
+
+    _warm = True
+    elapsed = time.perf_counter() - t0
+    log.info("Воркер %d прогрет за %.2f s", os.getpid(), elapsed)
+    return elapsed
+
+
+def _worker_ready() -> int:
+    # Задача-пустышка: initializer уже выполнил прогрев к моменту её запуска
+    time.sleep(0.05)
+    return os.getpid()
+
+
+class BuildPool:
+    """Пул процессов, каждый из которых прогревается при запуске (initializer)."""
+
+    def __init__(self, workers: int) -> None:
+        self.workers = max(1, workers)
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=warm_up)
+        self._warmup: List = []
+
+    def prewarm(self, block: bool = False) -> None:
+        """Запускает все процессы сразу, а не по первому запросу."""
+        self._warmup = [self._executor.submit(_worker_ready) for _ in range(self.workers)]
+        if block:
+            wait(self._warmup)
+
+    async def run(self, plan_path: str, diagnostics_samples: int | None = None,
+                  low_memory: bool = False, memory_budget_mb: float | None = None,
+                  plan_hash: str | None = None) -> Tuple[Dict[str, Any], Dict[str, float]]:
+        loop = asyncio.get_running_loop()
+        job = partial(run_build, plan_path, None, diagnostics_samples, low_memory, memory_budget_mb, plan_hash)
+        return await loop.run_in_executor(self._executor, job)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,81 @@
+# backend/diagnostics.py
+"""
+Диагностика сборки: счётчики по стадиям и ограниченные выборки причин пропуска.
+
+Анализаторы не печатают в stdout: в горячем цикле они берут текущий сбор
+диагностики (contextvar) один раз до цикла и проверяют его на None —
+если сбор не включён, цикл платит только за эту проверку.
+
+    with collect_diagnostics() as diag:
+        openings = analyze_openings(doc, walls)
+    result["diagnostics"] = diag.report()
+
+Внутри анализатора:
+    diag = current_diagnostics()
+    for insert in inserts:
+        ...
+        if diag is not None:
+            diag.skip("openings", "unbound", block=name, distance=d)
+
+На каждую причину сохраняется не больше max_samples примеров; остальные
+только считаются. Сохранённые примеры дублируются в лог на уровне DEBUG.
+Сводные сообщения анализаторы пишут через logging (logger по имени модуля).
+"""
+from __future__ import annotations
+
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+DEFAULT_MAX_SAMPLES = 5
+
+log = logging.getLogger(__name__)
+
+_current: ContextVar[Optional["BuildDiagnostics"]] = ContextVar("bim_diagnostics", default=None)
+
+
+class BuildDiagnostics:
+    def __init__(self, max_samples: int = DEFAULT_MAX_SAMPLES) -> None:
+        self.max_samples = max_samples
+        self.counters: Dict[str, Dict[str, int]] = {}
+        self.samples: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+
+    def count(self, stage: str, key: str, n: int = 1) -> None:
+        stage_counters = self.counters.setdefault(stage, {})
+        stage_counters[key] = stage_counters.get(key, 0) + n
+
+    def wants_sample(self, stage: str, reason: str) -> bool:
+        """Сохранит ли skip ещё один пример — чтобы не считать дорогие детали впустую."""
+        return len(self.samples.get(stage, {}).get(reason, ())) < self.max_samples
+
+    def skip(self, stage: str, reason: str, **details: Any) -> None:
+        """Пропуск объекта: счётчик skipped.<reason> и пример, пока их меньше max_samples."""
+        self.count(stage, f"skipped.{reason}")
+        bucket = self.samples.setdefault(stage, {}).setdefault(reason, [])
+        if len(bucket) < self.max_samples:
+            bucket.append(details)
+            log.debug("%s: пропуск (%s) %s", stage, reason, details)
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "counters": {stage: dict(c) for stage, c in self.counters.items()},
+            "samples": {stage: {r: list(s) for r, s in reasons.items()}
+                        for stage, reasons in self.samples.items()},
+            "max_samples": self.max_samples,
+        }
+
+
+def current_diagnostics() -> Optional[BuildDiagnostics]:
+    return _current.get()
+
+
+@contextmanager
+def collect_diagnostics(max_samples: int = DEFAULT_MAX_SAMPLES) -> Iterator[BuildDiagnostics]:
+    """Включает сбор диагностики для кода внутри блока (в этом потоке/задаче)."""
+    diag = BuildDiagnostics(max_samples)
+    token = _current.set(diag)
+    try:
+        yield diag
+    finally:
+        _current.reset(token)
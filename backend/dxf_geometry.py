@@ -2,7 +2,7 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Iterator
 
 import ezdxf
 
@@ -11,6 +11,8 @@ from dxf_walls import analyze_walls
 from dxf_rooms import analyze_rooms
 from dxf_sections import extract_levels_from_dxf
 from dxf_openings import analyze_openings
+from dxf_topology import analyze_topology
+from dxf_inspect import inspect_dxf
 
 
 # -----------------------------------------------------------
@@ -74,14 +76,41 @@ def _collect_examples(doc: ezdxf.EzDxfDocument) -> Dict[str, Any]:
     }
 
 
+def collect_source_info(doc: ezdxf.EzDxfDocument) -> Dict[str, Any]:
+    return {
+        "is_dxf": True,
+        "layers_count": len(doc.layers),
+        "layers": _collect_layers(doc),
+        "entity_counts": _collect_entity_counts(doc),
+        "examples": _collect_examples(doc)
+    }
+
+
+def analyze_section(file_path_section: str | None) -> List[Dict[str, Any]] | Dict[str, str]:
+    """Уровни из файла разреза; без файла — пустой список, при ошибке — {"error": ...}."""
+    if not file_path_section:
+        return []
+    sec_path = Path(file_path_section)
+    if not sec_path.exists():
+        return {"error": "Файл разреза не найден"}
+    try:
+        return extract_levels_from_dxf(str(sec_path))
+    except Exception as e:
+        return {"error": str(e)}
+
+
 # -----------------------------------------------------------
 # Основная функция анализа
 # -----------------------------------------------------------
 
 def analyze_dxf_geometry(file_path_plan: str,
-                         file_path_section: str | None = None) -> Dict[str, Any]:
+                         file_path_section: str | None = None,
+                         doc: ezdxf.EzDxfDocument | None = None,
+                         wall_workers: int = 1) -> Dict[str, Any]:
     """
     Анализ плана + опционально анализ разреза.
+    Если документ уже загружен (doc), файл плана повторно не читается.
+    wall_workers > 1 — пары стен ищутся по плиткам в пуле процессов.
     """
 
     # 1. ЗАГРУЗКА ФАЙЛА (Вот это самое важное место!)
@@ -89,25 +118,20 @@ def analyze_dxf_geometry(file_path_plan: str,
     if not plan_path.exists():
         raise FileNotFoundError(f"DXF файл не найден: {file_path_plan}")
 
-    try:
-        # ВОТ ЭТОЙ СТРОКИ НЕ ХВАТАЛО:
-        doc = ezdxf.readfile(str(plan_path))
-    except Exception as e:
-        raise ValueError(f"Ошибка чтения DXF файла: {e}")
+    if doc is None:
+        try:
+            # ВОТ ЭТОЙ СТРОКИ НЕ ХВАТАЛО:
+            doc = ezdxf.readfile(str(plan_path))
+        except Exception as e:
+            raise ValueError(f"Ошибка чтения DXF файла: {e}")
 
     # 2. СБОР МЕТАДАННЫХ
-    source_info = {
-        "is_dxf": True,
-        "layers_count": len(doc.layers),
-        "layers": _collect_layers(doc),
-        "entity_counts": _collect_entity_counts(doc),
-        "examples": _collect_examples(doc)
-    }
+    source_info = collect_source_info(doc)
 
     # 3. АНАЛИЗ ГЕОМЕТРИИ (Стены, Окна, Помещения)
     
     # Сначала анализируем стены (переменная doc теперь существует!)
-    walls_detection = analyze_walls(doc)
+    walls_detection = analyze_walls(doc, workers=wall_workers)
     
     # Берем список найденных стен, чтобы передать его в анализ окон
     walls_list = walls_detection.get("walls", [])
@@ -118,17 +142,11 @@ def analyze_dxf_geometry(file_path_plan: str,
     # Анализируем помещения
     rooms_detection = analyze_rooms(doc)
 
+    # Связи: какие помещения соединяют проёмы, ограждения помещений, граф смежности
+    topology = analyze_topology(rooms_detection.get("rooms", []), walls_list, openings_detection)
+
     # 4. АНАЛИЗ РАЗРЕЗА (Если файл был загружен)
-    levels_detection = []
-    if file_path_section:
-        sec_path = Path(file_path_section)
-        if sec_path.exists():
-            try:
-                levels_detection = extract_levels_from_dxf(str(sec_path))
-            except Exception as e:
-                levels_detection = {"error": str(e)}
-        else:
-            levels_detection = {"error": "Файл разреза не найден"}
+    levels_detection = analyze_section(file_path_section)
 
     # 5. СБОРКА РЕЗУЛЬТАТА
     geometry_analysis = {
@@ -136,9 +154,123 @@ def analyze_dxf_geometry(file_path_plan: str,
         "rooms_detection": rooms_detection,
         "levels_detection": levels_detection,
         "openings_detection": openings_detection, # Добавляем проемы в ответ
+        "topology": topology,
     }
 
     return {
         "source_info": source_info,
         "geometry_analysis": geometry_analysis,
-    }
\ No newline at end of file
+    }
+
+
+# -----------------------------------------------------------
+# Потоковый анализ (частичные результаты по стадиям)
+# -----------------------------------------------------------
+
+# Накопленный процент готовности после завершения каждой стадии
+STREAM_STAGES = (
+    ("read", 10),
+    ("walls", 60),
+    ("openings", 80),
+    ("rooms", 95),
+    ("topology", 100),
+)
+
+STREAM_CHUNK_SIZE = 200
+
+
+def _progress(stage: str, status: str, percent: int, counts: Dict[str, int]) -> Dict[str, Any]:
+    return {
+        "event": "progress",
+        "stage": stage,
+        "status": status,
+        "percent": percent,
+        "counts": dict(counts),
+    }
+
+
+def _chunks(event: str, items: List[Any], chunk_size: int) -> Iterator[Dict[str, Any]]:
+    total = len(items)
+    for offset in range(0, total, chunk_size):
+        yield {
+            "event": event,
+            "offset": offset,
+            "total": total,
+            "items": items[offset:offset + chunk_size],
+        }
+
+
+def iter_dxf_geometry(file_path_plan: str,
+                      chunk_size: int = STREAM_CHUNK_SIZE,
+                      wall_workers: int = 1) -> Iterator[Dict[str, Any]]:
+    """
+    Потоковый вариант analyze_dxf_geometry: отдаёт события по мере готовности стадий.
+
+    Первым идёт "source_info" (быстрая сводка dxf_inspect), затем стены пачками
+    сразу после analyze_walls, затем проёмы, помещения и "topology" (граф смежности).
+    Между стадиями идут события "progress" со счётчиками и процентом готовности.
+    Последнее событие — "done".
+    """
+    percents = dict(STREAM_STAGES)
+    counts: Dict[str, int] = {}
+    chunk_size = max(1, int(chunk_size))
+
+    plan_path = Path(file_path_plan)
+    if not plan_path.exists():
+        raise FileNotFoundError(f"DXF файл не найден: {file_path_plan}")
+
+    # Сводка по файлу без загрузки документа — приходит до тяжёлого чтения
+    try:
+        yield {"event": "source_info", **inspect_dxf(str(plan_path))}
+    except ValueError as e:
+        yield {"event": "source_info", "is_dxf": False, "error": str(e)}
+
+    yield _progress("read", "started", 0, counts)
+    try:
+        doc = ezdxf.readfile(str(plan_path))
+    except Exception as e:
+        raise ValueError(f"Ошибка чтения DXF файла: {e}")
+    yield _progress("read", "finished", percents["read"], counts)
+
+    # Стены — первыми, чтобы фронт мог рисовать геометрию как можно раньше
+    yield _progress("walls", "started", percents["read"], counts)
+    walls_detection = analyze_walls(doc, workers=wall_workers)
+    walls_list = walls_detection.get("walls", [])
+    counts["walls"] = len(walls_list)
+    yield from _chunks("walls", walls_list, chunk_size)
+    yield _progress("walls", "finished", percents["walls"], counts)
+
+    yield _progress("openings", "started", percents["walls"], counts)
+    openings = analyze_openings(doc, walls_list)
+    counts["openings"] = len(openings)
+    yield from _chunks("openings", openings, chunk_size)
+    yield _progress("openings", "finished", percents["openings"], counts)
+
+    yield _progress("rooms", "started", percents["openings"], counts)
+    rooms_detection = analyze_rooms(doc)
+    rooms_list = rooms_detection.get("rooms", [])
+    counts["rooms"] = len(rooms_list)
+    yield _progress("rooms", "finished", percents["rooms"], counts)
+
+    # Помещения отдаются после топологии (с enclosures); проёмы уже ушли,
+    # их room_from/room_to приходят в событии "topology" вместе с графом
+    yield _progress("topology", "started", percents["rooms"], counts)
+    topology = analyze_topology(rooms_list, walls_list, openings)
+    yield from _chunks("rooms", rooms_list, chunk_size)
+    yield {
+        "event": "topology",
+        **topology,
+        "openings": [
+            {"id": o["id"], "room_from": o.get("room_from"), "room_to": o.get("room_to")}
+            for o in openings
+        ],
+    }
+    yield _progress("topology", "finished", percents["topology"], counts)
+
+    yield {
+        "event": "done",
+        "percent": 100,
+        "counts": dict(counts),
+        "total_segments": walls_detection.get("total_segments", 0),
+        "total_polygons": rooms_detection.get("total_polygons", 0),
+    }
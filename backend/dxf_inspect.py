@@ -0,0 +1,280 @@
+# backend/dxf_inspect.py
+"""
+Быстрая сводка по DXF без загрузки документа в ezdxf.
+
+Файл читается потоково, пара «код группы / значение» за раз: из HEADER
+берутся версия, кодировка, единицы и габариты, из TABLES — список слоёв,
+из ENTITIES — количество сущностей по типам, фактические габариты и
+несколько примеров. Память ограничена счётчиками и первыми примерами,
+поэтому сводку можно отдавать сразу после загрузки файла.
+
+Формат совпадает с source_info из dxf_geometry (layers, entity_counts,
+examples) плюс поля units, extents и warnings.
+"""
+from __future__ import annotations
+
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+
+from layer_keywords import WALL_KEYWORDS, WALL_LAYERS_CANDIDATES
+
+MAX_EXAMPLES = 5
+
+# Подчинённые сущности: ezdxf не показывает их в modelspace отдельно
+CHILD_ENTITIES = {"VERTEX", "SEQEND", "ATTRIB"}
+
+# Коды X, по которым считаются габариты: только там, где это точки в мировых
+# координатах. У прочих типов 10/11 — не положение на плане: точка вставки
+# INSERT (содержимое блока может быть где угодно), точки HATCH (зерно
+# штриховки, координаты контура в OCS), направление MTEXT и т. п.
+EXTENT_CODES = {
+    "LINE": (10, 11),
+    "LWPOLYLINE": (10,),
+    "VERTEX": (10,),
+    "POINT": (10,),
+    "CIRCLE": (10,),
+    "ARC": (10,),
+    "TEXT": (10,),
+    "MTEXT": (10,),
+}
+# Габариты этих типов — центр ± радиус (код 40)
+RADIUS_ENTITIES = {"CIRCLE", "ARC"}
+
+# $INSUNITS → название единиц
+INSUNITS = {
+    0: "unitless", 1: "inches", 2: "feet", 3: "miles", 4: "mm",
+    5: "cm", 6: "m", 7: "km", 8: "microinches", 9: "mils",
+    10: "yards", 14: "dm",
+}
+
+_UNICODE_ESCAPE = re.compile(r"\\U\+([0-9A-Fa-f]{4})")
+
+
+def _iter_tags(f) -> Iterator[Tuple[int, bytes]]:
+    """Пары (код, сырое значение) из ASCII DXF."""
+    readline = f.readline
+    while True:
+        code = readline()
+        if not code:
+            return
+        value = readline()
+        try:
+            yield int(code), value.rstrip(b"\r\n")
+        except ValueError:
+            raise ValueError(f"Некорректный код группы DXF: {code!r}")
+
+
+def _encoding_for(acadver: str, codepage: str) -> str:
+    # Начиная с R2007 (AC1021) DXF всегда в UTF-8
+    if acadver >= "AC1021":
+        return "utf-8"
+    cp = codepage.upper()
+    if cp.startswith("ANSI_") and cp[5:].isdigit():
+        return f"cp{cp[5:]}"
+    return "cp1252"
+
+
+def _new_summary() -> Dict[str, Any]:
+    return {
+        "is_dxf": True,
+        "dxf_version": None,
+        "encoding": None,
+        "units": None,
+        "layers_count": 0,
+        "layers": [],
+        "entity_counts": {},
+        "layer_entity_counts": {},
+        "examples": {"lines": [], "polylines": [], "inserts": []},
+        "header_extents": None,
+        "extents": None,
+        "warnings": [],
+    }
+
+
+def inspect_dxf(file_path: str) -> Dict[str, Any]:
+    """Потоковая сводка по DXF-файлу."""
+    path = Path(file_path)
+    if not path.exists():
+        raise FileNotFoundError(f"DXF файл не найден: {file_path}")
+
+    with open(path, "rb") as f:
+        head = f.read(22)
+        if head.startswith(b"AutoCAD Binary DXF"):
+            raise ValueError("Бинарный DXF не поддерживается быстрой сводкой")
+        if head.startswith(b"AC10"):
+            raise ValueError("Файл является DWG, а не DXF")
+        f.seek(0)
+        summary = _scan(f)
+
+    summary["warnings"] = plan_warnings(summary)
+    return summary
+
+
+def _scan(f) -> Dict[str, Any]:
+    summary = _new_summary()
+    counts: Dict[str, int] = summary["entity_counts"]
+    layer_counts: Dict[str, int] = summary["layer_entity_counts"]
+    examples = summary["examples"]
+
+    acadver, codepage = "AC1009", "ANSI_1252"
+    encoding = _encoding_for(acadver, codepage)
+
+    def text(raw: bytes) -> str:
+        s = raw.decode(encoding, errors="replace").strip()
+        if "\\U+" in s:
+            s = _UNICODE_ESCAPE.sub(lambda m: chr(int(m.group(1), 16)), s)
+        return s
+
+    section = None
+    expect_section_name = False
+    header_var = None
+    header_ext: Dict[str, List[float]] = {"$EXTMIN": [0.0, 0.0], "$EXTMAX": [0.0, 0.0]}
+    table = None
+    etype = None
+    layer_named = False
+    ext = [float("inf"), float("inf"), float("-inf"), float("-inf")]
+
+    # Текущая сущность секции ENTITIES
+    ent_layer = "0"
+    ent_paper = False
+    ent_x = None
+    ent_code = 0
+    ent_pts: List[List[float]] = []
+    ent_name = ""
+    ent_radius = 0.0
+    ent_ext = [float("inf"), float("inf"), float("-inf"), float("-inf")]
+
+    def finish_entity() -> None:
+        if etype is None or ent_paper:
+            return
+        if ent_ext[0] <= ent_ext[2]:
+            r = ent_radius if etype in RADIUS_ENTITIES else 0.0
+            ext[0] = min(ext[0], ent_ext[0] - r)
+            ext[1] = min(ext[1], ent_ext[1] - r)
+            ext[2] = max(ext[2], ent_ext[2] + r)
+            ext[3] = max(ext[3], ent_ext[3] + r)
+        if etype in CHILD_ENTITIES:
+            return
+        counts[etype] = counts.get(etype, 0) + 1
+        layer_counts[ent_layer] = layer_counts.get(ent_layer, 0) + 1
+        if etype == "LINE" and len(examples["lines"]) < MAX_EXAMPLES and len(ent_pts) >= 2:
+            examples["lines"].append({"layer": ent_layer, "start": ent_pts[0], "end": ent_pts[1]})
+        elif etype == "LWPOLYLINE" and len(examples["polylines"]) < MAX_EXAMPLES:
+            examples["polylines"].append({"layer": ent_layer, "points": list(ent_pts)})
+        elif etype == "INSERT" and len(examples["inserts"]) < MAX_EXAMPLES and ent_pts:
+            examples["inserts"].append({"layer": ent_layer, "block_name": ent_name,
+                                        "insert_point": ent_pts[0]})
+
+    for code, raw in _iter_tags(f):
+        if code == 0:
+            value = raw.strip().decode("ascii", errors="replace")
+            if section == "ENTITIES":
+                finish_entity()
+            if value == "SECTION":
+                expect_section_name = True
+                etype = None
+                continue
+            if value == "ENDSEC":
+                section, etype, table = None, None, None
+                continue
+            if value == "EOF":
+                break
+            etype = value
+            layer_named = False
+            ent_layer, ent_paper, ent_x, ent_name, ent_radius = "0", False, None, "", 0.0
+            ent_pts = []
+            ent_ext = [float("inf"), float("inf"), float("-inf"), float("-inf")]
+            continue
+
+        if expect_section_name and code == 2:
+            section = raw.strip().decode("ascii", errors="replace")
+            expect_section_name = False
+            continue
+
+        if section == "HEADER":
+            if code == 9:
+                header_var = raw.strip().decode("ascii", errors="replace")
+            elif header_var == "$ACADVER" and code == 1:
+                acadver = text(raw)
+                summary["dxf_version"] = acadver
+                encoding = _encoding_for(acadver, codepage)
+            elif header_var == "$DWGCODEPAGE" and code == 3:
+                codepage = text(raw)
+                encoding = _encoding_for(acadver, codepage)
+            elif header_var == "$INSUNITS" and code == 70:
+                units = int(raw)
+                summary["units"] = INSUNITS.get(units, str(units))
+            elif header_var in header_ext and code in (10, 20):
+                header_ext[header_var][0 if code == 10 else 1] = float(raw)
+
+        elif section == "TABLES":
+            if etype == "TABLE" and code == 2:
+                table = text(raw)
+            elif table == "LAYER" and etype == "LAYER" and code == 2 and not layer_named:
+                summary["layers"].append({"name": text(raw)})
+                layer_named = True
+
+        elif section == "ENTITIES" and etype is not None:
+            if code == 8:
+                ent_layer = text(raw)
+            elif code == 67:
+                ent_paper = raw.strip() == b"1"
+            elif code == 2 and etype == "INSERT":
+                ent_name = text(raw)
+            elif code == 40 and etype in RADIUS_ENTITIES:
+                ent_radius = abs(float(raw))
+            elif code in (10, 11):
+                ent_x, ent_code = float(raw), code
+            elif code == ent_code + 10 and ent_x is not None:
+                y = float(raw)
+                if ent_code in EXTENT_CODES.get(etype, ()):
+                    if ent_x < ent_ext[0]: ent_ext[0] = ent_x
+                    if y < ent_ext[1]: ent_ext[1] = y
+                    if ent_x > ent_ext[2]: ent_ext[2] = ent_x
+                    if y > ent_ext[3]: ent_ext[3] = y
+                if etype in ("LINE", "LWPOLYLINE", "INSERT") and len(ent_pts) < 10_000:
+                    ent_pts.append([ent_x, y])
+                ent_x = None
+
+    summary["encoding"] = encoding
+    summary["layers_count"] = len(summary["layers"])
+    summary["header_extents"] = {"min": header_ext["$EXTMIN"], "max": header_ext["$EXTMAX"]}
+    if ext[0] <= ext[2]:
+        summary["extents"] = {"min": [ext[0], ext[1]], "max": [ext[2], ext[3]]}
+    elif _valid_extents(header_ext["$EXTMIN"], header_ext["$EXTMAX"]):
+        # Только блоки и штриховки — габариты без разворачивания блоков не
+        # посчитать, берутся сохранённые CAD в заголовке
+        summary["extents"] = summary["header_extents"]
+    return summary
+
+
+def _valid_extents(lo: List[float], hi: List[float]) -> bool:
+    # Пустой чертёж CAD сохраняет как EXTMIN = +1e20, EXTMAX = -1e20
+    return lo[0] <= hi[0] and lo[1] <= hi[1] and (lo, hi) != ([0.0, 0.0], [0.0, 0.0])
+
+
+# -----------------------------------------------------------
+# Предупреждения для UI
+# -----------------------------------------------------------
+
+def plan_warnings(summary: Dict[str, Any]) -> List[str]:
+    """Проверки, которые имеет смысл показать до запуска полной сборки."""
+    warnings: List[str] = []
+    total = sum(summary["entity_counts"].values())
+    if total == 0:
+        warnings.append("В пространстве модели нет объектов — план пуст.")
+        return warnings
+
+    keys = [k.upper() for k in WALL_LAYERS_CANDIDATES] + WALL_KEYWORDS
+    on_wall_layers = sum(
+        n for layer, n in summary["layer_entity_counts"].items()
+        if any(k in layer.upper() for k in keys)
+    )
+    if on_wall_layers == 0:
+        warnings.append("Нет объектов на слоях стен — проверьте имена слоёв плана.")
+
+    geometry = sum(summary["entity_counts"].get(t, 0) for t in ("LINE", "LWPOLYLINE", "HATCH"))
+    if geometry == 0:
+        warnings.append("Нет линий, полилиний и штриховок — стены и помещения не будут найдены.")
+    return warnings
@@ -0,0 +1,164 @@
+# backend/dxf_noise.py
+"""
+Подавление «шума» до анализа стен и помещений.
+
+Расчленённые штриховки (EXPLODE у HATCH) и мусор от размеров на слоях стен
+дают тысячи коротких параллельных LINE. В поиске пар они стоят квадратично
+по числу соседей и превращаются в фантомные стены, а в графе помещений —
+в сотни крошечных «комнат».
+
+Поиск кластеров:
+    1. Короткие сегменты (не длиннее NOISE_MAX_LENGTH мм) раскладываются по
+       ячейкам сетки NOISE_CELL мм — по середине сегмента.
+    2. В каждой ячейке строится гистограмма направлений (корзины по
+       NOISE_ANGLE_BIN градусов, угол по модулю 180).
+    Сетка и корзины берутся ещё и со сдвигом на половину — кластер на
+    границе ячеек или корзин не разваливается, и хвосты штриховки у края
+    ячейки попадают в одно окно с основной частью.
+    3. Группа (ячейка, корзина) — шум, если в ней не меньше NOISE_MIN_LINES
+       различных параллельных линий и при этом шаг по нормали регулярный
+       (не больше NOISE_MAX_SPACING, разброс шагов не больше
+       NOISE_SPACING_CV) либо сегментов в группе не меньше NOISE_DENSE_COUNT —
+       так ловятся и нерегулярные узоры (кирпич, паркет). Штрихи одной
+       пунктирной линии лежат на одной прямой и линиями не считаются.
+
+Одиночные короткие линии (торцы стен, откосы) кластеров не образуют и
+остаются. Реальные слои конструкции (утеплитель, блок, витраж) тоже бывают
+параллельны с регулярным шагом, но их в ячейке единицы — отсюда порог
+NOISE_MIN_LINES; в расчленённой штриховке линий на метр десятки.
+
+Масштаб чертежа берётся из $INSUNITS. Без единиц он угадывается как в
+spatial_index.guess_tolerance, но только по длинным сегментам (верхние
+NOISE_SCALE_QUANTILE по длине): медиана всех сегментов как раз в шумных
+планах определяется короткими штрихами.
+
+    keep, report = find_noise_segments([(s.start, s.end) for s in segments],
+                                       units=doc.header.get("$INSUNITS", 0))
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, List, Sequence, Tuple
+
+from diagnostics import current_diagnostics
+from spatial_index import guess_tolerance
+
+Point = Tuple[float, float]
+
+# Пороги в миллиметрах (для чертежей в метрах пересчитываются по масштабу)
+NOISE_MAX_LENGTH = 1500.0
+NOISE_CELL = 1000.0
+NOISE_MAX_SPACING = 400.0
+NOISE_ANGLE_BIN = 4.0           # градусы
+NOISE_MIN_LINES = 10
+NOISE_SPACING_CV = 0.35
+NOISE_DENSE_COUNT = 40
+NOISE_REPORT_SAMPLES = 10
+NOISE_SCALE_QUANTILE = 0.9      # масштаб без $INSUNITS — по сегментам длиннее этого квантиля
+
+# $INSUNITS → миллиметров в единице чертежа
+MM_BY_UNITS = {4: 1.0, 5: 10.0, 6: 1000.0, 14: 100.0}
+
+
+def _regular_spacing(offsets, eps: float) -> Tuple[int, float, bool]:
+    """(число различных линий, медианный шаг, шаг регулярный) по смещениям вдоль нормали."""
+    import numpy as np
+
+    offsets = np.sort(offsets)
+    gaps = np.diff(offsets)
+    # Куски одной линии (одинаковое смещение) — это одна линия
+    gaps = gaps[gaps > eps]
+    if gaps.size == 0:
+        return 1, 0.0, False
+    median = float(np.median(gaps))
+    cv = float(np.std(gaps) / np.mean(gaps))
+    return int(gaps.size) + 1, median, cv <= NOISE_SPACING_CV
+
+
+def _mm_unit(lengths, units: int) -> float:
+    """1 мм в единицах чертежа: по $INSUNITS, иначе по длинным сегментам."""
+    import numpy as np
+
+    if units in MM_BY_UNITS:
+        return 1.0 / MM_BY_UNITS[units]
+    values = np.sort(lengths[lengths > 0])
+    return guess_tolerance(values[int(values.size * NOISE_SCALE_QUANTILE):].tolist())
+
+
+def find_noise_segments(segments: Sequence[Tuple[Point, Point]],
+                        layers: Sequence[str] | None = None,
+                        stage: str = "walls", units: int = 0) -> Tuple[List[bool], Dict[str, Any]]:
+    """
+    keep[i] = False для сегментов из шумовых кластеров. report — сколько
+    убрано, сколько кластеров, по слоям (если layers заданы) и примеры
+    кластеров: ячейка (bbox), угол, число линий, шаг. units — $INSUNITS чертежа.
+    """
+    report: Dict[str, Any] = {"removed": 0, "clusters": 0, "by_layer": {}, "samples": []}
+    n = len(segments)
+    if n < NOISE_MIN_LINES:
+        return [True] * n, report
+
+    import numpy as np
+
+    xy = np.array([(a[0], a[1], b[0], b[1]) for a, b in segments], dtype=np.float64).reshape(-1, 4)
+    d = xy[:, 2:] - xy[:, :2]
+    lengths = np.hypot(d[:, 0], d[:, 1])
+    unit = _mm_unit(lengths, units)
+    eps = unit * 0.5
+
+    short = np.flatnonzero((lengths > eps) & (lengths <= NOISE_MAX_LENGTH * unit))
+    noise = np.zeros(n, dtype=bool)
+    if short.size < NOISE_MIN_LINES:
+        return [True] * n, report
+
+    angle = np.degrees(np.arctan2(d[short, 1], d[short, 0])) % 180.0
+    mid = (xy[short, :2] + xy[short, 2:]) / 2
+    size = NOISE_CELL * unit
+    diag = current_diagnostics()
+
+    for phase, shift in ((0.0, 0.0), (0.0, NOISE_ANGLE_BIN / 2), (0.5, 0.0), (0.5, NOISE_ANGLE_BIN / 2)):
+        cells = np.floor(mid / size + phase).astype(np.int64)
+        bins = np.floor(((angle + shift) % 180.0) / NOISE_ANGLE_BIN).astype(np.int64)
+        keys = np.column_stack([cells, bins])
+        uniq, inverse, counts = np.unique(keys, axis=0, return_inverse=True, return_counts=True)
+        inverse = inverse.reshape(-1)
+        order = np.argsort(inverse, kind="stable")
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        for g in np.flatnonzero(counts >= NOISE_MIN_LINES):
+            members = order[starts[g]:starts[g] + counts[g]]
+            idx = short[members]
+            if noise[idx].all():
+                continue
+            # Средний угол по удвоенным углам: 179° и 1° — одно направление
+            theta = np.radians(angle[members]) * 2
+            mean = np.arctan2(np.sin(theta).mean(), np.cos(theta).mean()) / 2
+            normal = np.array([-np.sin(mean), np.cos(mean)])
+            lines, spacing, regular = _regular_spacing(mid[members] @ normal, eps)
+            dense = counts[g] >= NOISE_DENSE_COUNT
+            if lines < NOISE_MIN_LINES or not (dense or (regular and spacing <= NOISE_MAX_SPACING * unit)):
+                continue
+
+            noise[idx] = True
+            report["clusters"] += 1
+            x0, y0 = ((int(v) - phase) * size for v in uniq[g][:2])
+            sample = {
+                "bbox": [x0, y0, x0 + size, y0 + size],
+                "angle": round(float(np.degrees(mean)), 1) % 180.0,
+                "segments": int(counts[g]),
+                "lines": lines,
+                "spacing": round(spacing, 4),
+                "reason": "regular" if regular and not dense else "dense",
+            }
+            if len(report["samples"]) < NOISE_REPORT_SAMPLES:
+                report["samples"].append(sample)
+            if diag is not None:
+                diag.skip(stage, "noise_cluster", **sample)
+
+    report["removed"] = int(noise.sum())
+    if layers is not None and report["removed"]:
+        by_layer: Dict[str, int] = {}
+        for i in np.flatnonzero(noise).tolist():
+            by_layer[layers[i]] = by_layer.get(layers[i], 0) + 1
+        report["by_layer"] = dict(sorted(by_layer.items()))
+    if diag is not None:
+        diag.count(stage, "noise_removed", report["removed"])
+    return (~noise).tolist(), report
@@ -2,11 +2,17 @@
 
 from __future__ import annotations
 from typing import List, Dict, Any, Optional, Tuple
+import logging
 import math
+from dataclasses import dataclass
 import ezdxf
 from ezdxf.math import Matrix44, Vec3, BoundingBox
 
 from wall_graph import vector_distance_point_to_segment
+from spatial_index import GridIndex
+from diagnostics import current_diagnostics
+
+log = logging.getLogger(__name__)
 
 # Ключевые слова для поиска блоков
 LAYER_KEYWORDS = {
@@ -66,47 +72,66 @@ def get_transformed_block_geometry_center(insert: ezdxf.entities.Insert, block:
     return (center.x, center.y)
 
 
-def analyze_openings(doc: ezdxf.EzDxfDocument, walls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """
-    Ищет блоки (INSERT) по имени блока ИЛИ по имени слоя, и привязывает их к ближайшей стене.
-    Возвращает ГЛОБАЛЬНЫЕ координаты объектов.
-    """
+def build_wall_index(walls: List[Dict[str, Any]], cell_size: float = MAX_DISTANCE_TOLERANCE) -> GridIndex:
+    """Индекс осей стен по bbox: ключ — позиция стены в списке walls."""
+    index = GridIndex(cell_size)
+    for i, wall in enumerate(walls):
+        (x1, y1), (x2, y2) = wall['start'], wall['end']
+        index.insert(i, (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)))
+    return index
+
+
+@dataclass
+class OpeningCandidate:
+    """INSERT, похожий на проём, — всё, что нужно для привязки без документа DXF."""
+    type: str
+    block_name: str
+    layer: str
+    handle: str
+    x: float
+    y: float
+    rotation: float
+    xscale: float
+
+
+def opening_type(block_name: str, layer: str) -> Optional[str]:
+    """Тип проёма по слою (приоритет) или по имени блока; None — не проём."""
+    layer = layer.upper()
+        
+    # 1. ОПРЕДЕЛЕНИЕ ТИПА (ПРИОРИТЕТ СЛОЯ - самый надежный способ для АР)
+    if "АР_ОКНА И ВИТРАЖИ" in layer or "АР_ОКНА" in layer or "ОКНА" in layer or "ВИТРАЖИ" in layer:
+        return "window"
+    elif "АР_ДВЕРЬ" in layer or "ДВЕРЬ" in layer:
+        return "door"
+            
+    # 2. Проверка по имени БЛОКА (если слой не помог)
+    name_upper = block_name.upper()
+    if any(k in name_upper for k in LAYER_KEYWORDS["WINDOW"]):
+        return "window"
+    elif any(k in name_upper for k in LAYER_KEYWORDS["DOOR"]):
+        return "door"
+    return None
+
+
+def collect_opening_candidates(doc: ezdxf.EzDxfDocument) -> List[OpeningCandidate]:
+    """INSERT модели, похожие на окна и двери, с центром геометрии блока в мировых координатах."""
     msp = doc.modelspace()
-    openings = []
-    
-    # --- ДЕБАГ: НАЧАЛО РАБОТЫ ---
+    candidates: List[OpeningCandidate] = []
+
     all_inserts = list(msp.query('INSERT'))
-    print("-" * 50)
-    print(f"DEBUG: Начинаем поиск проемов. Найдено {len(all_inserts)} INSERT-объектов.")
-    print(f"DEBUG: Стен для привязки: {len(walls)}.")
-    print(f"DEBUG: Допуск на привязку (мм): {MAX_DISTANCE_TOLERANCE}")
-    
+    diag = current_diagnostics()
+    if diag is not None:
+        diag.count("openings", "inserts", len(all_inserts))
+
     for insert in all_inserts:
         name = insert.dxf.name # Case sensitive lookup in blocks
-        dxf_name_upper = name.upper()
-        layer = insert.dxf.layer.upper()
-        
-        opening_type = None
-        
-        # 1. ОПРЕДЕЛЕНИЕ ТИПА (ПРИОРИТЕТ СЛОЯ - самый надежный способ для АР)
-        if "АР_ОКНА И ВИТРАЖИ" in layer or "АР_ОКНА" in layer or "ОКНА" in layer or "ВИТРАЖИ" in layer:
-            opening_type = "window"
-        elif "АР_ДВЕРЬ" in layer or "ДВЕРЬ" in layer:
-            opening_type = "door"
-            
-        # 2. Проверка по имени БЛОКА (если слой не помог)
-        if not opening_type:
-            if any(k in dxf_name_upper for k in LAYER_KEYWORDS["WINDOW"]):
-                opening_type = "window"
-            elif any(k in dxf_name_upper for k in LAYER_KEYWORDS["DOOR"]):
-                opening_type = "door"
-            
-        if not opening_type:
+        kind = opening_type(name, insert.dxf.layer)
+        if not kind:
             # Блок пропущен, потому что не похож на проем
+            if diag is not None:
+                diag.count("openings", "skipped.not_opening")
             continue
             
-        # 3. ИЗВЛЕЧЕНИЕ ПАРАМЕТРОВ (если блок прошел фильтр)
-        
         # Попытка получить глобальные координаты геометрии
         global_pos = None
         if name in doc.blocks:
@@ -120,8 +145,36 @@ def analyze_openings(doc: ezdxf.EzDxfDocument, walls: List[Dict[str, Any]]) -> L
             x = float(insert.dxf.insert.x)
             y = float(insert.dxf.insert.y)
 
-        rotation = float(insert.dxf.rotation)
-        scale_x = abs(insert.dxf.xscale)
+        candidates.append(OpeningCandidate(
+            type=kind, block_name=name.upper(), layer=insert.dxf.layer, handle=insert.dxf.handle,
+            x=x, y=y, rotation=float(insert.dxf.rotation), xscale=insert.dxf.xscale,
+        ))
+    return candidates
+
+
+def analyze_openings(doc: ezdxf.EzDxfDocument, walls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Ищет блоки (INSERT) по имени блока ИЛИ по имени слоя, и привязывает их к ближайшей стене.
+    Возвращает ГЛОБАЛЬНЫЕ координаты объектов.
+    """
+    return bind_openings(collect_opening_candidates(doc), walls)
+
+
+def bind_openings(candidates: List[OpeningCandidate], walls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Привязка кандидатов к ближайшей стене; непривязанные отбрасываются."""
+    openings = []
+    log.debug("Поиск проемов: %d кандидатов, %d стен, допуск привязки %s",
+              len(candidates), len(walls), MAX_DISTANCE_TOLERANCE)
+    diag = current_diagnostics()
+
+    # Кандидаты на привязку берём из сетки, а не перебором всех стен
+    wall_index = build_wall_index(walls)
+    
+    for cand in candidates:
+        opening_type = cand.type
+        x, y = cand.x, cand.y
+        rotation = cand.rotation
+        scale_x = abs(cand.xscale)
         width = scale_x 
         
         # Эвристика для ширины (если координаты в мм, то переводим в м)
@@ -136,14 +189,18 @@ def analyze_openings(doc: ezdxf.EzDxfDocument, walls: List[Dict[str, Any]]) -> L
         # 4. ПРИВЯЗКА К СТЕНЕ (Host Wall)
         host_wall_id = None
         min_dist = float('inf')
+        nearest = float('inf')   # ближайшая стена вообще, для диагностики непривязанных
         
         p_insert = (x, y)
         
-        for wall in walls:
+        # Порядок как в списке walls: при равных расстояниях побеждает первая стена
+        for wall_pos in sorted(wall_index.query_point(p_insert, MAX_DISTANCE_TOLERANCE)):
+            wall = walls[wall_pos]
             w_start = wall['start']
             w_end = wall['end']
             
             dist = vector_distance_point_to_segment(p_insert, w_start, w_end)
+            nearest = min(nearest, dist)
             
             # Используем 1000 мм для допуска
             if dist < MAX_DISTANCE_TOLERANCE and dist < min_dist: 
@@ -155,17 +212,24 @@ def analyze_openings(doc: ezdxf.EzDxfDocument, walls: List[Dict[str, Any]]) -> L
             openings.append({
                 "id": f"opening-{len(openings)+1}",
                 "type": opening_type,
-                "layer": insert.dxf.layer,
+                "layer": cand.layer,
                 "position": [x, y], # Теперь это глобальные координаты центра геометрии
                 "width": round(width, 2),
                 "rotation": rotation,
                 "wall_id": host_wall_id,
-                "block_name": dxf_name_upper
+                "block_name": cand.block_name
             })
-        else:
-            # DEBUG: Причина 2: Блок найден, но не привязался к стене
-            print(f"SKIP: Блок {dxf_name_upper} ({opening_type}) не привязался к стене (Min Dist: {min_dist}).")
-
-    print(f"DEBUG: Финальное количество найденных проемов: {len(openings)}")
-    print("-" * 50)
+        elif diag is not None:
+            # Блок похож на проем, но рядом нет стены. Индекс отдаёт только стены
+            # в пределах допуска — для сохраняемых примеров ближайшую ищем по всем стенам
+            if nearest == float('inf') and diag.wants_sample("openings", "unbound"):
+                nearest = min((vector_distance_point_to_segment(p_insert, w['start'], w['end'])
+                               for w in walls), default=float('inf'))
+            diag.skip("openings", "unbound", block=cand.block_name, type=opening_type,
+                      handle=cand.handle, position=[x, y],
+                      min_distance=None if nearest == float('inf') else round(float(nearest), 1))
+
+    if diag is not None:
+        diag.count("openings", "found", len(openings))
+    log.debug("Найдено проемов: %d", len(openings))
     return openings
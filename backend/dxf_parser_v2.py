@@ -1,11 +1,150 @@
 
 import ezdxf
 from ezdxf import path
+from ezdxf.entities.boundary_paths import BoundaryPathType, EdgeType
+import logging
 import math
-from typing import Dict, List, Any, Optional, Tuple
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Set, Tuple
+
+from diagnostics import current_diagnostics
+from layer_keywords import WALL_KEYWORDS
+from parser_version import PARSER_VERSION
+
+log = logging.getLogger(__name__)
 
 # Module A: Semantic Material Mapper
 
+# Legend geometry is measured in legend header text heights, so the same
+# rules work for plans drawn in mm and in m.
+LEGEND_HEADERS = ("УСЛОВНЫЕ ОБОЗНАЧЕНИЯ", "LEGEND")
+LEGEND_ROI_LEFT = 5.0       # how far left of the header the samples may start
+LEGEND_ROI_WIDTH = 60.0     # sample + label width, to the right of the header
+LEGEND_ROI_DEPTH = 80.0     # how far below the header rows are searched
+LEGEND_END_GAP = 6.0        # a vertical gap this large between rows ends the legend
+
+LEGEND_CACHE_SIZE = 64
+_NO_GUID = "{00000000-0000-0000-0000-000000000000}"
+
+# Legend label -> material. Checked in order: specific words before the words
+# they contain ("ГАЗОБЕТОН" before "БЕТОН").
+LEGEND_KEYWORDS = [
+    ("ЖЕЛЕЗОБЕТОН", "concrete"), ("МОНОЛИТ", "concrete"),
+    ("ГАЗОБЕТОН", "brick"), ("ПЕНОБЕТОН", "brick"), ("ГАЗОБЛОК", "brick"),
+    ("КИРПИЧ", "brick"), ("БЛОК", "brick"),
+    ("БЕТОН", "concrete"),
+    ("ПЕРЕГОРОД", "partition"), ("ГКЛ", "partition"),
+    ("CONCRETE", "concrete"), ("MONOLIT", "concrete"), ("BETON", "concrete"),
+    ("BRICK", "brick"), ("KIRPICH", "brick"), ("BLOCK", "brick"), ("GAS", "brick"),
+    ("PARTITION", "partition"),
+]
+MATERIAL_COLORS = {"concrete": "#A9A9A9", "brick": "#CD5C5C", "partition": "#D2B48C"}
+
+# Decoded legends by document key: {"mapping": {...}, "samples": {handles}}
+_legend_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_legend_lock = threading.Lock()
+
+
+def legend_cache_key(doc) -> Optional[str]:
+    """
+    Fallback document identity for the legend cache, used when the caller
+    has no file hash to pass as doc_key: CAD tools (and ezdxf) renew
+    $VERSIONGUID on every save. Fixed or missing GUIDs disable caching.
+    """
+    fingerprint = doc.header.get("$FINGERPRINTGUID", _NO_GUID)
+    version = doc.header.get("$VERSIONGUID", _NO_GUID)
+    if _NO_GUID in (fingerprint, version):
+        return None
+    return f"{fingerprint}:{version}:{doc.header.get('$TDUPDATE', 0)}"
+
+
+def legend_material(text: str) -> Optional[str]:
+    upper = text.upper()
+    for keyword, material in LEGEND_KEYWORDS:
+        if keyword in upper:
+            return material
+    return None
+
+
+def _text_anchor(entity) -> Tuple[str, float, float, float]:
+    """(plain text, x, vertical center, text height)."""
+    if entity.dxftype() == "TEXT":
+        height = entity.dxf.height
+        insert = entity.dxf.insert
+        return entity.plain_text(), insert.x, insert.y + height / 2, height
+    height = entity.dxf.char_height
+    insert = entity.dxf.insert
+    # MTEXT attachment 1-3: insert at the top, 4-6: middle, 7-9: bottom
+    row = (entity.dxf.get("attachment_point", 1) - 1) // 3
+    return entity.plain_text(), insert.x, insert.y - height / 2 * (1 - row), height
+
+
+def _hatch_bbox(hatch) -> Optional[Tuple[float, float, float, float]]:
+    """Boundary bbox from the raw boundary data (no path conversion)."""
+    xs: List[float] = []
+    ys: List[float] = []
+    for p in hatch.paths:
+        if p.type == BoundaryPathType.POLYLINE:
+            for v in p.vertices:
+                xs.append(v[0])
+                ys.append(v[1])
+            continue
+        for edge in p.edges:
+            if edge.type == EdgeType.LINE:
+                xs += (edge.start[0], edge.end[0])
+                ys += (edge.start[1], edge.end[1])
+            elif edge.type == EdgeType.ARC:
+                xs += (edge.center[0] - edge.radius, edge.center[0] + edge.radius)
+                ys += (edge.center[1] - edge.radius, edge.center[1] + edge.radius)
+            elif edge.type == EdgeType.ELLIPSE:
+                r = math.hypot(edge.major_axis[0], edge.major_axis[1])
+                xs += (edge.center[0] - r, edge.center[0] + r)
+                ys += (edge.center[1] - r, edge.center[1] + r)
+            elif edge.type == EdgeType.SPLINE:
+                for cp in edge.control_points:
+                    xs.append(cp[0])
+                    ys.append(cp[1])
+    if not xs:
+        return None
+    return (min(xs), min(ys), max(xs), max(ys))
+
+
+def cluster_rows(items: List[Dict[str, Any]], tolerance: float, end_gap: float) -> List[List[Dict[str, Any]]]:
+    """
+    Sorted sweep from the top: an item joins the current row if its center
+    is within tolerance of the row's first item, otherwise it starts a new
+    row. A gap larger than end_gap between rows ends the sweep.
+    """
+    rows: List[List[Dict[str, Any]]] = []
+    for item in sorted(items, key=lambda it: (-it["y"], it["x"])):
+        if rows and rows[-1][0]["y"] - item["y"] <= tolerance:
+            rows[-1].append(item)
+            continue
+        if rows and min(it["y"] for it in rows[-1]) - item["y"] > end_gap:
+            break
+        rows.append([item])
+    return rows
+
+
+def pair_row(row: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], str]]:
+    """
+    Pairs each sample hatch with the labels to its right (up to the next
+    hatch). A row with a single hatch takes all its labels.
+    """
+    hatches = sorted((it for it in row if it["kind"] == "hatch"), key=lambda it: it["x"])
+    texts = sorted((it for it in row if it["kind"] == "text"), key=lambda it: it["x"])
+    pairs = []
+    for k, h in enumerate(hatches):
+        right = hatches[k + 1]["x"] if k + 1 < len(hatches) else math.inf
+        label = [t["text"] for t in texts if h["x"] <= t["x"] < right]
+        if not label and len(hatches) == 1:
+            label = [t["text"] for t in texts]
+        if label:
+            pairs.append((h, " ".join(label)))
+    return pairs
+
+
 class MaterialMapper:
     DEFAULT_MAPPING = {
         "MONOLIT": {"material": "concrete", "color": "#A9A9A9"},
@@ -21,93 +160,110 @@ class MaterialMapper:
         "КИРПИЧ": {"material": "brick", "color": "#CD5C5C"},
     }
 
-    def __init__(self, doc):
+    def __init__(self, doc, doc_key: Optional[str] = None):
         self.doc = doc
-        self.legend_mapping = self._parse_legend()
-
-    def _parse_legend(self) -> Dict[str, Dict[str, str]]:
+        key = doc_key or legend_cache_key(doc)
+        legend = self._cached_legend(key)
+        self.legend_mapping: Dict[str, Dict[str, str]] = legend["mapping"]
+        # Handles of the legend sample hatches: these are not walls
+        self.legend_samples: Set[str] = legend["samples"]
+
+    def _cached_legend(self, key: Optional[str]) -> Dict[str, Any]:
+        diag = current_diagnostics()
+        if key is not None:
+            with _legend_lock:
+                legend = _legend_cache.get(key)
+                if legend is not None:
+                    _legend_cache.move_to_end(key)
+            if legend is not None:
+                if diag is not None:
+                    diag.count("legend", "cache_hit")
+                return legend
+
+        legend = self._parse_legend()
+        if key is not None:
+            with _legend_lock:
+                _legend_cache[key] = legend
+                while len(_legend_cache) > LEGEND_CACHE_SIZE:
+                    _legend_cache.popitem(last=False)
+        return legend
+
+    def _parse_legend(self) -> Dict[str, Any]:
         """
-        Attempts to find a legend and extract material mappings.
-        Returns a dict: { pattern_name: { 'material': '...', 'color': '...' } }
+        Finds the legend and decodes it into { pattern_name: { 'material', 'color', 'label' } }.
+
+        One pass over TEXT/MTEXT finds the header; hatches are only read if a
+        header exists. Labels and hatches are filtered against the region below
+        the header by bbox directly: there is a single query, so an index would
+        cost more to build than it saves. The hits are clustered into rows by Y
+        (cluster_rows) and every sample is paired with its label (pair_row).
         """
-        mapping = {}
+        legend: Dict[str, Any] = {"mapping": {}, "samples": set()}
         msp = self.doc.modelspace()
+        diag = current_diagnostics()
 
-        # 1. Find Legend Header
-        legend_header = None
+        # 1. Find Legend Header, keep the other labels for the region query
+        header = None
+        texts = []
         for entity in msp.query("MTEXT TEXT"):
-            text = entity.dxf.text if entity.dxftype() == "TEXT" else entity.text
-            if not text:
+            try:
+                text, x, y, height = _text_anchor(entity)
+            except Exception:
                 continue
-            if "УСЛОВНЫЕ ОБОЗНАЧЕНИЯ" in text.upper() or "LEGEND" in text.upper():
-                legend_header = entity
-                break
-
-        if not legend_header:
-            return {}
-
-        # 2. Define ROI (Region of Interest) - Below header
-        # Assume header is top-left of legend
-        try:
-            # Get bounding box of header
-            # Simple approximation from insertion point
-            header_insert = legend_header.dxf.insert
-            header_y = header_insert.y
-            header_x = header_insert.x
-
-            # Look for items below (y < header_y) and near x (x - 50 < item_x < x + 500)
-            # Units are unknown, assuming consistent scale.
-
-            candidates = []
-
-            # Search area: Below header
-            bbox_min_y = header_y - 2000 # Heuristic search depth
-            bbox_max_y = header_y
-            bbox_min_x = header_x - 100
-            bbox_max_x = header_x + 1000
-
-            # Collect Hatches and Texts in ROI
-            for entity in msp.query("HATCH MTEXT TEXT"):
-                if entity == legend_header:
+            if not text.strip():
+                continue
+            if header is None and any(h in text.upper() for h in LEGEND_HEADERS):
+                header = (x, y, height or 1.0)
+                continue
+            texts.append({"kind": "text", "text": " ".join(text.split()), "x": x, "y": y, "h": height})
+
+        if header is None:
+            return legend
+
+        # 2. Region of Interest below the header, in header text heights
+        hx, hy, hh = header
+        roi = (hx - LEGEND_ROI_LEFT * hh, hy - LEGEND_ROI_DEPTH * hh,
+               hx + LEGEND_ROI_WIDTH * hh, hy - hh / 2)
+        candidates: List[Dict[str, Any]] = [
+            t for t in texts if roi[0] <= t["x"] <= roi[2] and roi[1] <= t["y"] <= roi[3]]
+        for hatch in msp.query("HATCH"):
+            bbox = _hatch_bbox(hatch)
+            # Samples must lie inside the region, not just touch it (walls of the plan can)
+            if bbox is None or not (roi[0] <= bbox[0] and bbox[2] <= roi[2]
+                                    and roi[1] <= bbox[1] and bbox[3] <= roi[3]):
+                continue
+            candidates.append({"kind": "hatch", "handle": hatch.dxf.handle, "pattern": hatch.dxf.pattern_name,
+                               "x": bbox[0], "y": (bbox[1] + bbox[3]) / 2, "bbox": bbox})
+
+        # 3. Cluster by Y (Rows) and pair samples with labels
+        sample_heights = sorted(it["bbox"][3] - it["bbox"][1] for it in candidates if it["kind"] == "hatch")
+        tolerance = max(hh, sample_heights[len(sample_heights) // 2] / 2) if sample_heights else hh
+        rows = cluster_rows(candidates, tolerance, LEGEND_END_GAP * hh)
+
+        for row in rows:
+            for sample, label in pair_row(row):
+                legend["samples"].add(sample["handle"])
+                material = legend_material(label)
+                if material is None:
+                    if diag is not None:
+                        diag.skip("legend", "unknown_material", pattern=sample["pattern"], label=label)
                     continue
+                # The topmost row wins if a pattern is listed twice
+                legend["mapping"].setdefault(sample["pattern"], {
+                    "material": material, "color": MATERIAL_COLORS[material], "label": label,
+                })
 
-                # Get position (insert point or center)
-                pos = None
-                if entity.dxftype() == "HATCH":
-                    # Hatch doesn't have a single insert point easily accessible without processing paths
-                    # Use geometric center approximation or first path start
-                    if len(entity.paths) > 0:
-                        # Use seed point if available
-                        if entity.dxf.seeds:
-                            pos = entity.dxf.seeds[0]
-                        else:
-                             # Approximate from boundary
-                             # Skipping complex bbox calc for speed, just check layer/type later
-                             continue
-                else:
-                    pos = entity.dxf.insert
-
-                if pos and bbox_min_x < pos.x < bbox_max_x and bbox_min_y < pos.y < bbox_max_y:
-                    candidates.append(entity)
-
-            # 3. Cluster by Y (Rows)
-            # This is complex to implement robustly without visual analysis libraries.
-            # Simplified approach: If we find a Hatch and a Text with similar Y, pair them.
-
-            # For now, return empty as this requires advanced heuristic tuning
-            # and the Fallback Strategy is prioritized as Crucial.
-            pass
-
-        except Exception:
-            pass
-
-        return mapping
+        if diag is not None:
+            diag.count("legend", "rows", len(rows))
+            diag.count("legend", "patterns", len(legend["mapping"]))
+        log.debug("Legend: %d rows, %d patterns", len(rows), len(legend["mapping"]))
+        return legend
 
     def get_material_props(self, layer_name: str, pattern_name: str) -> Dict[str, str]:
         """
         Returns material properties based on Legend (priority) or Fallback (layer name).
         """
-        # 1. Check Legend (Not fully implemented, placeholder)
+        # 1. Check Legend
         if pattern_name in self.legend_mapping:
             return self.legend_mapping[pattern_name]
 
@@ -143,13 +299,13 @@ def _path_to_svg(p: path.Path) -> str:
     parts.append("Z")
     return " ".join(parts)
 
-def extract_walls_v2(doc) -> List[Dict[str, Any]]:
-    mapper = MaterialMapper(doc)
+
+def extract_walls_v2(doc, doc_key: Optional[str] = None) -> List[Dict[str, Any]]:
+    mapper = MaterialMapper(doc, doc_key)
     msp = doc.modelspace()
     walls = []
 
-    # Filter keywords for layers
-    WALL_KEYWORDS = ["WALL", "STEN", "MONOLIT", "BLOCK", "BRICK", "GAS", "PARTITION", "PEREG"]
+    diag = current_diagnostics()
 
     count = 0
     for hatch in msp.query("HATCH"):
@@ -157,6 +313,14 @@ def extract_walls_v2(doc) -> List[Dict[str, Any]]:
 
         # Filter by Layer
         if not any(k in layer_name.upper() for k in WALL_KEYWORDS):
+            if diag is not None:
+                diag.count("hatch", "skipped.layer")
+            continue
+
+        # Legend samples are drawn on wall layers too, but they are not walls
+        if hatch.dxf.handle in mapper.legend_samples:
+            if diag is not None:
+                diag.count("hatch", "skipped.legend_sample")
             continue
 
         # Get Material
@@ -191,16 +355,21 @@ def extract_walls_v2(doc) -> List[Dict[str, Any]]:
             count += 1
 
         except Exception as e:
-            print(f"Error processing hatch {hatch.dxf.handle}: {e}")
+            if diag is not None:
+                diag.skip("hatch", "error", handle=hatch.dxf.handle, layer=layer_name, error=str(e))
+            else:
+                log.debug("Error processing hatch %s: %s", hatch.dxf.handle, e)
             continue
 
-    print(f"DEBUG: V2 Parser found {count} hatched walls.")
+    if diag is not None:
+        diag.count("hatch", "found", count)
+    log.debug("V2 Parser found %d hatched walls.", count)
     return walls
 
 # Module C: JSON Output Structure
 
-def analyze_dxf_v2(doc) -> Dict[str, Any]:
-    walls = extract_walls_v2(doc)
+def analyze_dxf_v2(doc, doc_key: Optional[str] = None) -> Dict[str, Any]:
+    walls = extract_walls_v2(doc, doc_key)
 
     return {
         "scene": {
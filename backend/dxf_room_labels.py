@@ -0,0 +1,181 @@
+# backend/dxf_room_labels.py
+"""
+Подписи помещений: номер, имя и площадь из TEXT/MTEXT/ATTRIB внутри контура.
+
+Подписи раскладываются по контурам через PolygonIndex: для каждого помещения
+берутся только подписи из его bbox и проверяются векторизованно
+«точка в многоугольнике». Подпись достаётся самому маленькому помещению,
+которое её содержит (вложенные контуры не «крадут» подписи друг у друга).
+"""
+from __future__ import annotations
+
+import re
+from typing import Any, Dict, List
+
+import numpy as np
+
+from spatial_index import PolygonIndex
+
+# Слои с марками, осями и штампами — это не подписи помещений
+LABEL_LAYER_EXCLUDE = (
+    "ОСЬ", "ОСИ", "AXIS", "МАРКА", "MARK", "ШТАМП", "STAMP",
+    "РАЗМЕР", "DIM", "DEFPOINTS", "ВЫНОС", "LEADER",
+)
+
+# Допустимое расхождение заявленной и вычисленной площади (доля)
+AREA_MISMATCH_TOL = 0.05
+
+# $INSUNITS → множитель перевода квадратных единиц чертежа в м²
+AREA_SCALE_BY_UNITS = {4: 1e-6, 5: 1e-4, 6: 1.0, 14: 1e-2}
+
+_AREA_WITH_UNIT = re.compile(
+    r"(?:S\s*=?\s*)?(\d+(?:[.,]\d+)?)\s*(?:м2|м²|m2|m²|кв\.?\s*м)", re.IGNORECASE)
+_BARE_AREA = re.compile(r"^\d+[.,]\d{1,2}$")
+_NUMBER = re.compile(r"^№?\s*(\d{1,4}[а-яА-Яa-zA-Z]?|\d{1,2}-\d{1,3})$")
+# Управляющие коды AutoCAD: %%u/%%o — подчёркивание/надчёркивание, %%k — зачёркивание
+_CONTROL_CODES = re.compile(r"%%[uUoOkK]")
+
+
+# -----------------------------------------------------------
+# Сбор подписей
+# -----------------------------------------------------------
+
+def _label_layer_ok(layer: str) -> bool:
+    layer = layer.upper()
+    return not any(k in layer for k in LABEL_LAYER_EXCLUDE)
+
+
+def collect_text_labels(msp) -> List[Dict[str, Any]]:
+    """Все текстовые подписи модели с точкой привязки."""
+    labels: List[Dict[str, Any]] = []
+
+    def add(text: str, pos, layer: str) -> None:
+        # MTEXT.plain_text() оставляет коды %%u как есть — штампы площадей ими подчёркнуты
+        text = _CONTROL_CODES.sub("", text or "").strip()
+        if text:
+            labels.append({"text": text, "x": float(pos.x), "y": float(pos.y), "layer": layer})
+
+    for e in msp.query("TEXT MTEXT"):
+        layer = e.dxf.layer
+        if not _label_layer_ok(layer):
+            continue
+        try:
+            if e.dxftype() == "TEXT":
+                # Для выровненного текста точка вставки — align_point
+                aligned = e.dxf.get("halign", 0) or e.dxf.get("valign", 0)
+                pos = e.dxf.align_point if aligned and e.dxf.hasattr("align_point") else e.dxf.insert
+                add(e.plain_text(), pos, layer)
+            else:
+                add(e.plain_text(), e.dxf.insert, layer)
+        except Exception:
+            continue
+
+    # Штампы помещений часто оформлены блоком с атрибутами
+    for insert in msp.query("INSERT"):
+        if not insert.attribs or not _label_layer_ok(insert.dxf.layer):
+            continue
+        for attrib in insert.attribs:
+            add(attrib.dxf.text, attrib.dxf.insert, insert.dxf.layer)
+
+    return labels
+
+
+# -----------------------------------------------------------
+# Разбор текста подписи
+# -----------------------------------------------------------
+
+def _to_float(s: str) -> float:
+    return float(s.replace(",", "."))
+
+
+def parse_room_label(texts: List[str]) -> Dict[str, Any]:
+    """
+    Из набора строк выделяет номер, имя и заявленную площадь.
+    Понимает отдельные подписи ('101', 'Кухня', '12.40 м²') и
+    совмещённые ('101 Кухня 12.40').
+    """
+    number = None
+    names: List[str] = []
+    area = None
+
+    for text in texts:
+        for line in text.splitlines():
+            line = " ".join(line.split())
+            # Формулы вроде 'х0,5=1.85' (понижающий коэффициент лоджии) — не имя и не номер
+            if not line or "=" in line:
+                continue
+
+            m = _AREA_WITH_UNIT.search(line)
+            if m:
+                area = area if area is not None else _to_float(m.group(1))
+                line = (line[:m.start()] + line[m.end():]).strip()
+
+            tokens = line.split()
+            # Площадь без единиц — последним токеном, номер — первым
+            if tokens and _BARE_AREA.match(tokens[-1]) and area is None:
+                area = _to_float(tokens.pop())
+            if tokens and _NUMBER.match(tokens[0]) and number is None:
+                number = _NUMBER.match(tokens.pop(0)).group(1)
+            rest = " ".join(tokens)
+            if rest and any(ch.isalpha() for ch in rest):
+                names.append(rest)
+
+    name = max(names, key=len) if names else None
+    return {"number": number, "name": name, "declared_area": area}
+
+
+# -----------------------------------------------------------
+# Пространственное соединение подписей и помещений
+# -----------------------------------------------------------
+
+def assign_labels(rooms: List[Dict[str, Any]], labels: List[Dict[str, Any]]) -> Dict[int, List[int]]:
+    """{индекс помещения: [индексы подписей]} — каждая подпись в наименьшем содержащем контуре."""
+    if not rooms or not labels:
+        return {}
+
+    pts = np.array([(l["x"], l["y"]) for l in labels], dtype=float)
+    room_index = PolygonIndex([r["boundary_polygon"] for r in rooms], [r["area"] for r in rooms])
+    owner = room_index.locate(pts)
+
+    result: Dict[int, List[int]] = {}
+    for li, ri in enumerate(owner):
+        if ri >= 0:
+            result.setdefault(int(ri), []).append(li)
+    return result
+
+
+def area_scale(units: int, rooms: List[Dict[str, Any]]) -> float:
+    """Множитель перевода площади контура в м² по $INSUNITS (или по величине площадей)."""
+    if units in AREA_SCALE_BY_UNITS:
+        return AREA_SCALE_BY_UNITS[units]
+    areas = sorted(r["area"] for r in rooms)
+    # Помещение в 10 000 «единиц²» — это точно не м², считаем миллиметры
+    return 1e-6 if areas and areas[len(areas) // 2] > 1e4 else 1.0
+
+
+def label_rooms(rooms: List[Dict[str, Any]], labels: List[Dict[str, Any]],
+                scale: float = 1e-6) -> int:
+    """
+    Заполняет number/name/declared_area помещений из подписей внутри контура
+    и помечает расхождение заявленной и вычисленной площади.
+    Возвращает число подписанных помещений.
+    """
+    assigned = assign_labels(rooms, labels)
+    for ri, room in enumerate(rooms):
+        # Заявленная площадь — это площадь нетто (без шахт и колонн внутри)
+        room["area_m2"] = round(room.get("net_area", room["area"]) * scale, 2)
+        label_ids = assigned.get(ri)
+        if not label_ids:
+            continue
+        texts = [labels[i]["text"] for i in label_ids]
+        parsed = parse_room_label(texts)
+        room["labels"] = texts
+        if parsed["number"]:
+            room["number"] = parsed["number"]
+        if parsed["name"]:
+            room["name"] = parsed["name"]
+        if parsed["declared_area"] is not None:
+            declared = parsed["declared_area"]
+            room["declared_area"] = declared
+            room["area_mismatch"] = abs(declared - room["area_m2"]) > max(declared * AREA_MISMATCH_TOL, 0.05)
+    return len(assigned)
@@ -0,0 +1,130 @@
+# backend/dxf_room_nesting.py
+"""
+Вложенность контуров: дерево «кто в ком лежит» и классификация граней.
+
+Обход граней (dxf_rooms.find_polygons) даёт плоский список контуров:
+наружный контур здания, шахты, колонны и мебель выходят «помещениями»,
+а шахта внутри комнаты не вычитается из её площади. Здесь строится дерево
+вложенности и каждому контуру назначается вид:
+    envelope — корневой контур, который в основном заполнен другими
+               (обводка здания или секции);
+    room     — помещение;
+    hole     — шахта, колонна, препятствие внутри помещения.
+Виды чередуются по глубине: внутри envelope — помещения, внутри помещения —
+отверстия, внутри отверстия — снова помещения (островок).
+
+Родитель ищется заметанием по min_x: активны только контуры, чей bbox ещё
+не закончился по X; из них кандидаты — bbox которых содержит bbox контура,
+и первый по возрастанию площади, содержащий внутреннюю точку, — родитель.
+"""
+from __future__ import annotations
+
+import heapq
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from spatial_index import points_bbox, points_in_polygon
+
+Point = Tuple[float, float]
+
+# Корень считается обводкой здания, если дети покрывают не меньше этой доли площади
+ENVELOPE_COVERAGE = 0.5
+# Сдвиг внутренней точки от середины ребра, доля длины ребра
+INTERIOR_OFFSET = 1e-4
+
+
+def _interior_point(poly: List[Point]) -> Point:
+    """
+    Точка строго внутри контура: середина самого длинного ребра, чуть сдвинутая
+    внутрь (контуры обходятся против часовой стрелки — внутренность слева).
+    Вершины не годятся: соседние грани делят с контуром границу.
+    """
+    best, best_len = 0, -1.0
+    for i in range(len(poly) - 1):
+        d = math.dist(poly[i], poly[i + 1])
+        if d > best_len:
+            best, best_len = i, d
+    (x1, y1), (x2, y2) = poly[best], poly[best + 1]
+    if best_len <= 0:
+        return (x1, y1)
+    off = INTERIOR_OFFSET
+    return ((x1 + x2) / 2 - (y2 - y1) * off, (y1 + y2) / 2 + (x2 - x1) * off)
+
+
+def _bbox_contains(outer, inner) -> bool:
+    return outer[0] <= inner[0] and outer[1] <= inner[1] and outer[2] >= inner[2] and outer[3] >= inner[3]
+
+
+def build_containment_tree(polygons: List[List[Point]], areas: List[float]) -> List[Optional[int]]:
+    """Номер непосредственного родителя каждого контура (или None)."""
+    n = len(polygons)
+    bboxes = [points_bbox(p) for p in polygons]
+    parents: List[Optional[int]] = [None] * n
+
+    # Массивы вершин строятся один раз: крупные контуры проверяются многократно
+    arrays: Dict[int, np.ndarray] = {}
+
+    active: Dict[int, None] = {}
+    expiry: List[Tuple[float, int]] = []  # (max_x, индекс) — когда контур перестаёт быть активным
+
+    # При равном min_x крупные идут раньше, чтобы родитель уже был активен
+    for i in sorted(range(n), key=lambda k: (bboxes[k][0], -areas[k])):
+        bbox = bboxes[i]
+        while expiry and expiry[0][0] < bbox[0]:
+            active.pop(heapq.heappop(expiry)[1], None)
+
+        candidates = [j for j in active if areas[j] > areas[i] and _bbox_contains(bboxes[j], bbox)]
+        if candidates:
+            probe = np.array([_interior_point(polygons[i])])
+            for j in sorted(candidates, key=lambda k: (areas[k], k)):
+                if j not in arrays:
+                    arrays[j] = np.asarray(polygons[j], dtype=float)
+                if points_in_polygon(probe, arrays[j])[0]:
+                    parents[i] = j
+                    break
+
+        active[i] = None
+        heapq.heappush(expiry, (bbox[2], i))
+
+    return parents
+
+
+def nest_rooms(rooms: List[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    Дописывает помещениям kind, parent_id, depth, holes и net_area
+    (площадь за вычетом непосредственно вложенных отверстий).
+    Возвращает число контуров каждого вида.
+    """
+    polygons = [r["boundary_polygon"] for r in rooms]
+    areas = [r["area"] for r in rooms]
+    parents = build_containment_tree(polygons, areas)
+
+    children: Dict[int, List[int]] = {}
+    for i, p in enumerate(parents):
+        if p is not None:
+            children.setdefault(p, []).append(i)
+
+    # Родитель всегда больше ребёнка, поэтому обход по убыванию площади идёт сверху вниз
+    kinds: List[str] = [""] * len(rooms)
+    depth = [0] * len(rooms)
+    for i in sorted(range(len(rooms)), key=lambda k: -areas[k]):
+        p = parents[i]
+        if p is None:
+            covered = sum(areas[c] for c in children.get(i, ()))
+            kinds[i] = "envelope" if areas[i] > 0 and covered / areas[i] >= ENVELOPE_COVERAGE else "room"
+        else:
+            depth[i] = depth[p] + 1
+            kinds[i] = "hole" if kinds[p] == "room" else "room"
+
+    counts: Dict[str, int] = {"envelope": 0, "room": 0, "hole": 0}
+    for i, room in enumerate(rooms):
+        holes = [c for c in children.get(i, ()) if kinds[c] == "hole"]
+        room["kind"] = kinds[i]
+        room["parent_id"] = rooms[parents[i]]["id"] if parents[i] is not None else None
+        room["depth"] = depth[i]
+        room["holes"] = [rooms[c]["id"] for c in holes]
+        room["net_area"] = round(areas[i] - sum(areas[c] for c in holes), 2)
+        counts[kinds[i]] += 1
+    return counts
@@ -3,6 +3,11 @@ from typing import List, Dict, Any, Tuple
 import ezdxf
 import math
 
+from spatial_index import PointSnapper, guess_tolerance
+from dxf_room_labels import collect_text_labels, label_rooms, area_scale
+from dxf_room_nesting import nest_rooms
+from dxf_noise import find_noise_segments
+
 
 def analyze_rooms(doc: ezdxf.EzDxfDocument) -> Dict[str, Any]:
     """
@@ -12,9 +17,26 @@ def analyze_rooms(doc: ezdxf.EzDxfDocument) -> Dict[str, Any]:
     msp = doc.modelspace()
 
     # ---------------------------
-    # 1. Собираем кандидатов на границы помещений
+    # 1. Собираем кандидатов на границы помещений (и подписи для шага 6)
     # ---------------------------
-    edges = extract_room_edges(msp)
+    return analyze_room_edges(extract_room_edges(msp), collect_text_labels(msp),
+                              doc.header.get("$INSUNITS", 0))
+
+
+def analyze_room_edges(edges: List[Tuple[Tuple[float, float], Tuple[float, float]]],
+                       labels: List[Dict[str, Any]], units: int = 0,
+                       suppress_noise: bool = True) -> Dict[str, Any]:
+    """
+    Помещения из уже собранных граней и подписей (документ DXF не нужен).
+    suppress_noise — без кластеров штриховки и мусора (dxf_noise): иначе
+    расчленённая плитка пола даёт сотни «помещений».
+    """
+
+    noise = None
+    if suppress_noise:
+        keep, noise = find_noise_segments(edges, stage="rooms", units=units)
+        if noise["removed"]:
+            edges = [e for e, k in zip(edges, keep) if k]
 
     # ---------------------------
     # 2. Строим граф соединений сегментов
@@ -31,9 +53,23 @@ def analyze_rooms(doc: ezdxf.EzDxfDocument) -> Dict[str, Any]:
     # ---------------------------
     rooms = assemble_rooms(polygons)
 
+    # ---------------------------
+    # 5. Вложенность: обводка здания / помещения / отверстия, площадь нетто
+    # ---------------------------
+    kinds = nest_rooms(rooms)
+
+    # ---------------------------
+    # 6. Номера, имена и площади из подписей внутри контуров
+    # ---------------------------
+    labeled = label_rooms(rooms, labels, area_scale(units, rooms))
+
     return {
         "room_layers_used": ["auto_detect"],
         "total_polygons": len(polygons),
+        "room_kinds": kinds,
+        "labeled_rooms": labeled,
+        "area_mismatches": sum(1 for r in rooms if r.get("area_mismatch")),
+        "noise": noise,
         "rooms": rooms
     }
 
@@ -71,15 +107,32 @@ def extract_room_edges(msp) -> List[Tuple[Tuple[float, float], Tuple[float, floa
 # ================================================================
 #  ШАГ 2 — ГРАФ ГРАНЕЙ
 # ================================================================
-def build_room_graph(edges: List[Tuple[Tuple[float, float], Tuple[float, float]]]):
+def build_room_graph(edges: List[Tuple[Tuple[float, float], Tuple[float, float]]],
+                     snap_eps: float | None = None):
+    """
+    Граф смежности точек. Концы ближе snap_eps склеиваются в один узел
+    (узел представлен координатами первой попавшей в него точки),
+    иначе микро-зазоры черчения рвут контуры помещений.
+    """
     graph = {}
+    if not edges:
+        return graph
+
+    if snap_eps is None:
+        snap_eps = guess_tolerance(math.dist(a, b) for a, b in edges)
+    snapper = PointSnapper(snap_eps)
 
     def add(a, b):
-        graph.setdefault(a, []).append(b)
-        graph.setdefault(b, []).append(a)
+        if a == b:
+            return
+        graph.setdefault(a, [])
+        graph.setdefault(b, [])
+        if b not in graph[a]:
+            graph[a].append(b)
+            graph[b].append(a)
 
     for a, b in edges:
-        add(a, b)
+        add(snapper.snap_point(a), snapper.snap_point(b))
 
     return graph
 
@@ -89,48 +142,43 @@ def build_room_graph(edges: List[Tuple[Tuple[float, float], Tuple[float, float]]
 # ================================================================
 def find_polygons(graph) -> List[List[Tuple[float, float]]]:
     """
-    BFS/DFS обход для поиска циклов.
+    Обход граней планарного графа для поиска замкнутых контуров.
+
+    После склейки концов в узлах сходится больше двух рёбер, и обход
+    «первого соседа» сворачивает не туда. Поэтому каждое направленное ребро
+    проходится ровно один раз, а в узле выбирается следующее по часовой
+    стрелке ребро от входящего — так получаются минимальные грани.
+    Внешние грани компонент (обход по часовой, площадь <= 0) отбрасываются.
+    Каждый контур замкнут: первая точка повторена в конце.
     """
     polygons = []
 
-    visited_edges = set()
-
-    def edge_id(a, b):
-        return tuple(sorted([a, b]))
+    # Соседи каждого узла, упорядоченные по углу
+    order = {
+        v: sorted(ns, key=lambda n, v=v: math.atan2(n[1] - v[1], n[0] - v[0]))
+        for v, ns in graph.items()
+    }
+    position = {v: {n: i for i, n in enumerate(ns)} for v, ns in order.items()}
 
+    used = set()
     for start in graph:
-        for nxt in graph[start]:
-            if edge_id(start, nxt) in visited_edges:
+        for nxt in order[start]:
+            if (start, nxt) in used:
                 continue
 
-            path = [start, nxt]
-            visited_edges.add(edge_id(start, nxt))
-
-            current = nxt
-            prev = start
-
-            while True:
-                neighbors = graph[current]
-                next_nodes = [p for p in neighbors if p != prev]
-
-                if not next_nodes:
-                    break
-
-                nxt2 = next_nodes[0]
-                eid = edge_id(current, nxt2)
-
-                if eid in visited_edges:
-                    break
-
-                path.append(nxt2)
-                visited_edges.add(eid)
-
+            path = [start]
+            prev, current = start, nxt
+            while (prev, current) not in used:
+                used.add((prev, current))
+                path.append(current)
+                neighbors = order[current]
+                # Следующее ребро по часовой стрелке от входящего
+                nxt2 = neighbors[(position[current][prev] - 1) % len(neighbors)]
                 prev, current = current, nxt2
 
-                # нашёл цикл
-                if nxt2 == start and len(path) > 3:
-                    polygons.append(path)
-                    break
+            # нашёл цикл
+            if len(path) > 3 and path[-1] == start and _signed_area(path) > 0:
+                polygons.append(path)
 
     return polygons
 
@@ -173,6 +221,15 @@ def polygon_area(poly) -> float:
     return abs(area) / 2
 
 
+def _signed_area(poly) -> float:
+    area = 0
+    for i in range(len(poly) - 1):
+        x1, y1 = poly[i]
+        x2, y2 = poly[i + 1]
+        area += x1 * y2 - x2 * y1
+    return area / 2
+
+
 def polygon_perimeter(poly) -> float:
     per = 0
     for i in range(len(poly)):
@@ -0,0 +1,215 @@
+# backend/dxf_topology.py
+"""
+Топология плана: какие помещения соединяет каждый проём, из каких стен и
+проёмов состоит ограждение помещения и граф смежности помещений.
+
+Для стены или проёма берутся точки-«щупы» по обе стороны от оси стены
+(на полторы полутолщины по нормали); помещение, в которое попал щуп,
+ищется через PolygonIndex — только среди контуров, чей bbox содержит точку.
+
+Граф смежности:
+    nodes — id помещений и OUTSIDE ("outside") для наружной стороны;
+    edges — {"rooms": [a, b], "kind": "door" | "window" | "wall", "via": [...]}.
+Проходимы только рёбра "door" — по ним ищутся маршруты (find_route).
+"""
+from __future__ import annotations
+
+import math
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from spatial_index import PolygonIndex
+
+Point = Tuple[float, float]
+
+OUTSIDE = "outside"
+
+# Щуп ставится на PROBE_FACTOR полутолщин стены от оси
+PROBE_FACTOR = 1.5
+# Доли длины стены, в которых проверяется, какие помещения она разделяет
+WALL_SAMPLES = (0.25, 0.5, 0.75)
+
+
+# -----------------------------------------------------------
+# Геометрия стены
+# -----------------------------------------------------------
+
+def _axis(wall: Dict[str, Any]) -> Tuple[Point, Point, float]:
+    """Единичное направление, нормаль и длина оси стены."""
+    (x1, y1), (x2, y2) = wall["start"], wall["end"]
+    length = math.hypot(x2 - x1, y2 - y1)
+    if length == 0:
+        return (1.0, 0.0), (0.0, 1.0), 0.0
+    dx, dy = (x2 - x1) / length, (y2 - y1) / length
+    return (dx, dy), (-dy, dx), length
+
+
+def _half_thickness(wall: Dict[str, Any], normal: Point) -> float:
+    """Полутолщина в единицах чертежа — по углам контура стены, а не по полю thickness (мм)."""
+    sx, sy = wall["start"]
+    corners = wall.get("coordinates") or []
+    half = max((abs((cx - sx) * normal[0] + (cy - sy) * normal[1]) for cx, cy in corners), default=0.0)
+    if half > 0:
+        return half
+    # Контура нет — толщина в мм, чертёж предполагаем в мм
+    return float(wall.get("thickness") or 100.0) / 2
+
+
+def _probe_pair(point: Point, normal: Point, offset: float) -> Tuple[Point, Point]:
+    x, y = point
+    return ((x + normal[0] * offset, y + normal[1] * offset),
+            (x - normal[0] * offset, y - normal[1] * offset))
+
+
+def _project(point: Point, start: Point, direction: Point, length: float) -> Point:
+    """Проекция точки на ось стены (центр блока проёма часто смещён дугой двери)."""
+    t = (point[0] - start[0]) * direction[0] + (point[1] - start[1]) * direction[1]
+    t = min(max(t, 0.0), length)
+    return (start[0] + direction[0] * t, start[1] + direction[1] * t)
+
+
+# -----------------------------------------------------------
+# Основная функция
+# -----------------------------------------------------------
+
+def analyze_topology(rooms: List[Dict[str, Any]],
+                     walls: List[Dict[str, Any]],
+                     openings: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Заполняет room_from/room_to у проёмов и enclosures у помещений,
+    возвращает граф смежности помещений.
+    """
+    room_ids = [r["id"] for r in rooms]
+    walls_by_id = {w["id"]: w for w in walls}
+
+    # Все щупы собираются в один массив и раскладываются по помещениям за один проход
+    probes: List[Point] = []
+    wall_probe_spans: List[Tuple[str, int, int]] = []
+    for wall in walls:
+        direction, normal, length = _axis(wall)
+        if length == 0:
+            continue
+        offset = _half_thickness(wall, normal) * PROBE_FACTOR
+        first = len(probes)
+        sx, sy = wall["start"]
+        for t in WALL_SAMPLES:
+            p = (sx + direction[0] * length * t, sy + direction[1] * length * t)
+            probes.extend(_probe_pair(p, normal, offset))
+        wall_probe_spans.append((wall["id"], first, len(probes)))
+
+    opening_probes: List[Tuple[Dict[str, Any], int]] = []
+    for opening in openings:
+        wall = walls_by_id.get(opening.get("wall_id"))
+        if wall is None:
+            continue
+        direction, normal, length = _axis(wall)
+        offset = _half_thickness(wall, normal) * PROBE_FACTOR
+        center = _project(tuple(opening["position"]), tuple(wall["start"]), direction, length)
+        opening_probes.append((opening, len(probes)))
+        probes.extend(_probe_pair(center, normal, offset))
+
+    owner = np.full(len(probes), -1, dtype=int)
+    if rooms and probes:
+        room_index = PolygonIndex([r["boundary_polygon"] for r in rooms], [r["area"] for r in rooms])
+        owner = room_index.locate(probes)
+
+    def room_at(k: int) -> Optional[str]:
+        return room_ids[owner[k]] if owner[k] >= 0 else None
+
+    enclosures: Dict[str, List[str]] = {rid: [] for rid in room_ids}
+    wall_edges: Dict[Tuple[str, str], List[str]] = {}
+
+    # Стены: какие помещения лежат по сторонам
+    for wall_id, first, last in wall_probe_spans:
+        sides = set()
+        for k in range(first, last, 2):
+            left, right = room_at(k), room_at(k + 1)
+            for rid in (left, right):
+                if rid is not None and wall_id not in enclosures[rid]:
+                    enclosures[rid].append(wall_id)
+            if left != right:
+                sides.add(_edge_key(left, right))
+        for key in sides:
+            wall_edges.setdefault(key, []).append(wall_id)
+
+    # Проёмы: помещения по обе стороны стены-хозяина
+    edges: List[Dict[str, Any]] = []
+    unresolved = 0
+    for opening, k in opening_probes:
+        left, right = room_at(k), room_at(k + 1)
+        if left is None:
+            left, right = right, left
+        opening["room_from"] = left
+        opening["room_to"] = right
+        for rid in (left, right):
+            if rid is not None:
+                enclosures[rid].append(opening["id"])
+        if left is None or left == right:
+            unresolved += 1
+            continue
+        edges.append({
+            "rooms": list(_edge_key(left, right)),
+            "kind": opening.get("type", "door"),
+            "via": [opening["id"]],
+        })
+
+    for key, wall_list in sorted(wall_edges.items()):
+        edges.append({"rooms": list(key), "kind": "wall", "via": wall_list})
+
+    for room in rooms:
+        room["enclosures"] = enclosures[room["id"]]
+
+    return {
+        "nodes": room_ids + [OUTSIDE],
+        "edges": edges,
+        "openings_linked": len(opening_probes) - unresolved,
+        "openings_unresolved": unresolved + len(openings) - len(opening_probes),
+    }
+
+
+def _edge_key(a: Optional[str], b: Optional[str]) -> Tuple[str, str]:
+    a, b = a or OUTSIDE, b or OUTSIDE
+    return (a, b) if a <= b else (b, a)
+
+
+# -----------------------------------------------------------
+# Маршруты
+# -----------------------------------------------------------
+
+def find_route(adjacency: Dict[str, Any], start: str, goal: str = OUTSIDE,
+               kinds: Tuple[str, ...] = ("door",)) -> Optional[Dict[str, List[str]]]:
+    """
+    Кратчайший (по числу проходов) маршрут между помещениями по рёбрам kinds.
+    По умолчанию — путь эвакуации наружу через двери.
+    Возвращает {"rooms": [...], "via": [...]} или None, если пути нет.
+    """
+    neighbors: Dict[str, List[Tuple[str, str]]] = {}
+    for edge in adjacency["edges"]:
+        if edge["kind"] not in kinds:
+            continue
+        a, b = edge["rooms"]
+        via = edge["via"][0]
+        neighbors.setdefault(a, []).append((b, via))
+        neighbors.setdefault(b, []).append((a, via))
+
+    previous: Dict[str, Optional[Tuple[str, str]]] = {start: None}
+    queue = deque([start])
+    while queue:
+        node = queue.popleft()
+        if node == goal:
+            break
+        for nxt, via in neighbors.get(node, ()):
+            if nxt not in previous:
+                previous[nxt] = (node, via)
+                queue.append(nxt)
+
+    if goal not in previous:
+        return None
+    rooms, vias = [goal], []
+    while previous[rooms[-1]] is not None:
+        node, via = previous[rooms[-1]]
+        rooms.append(node)
+        vias.append(via)
+    return {"rooms": rooms[::-1], "via": vias[::-1]}
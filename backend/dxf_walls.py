@@ -1,5 +1,7 @@
 from __future__ import annotations
+import atexit
 import math
+import threading
 from dataclasses import dataclass
 from typing import List, Tuple, Dict, Any
 
@@ -11,38 +13,25 @@ from wall_graph import (
     segments_are_parallel_and_collinear, 
     vector_distance_point_to_segment,
     get_segment_direction,
-    vector_normalize
-) 
-from dxf_walls_utils import calculate_midline_segment
+    vector_normalize,
+    MAX_WALL_THICKNESS,
+    WALL_THICKNESS_RANGES,
+)
+from layer_keywords import WALL_LAYERS_CANDIDATES  # слои, где могут быть стены
+from spatial_index import GridIndex
+from dxf_noise import find_noise_segments
+from dxf_walls_utils import (
+    calculate_midline_segment,
+    deduplicate_segments,
+    merge_collinear_segments,
+    guess_length_tolerance,
+)
 
 # Заменяем Tuple на стандартный тип tuple
 Point = tuple[float, float]
 
 # -------------------------------------------------------------------
-# 1. Слои, где могут быть стены
-# -------------------------------------------------------------------
-WALL_LAYERS_CANDIDATES = {
-    "СТЕНА",
-    "СТЕНЫ",
-    "STENA",
-    "СТЕНЫ2",
-    "стена",
-    "AR_WALL_OUTER",
-    "AR_WALL_INNER",
-    "АР_Газоблок наруж",
-    "АР_Газоблок 200мм",
-    "АР_ГКЛ",
-    "АР_Монолит",
-    "PEREG",
-    "PARTITION",
-    "GKL",
-    "BRICK",
-    "GAS",
-    "ПЕРЕГОРОДКИ",
-}
-
-# -------------------------------------------------------------------
-# 2. Структуры данных
+# 1. Структуры данных
 # -------------------------------------------------------------------
 
 @dataclass
@@ -65,6 +54,16 @@ class WallSegment:
         return (dx / L, dy / L)
 
 
+@dataclass
+class DirectWall:
+    """Стена, заданная одной сущностью с толщиной (широкая LWPOLYLINE, MLINE): ось и толщина точные."""
+    start: Point
+    end: Point
+    thickness: float
+    layer: str
+    source_type: str
+
+
 @dataclass
 class Wall:
     id: str
@@ -76,7 +75,7 @@ class Wall:
 
 
 # -------------------------------------------------------------------
-# 3. Утилиты
+# 2. Утилиты
 # -------------------------------------------------------------------
 
 def determine_material(layer_name: str) -> str:
@@ -119,9 +118,104 @@ def _get_wall_polygon_corners(start: Point, end: Point, thickness: float) -> Lis
     return [p1, p2, p3, p4]
 
 # -------------------------------------------------------------------
-# 4. Парсинг геометрии
+# 3. Парсинг геометрии
 # -------------------------------------------------------------------
 
+def is_wall_layer(layer: str) -> bool:
+    """Проверка по ключевым словам (substring match)."""
+    layer_upper = layer.upper()
+    return any(k.upper() in layer_upper for k in WALL_LAYERS_CANDIDATES)
+
+
+def _is_wall_thickness(width: float) -> bool:
+    return any(lo < width < hi for lo, hi in WALL_THICKNESS_RANGES)
+
+
+def polyline_wall_width(entity) -> float | None:
+    """
+    Толщина стены, нарисованной широкой LWPOLYLINE: постоянная ширина
+    (const_width или одинаковая у всех вершин), без дуг, в пределах
+    толщин стен. None — обычная полилиния, её рёбра идут в поиск пар.
+    """
+    pts = list(entity.get_points("xyseb"))
+    if len(pts) < 2 or any(b for *_, b in pts):
+        return None
+    width = float(entity.dxf.const_width or 0.0)
+    if not width:
+        widths = {float(w) for _, _, sw, ew, _ in pts for w in (sw, ew)}
+        if len(widths) != 1:
+            return None
+        width = widths.pop()
+    return width if _is_wall_thickness(width) else None
+
+
+def _polyline_direct_walls(entity, width: float) -> List[DirectWall]:
+    pts = [(float(x), float(y)) for x, y, *_ in entity.get_points("xy")]
+    if entity.closed and len(pts) > 2:
+        pts.append(pts[0])
+    layer = entity.dxf.layer
+    return [DirectWall(p1, p2, width, layer, "polyline_width_wall")
+            for p1, p2 in zip(pts, pts[1:]) if p1 != p2]
+
+
+def _mline_direct_walls(entity) -> List[DirectWall]:
+    """
+    Ось и толщина MLINE по параметрам вершин: первый параметр элемента —
+    смещение вдоль биссектрисы (miter) до линии элемента. Ось — середина
+    между крайними элементами, толщина — их расстояние по нормали к участку.
+    """
+    vertices = list(entity.vertices)
+    if entity.is_closed and len(vertices) > 2:
+        vertices.append(vertices[0])
+
+    def axis(v) -> Tuple[Point, float, float] | None:
+        offsets = [params[0] for params in v.line_params if params]
+        if len(offsets) < 2:
+            return None
+        lo, hi = min(offsets), max(offsets)
+        mid = (lo + hi) / 2
+        p = (float(v.location.x + v.miter_direction.x * mid), float(v.location.y + v.miter_direction.y * mid))
+        return p, hi - lo, abs(v.line_direction.x * v.miter_direction.y - v.line_direction.y * v.miter_direction.x)
+
+    walls = []
+    layer = entity.dxf.layer
+    for v1, v2 in zip(vertices, vertices[1:]):
+        a1, a2 = axis(v1), axis(v2)
+        if a1 is None or a2 is None or a1[0] == a2[0]:
+            continue
+        # Смещения идут вдоль miter: по нормали к участку это spread * sin(угла)
+        thickness = a1[1] * a1[2]
+        if _is_wall_thickness(thickness):
+            walls.append(DirectWall(a1[0], a2[0], thickness, layer, "mline_wall"))
+    return walls
+
+
+def direct_walls_of(entity) -> List[DirectWall] | None:
+    """
+    Стены, которые сущность задаёт сама (ось + толщина), без поиска пар.
+    None — сущность не такая стена (рёбра LWPOLYLINE обрабатываются как обычно).
+    MLINE берётся на слое стен или со стилем, чьё имя похоже на слой стен.
+    """
+    etype = entity.dxftype()
+    if etype == "LWPOLYLINE":
+        if not is_wall_layer(entity.dxf.layer):
+            return None
+        width = polyline_wall_width(entity)
+        return None if width is None else _polyline_direct_walls(entity, width)
+    if etype == "MLINE":
+        if not (is_wall_layer(entity.dxf.layer) or is_wall_layer(entity.dxf.style_name or "")):
+            return None
+        return _mline_direct_walls(entity)
+    return None
+
+
+def _collect_direct_walls(doc: ezdxf.EzDxfDocument) -> List[DirectWall]:
+    walls: List[DirectWall] = []
+    for entity in doc.modelspace().query('LWPOLYLINE MLINE'):
+        walls.extend(direct_walls_of(entity) or [])
+    return walls
+
+
 def _collect_segments(doc: ezdxf.EzDxfDocument) -> List[Segment]:
     """Считываем все геометрические сегменты, которые могут быть стенами."""
     # Используем Segment из wall_graph, чтобы не дублировать код
@@ -130,9 +224,7 @@ def _collect_segments(doc: ezdxf.EzDxfDocument) -> List[Segment]:
 
     for entity in msp.query('LINE LWPOLYLINE'):
         layer = entity.dxf.layer
-        # Проверка по ключевым словам (substring match)
-        layer_upper = layer.upper()
-        if not any(k.upper() in layer_upper for k in WALL_LAYERS_CANDIDATES):
+        if not is_wall_layer(layer):
             continue
 
         if entity.dxftype() == 'LINE':
@@ -142,6 +234,9 @@ def _collect_segments(doc: ezdxf.EzDxfDocument) -> List[Segment]:
             segs.append(Segment(start=start, end=end, layer=layer, length=length))
 
         elif entity.dxftype() == 'LWPOLYLINE':
+            # Широкая полилиния — уже готовая стена (_collect_direct_walls)
+            if polyline_wall_width(entity) is not None:
+                continue
             pts = [(float(x), float(y)) for x, y, *_ in entity.get_points('xy')]
             for p1, p2 in zip(pts, pts[1:]):
                 length = math.dist(p1, p2)
@@ -154,13 +249,304 @@ def _collect_segments(doc: ezdxf.EzDxfDocument) -> List[Segment]:
     return segs
 
 
+# -------------------------------------------------------------------
+# 4. Поиск пар сегментов (стены с толщиной)
+# -------------------------------------------------------------------
+
+# Сколько сегментов в среднем «владеет» одна плитка при поиске пар по частям
+TILE_TARGET_SEGMENTS = 250
+
+
+def _best_pair(i: int, seg1: Segment, candidates, segments: List[Segment], processed) -> Tuple[int | None, float]:
+    """Самый толстый параллельный партнёр для seg1 среди кандидатов (при равенстве — первый)."""
+    best_pair = None
+    best_thickness = 0
+
+    for j in candidates:
+        if j == i or processed[j]: continue
+        seg2 = segments[j]
+
+        if segments_are_parallel_and_collinear(seg1, seg2):
+            dist1 = vector_distance_point_to_segment(seg2.start, seg1.start, seg1.end)
+            dist2 = vector_distance_point_to_segment(seg2.end, seg1.start, seg1.end)
+            thickness = (dist1 + dist2) / 2
+
+            if thickness > best_thickness:
+                best_thickness = thickness
+                best_pair = j
+    return best_pair, best_thickness
+
+
+def _pair_segments(segments: List[Segment]) -> List[Tuple[int, int, float]]:
+    """Жадный поиск пар по всему плану: (i, j, толщина) в порядке i."""
+    processed = [False] * len(segments)
+    pairs = []
+    everything = range(len(segments))
+    for i, seg1 in enumerate(segments):
+        if processed[i]: continue
+        j, thickness = _best_pair(i, seg1, everything, segments, processed)
+        if j is not None:
+            pairs.append((i, j, thickness))
+            processed[i] = processed[j] = True
+    return pairs
+
+
+def _segment_xy(segments: List[Segment]):
+    """Координаты сегментов массивом (n, 4): x1, y1, x2, y2."""
+    import numpy as np
+    return np.array([(s.start[0], s.start[1], s.end[0], s.end[1]) for s in segments], dtype=np.float64).reshape(-1, 4)
+
+
+def _segment_bboxes(segments: List[Segment], xy=None):
+    import numpy as np
+    if xy is None:
+        xy = _segment_xy(segments)
+    return np.column_stack([np.minimum(xy[:, 0], xy[:, 2]), np.minimum(xy[:, 1], xy[:, 3]),
+                            np.maximum(xy[:, 0], xy[:, 2]), np.maximum(xy[:, 1], xy[:, 3])])
+
+
+def segment_tiles(segments: List[Segment], tile_size: float | None = None, xy=None):
+    """
+    Разбиение сегментов на плитки для поиска пар по частям.
+
+    Владелец сегмента — плитка, в которую попала его середина (каждый сегмент
+    ровно в одной плитке). Кандидаты плитки — сегменты, чей bbox пересекает
+    bbox её сегментов, расширенный на MAX_WALL_THICKNESS («поля»): партнёр
+    дальше толщины стены не бывает. Возвращает [(owned, candidates)] —
+    отсортированные индексы, плитки по строкам снизу вверх.
+    xy — готовый массив _segment_xy, если он уже посчитан.
+    """
+    import numpy as np
+
+    if not segments:
+        return []
+    bboxes = _segment_bboxes(segments, xy)
+    mid = (bboxes[:, :2] + bboxes[:, 2:]) / 2
+    origin = bboxes[:, :2].min(axis=0)
+    extent = float(max((bboxes[:, 2:].max(axis=0) - origin).max(), 1.0))
+    if tile_size is None:
+        per_side = max(1, math.ceil(math.sqrt(len(segments) / TILE_TARGET_SEGMENTS)))
+        # Плитка не уже нескольких полей, иначе кандидатов больше, чем своих
+        tile_size = max(extent / per_side, 4 * MAX_WALL_THICKNESS)
+
+    cells = np.floor((mid - origin) / tile_size).astype(np.int64)
+    order = np.lexsort((np.arange(len(segments)), cells[:, 0], cells[:, 1]))
+    keys = cells[order]
+    splits = np.flatnonzero(np.any(keys[1:] != keys[:-1], axis=1)) + 1
+
+    index = GridIndex(tile_size)
+    for k, b in enumerate(bboxes.tolist()):
+        index.insert(k, tuple(b))
+
+    tiles = []
+    for owned in np.split(order, splits):
+        owned = np.sort(owned)
+        lo = bboxes[owned, :2].min(axis=0) - MAX_WALL_THICKNESS
+        hi = bboxes[owned, 2:].max(axis=0) + MAX_WALL_THICKNESS
+        candidates = sorted(index.query((lo[0], lo[1], hi[0], hi[1])))
+        tiles.append((owned.tolist(), candidates))
+    return tiles
+
+
+def _pair_tile(owned: List[int], segments: List[Segment]) -> List[Tuple[int, int, float]]:
+    """
+    Жадный поиск пар внутри одной плитки (выполняется в процессе пула).
+    segments — кандидаты плитки, owned — позиции своих сегментов среди них;
+    занятость своя у каждой плитки, конфликты разбирает _merge_tile_pairs.
+    """
+    processed = [False] * len(segments)
+    pairs = []
+    everything = range(len(segments))
+    for i in owned:
+        if processed[i]: continue
+        j, thickness = _best_pair(i, segments[i], everything, segments, processed)
+        if j is not None:
+            pairs.append((i, j, thickness))
+            processed[i] = processed[j] = True
+    return pairs
+
+
+def _pair_tile_shared(spec, owned: List[int], candidates) -> List[Tuple[int, int, float]]:
+    """
+    _pair_tile для процесса пула: координаты кандидатов читаются из общей
+    памяти (spec от SharedArrays), а не приходят пиклом вместе с задачей.
+    """
+    from shared_geometry import attach
+
+    xy = attach(spec)["xy"][candidates]
+    segments = [Segment(start=(x1, y1), end=(x2, y2)) for x1, y1, x2, y2 in xy.tolist()]
+    return _pair_tile(owned, segments)
+
+
+# Пул поиска пар по плиткам: один на процесс, живёт до выхода (см. pair_pool)
+_pair_pool = None
+_pair_pool_workers = 0
+_pair_pool_lock = threading.Lock()
+
+
+def pair_pool(workers: int):
+    """
+    Долгоживущий пул процессов для _pair_segments_tiled: сборки с workers > 1
+    используют один и тот же пул, а не форкают новый на каждый вызов. Пул
+    другого размера заменяет прежний.
+
+    Процессы пула форкаются сразу при создании, из вызывающего потока. Форк
+    многопоточного процесса копирует только этот поток, а блокировки, занятые
+    в этот момент другими потоками, в дочерних процессах не освободятся
+    никогда. Поэтому в многопоточном процессе (uvicorn) пул нужно создать
+    при старте, пока других потоков нет, — так делает main.py при
+    BIM_WALL_WORKERS > 1.
+    """
+    global _pair_pool, _pair_pool_workers
+    from concurrent.futures import ProcessPoolExecutor, wait
+    from multiprocessing import resource_tracker
+
+    with _pair_pool_lock:
+        if _pair_pool is not None and _pair_pool_workers != workers:
+            _pair_pool.shutdown(wait=False, cancel_futures=True)
+            _pair_pool = None
+        if _pair_pool is None:
+            # Воркеры должны делить resource_tracker с родителем (shared_geometry):
+            # запущенный после форка трекер у каждого свой, и он «подчищает»
+            # блоки общей памяти, уже удалённые родителем
+            resource_tracker.ensure_running()
+            _pair_pool = ProcessPoolExecutor(max_workers=workers)
+            _pair_pool_workers = workers
+            # Запуск всех процессов сейчас, а не при первой задаче сборки
+            wait([_pair_pool.submit(int) for _ in range(workers)])
+        return _pair_pool
+
+
+@atexit.register
+def shutdown_pair_pool() -> None:
+    global _pair_pool
+    with _pair_pool_lock:
+        if _pair_pool is not None:
+            _pair_pool.shutdown(wait=False, cancel_futures=True)
+            _pair_pool = None
+
+
+def _merge_tile_pairs(segments: List[Segment], tiles, proposals) -> List[Tuple[int, int, float]]:
+    """
+    Детерминированное слияние пар плиток.
+
+    Пара принадлежит плитке, которая владеет её первым сегментом (i), поэтому
+    дубликатов нет. Пары принимаются по возрастанию i; пара, у которой
+    сегмент уже занят (сосед через поле забрал его раньше), отклоняется, и
+    оба её сегмента, если остались свободными, заново ищут партнёра — по
+    возрастанию номера, среди кандидатов своей плитки, с общей занятостью.
+    Так ни один сегмент на границе не теряется и не попадает в две стены,
+    а результат не зависит от числа процессов и порядка их завершения.
+    """
+    processed = [False] * len(segments)
+    pairs = []
+    retry = set()
+    for i, j, thickness in sorted(p for tile_pairs in proposals for p in tile_pairs):
+        if processed[i] or processed[j]:
+            retry.update((i, j))
+            continue
+        pairs.append((i, j, thickness))
+        processed[i] = processed[j] = True
+
+    owner_tile = {}
+    for t, (owned, _) in enumerate(tiles):
+        for i in owned:
+            owner_tile[i] = t
+    for i in sorted(retry):
+        if processed[i]: continue
+        candidates = tiles[owner_tile[i]][1]
+        j, thickness = _best_pair(i, segments[i], candidates, segments, processed)
+        if j is not None:
+            pairs.append((i, j, thickness))
+            processed[i] = processed[j] = True
+    pairs.sort()
+    return pairs
+
+
+def _pair_segments_tiled(segments: List[Segment], tile_size: float | None = None,
+                         workers: int = 1) -> List[Tuple[int, int, float]]:
+    """
+    Поиск пар по плиткам (segment_tiles): для сегмента перебираются только
+    кандидаты его плитки, а не весь план. Плитки независимы и при workers > 1
+    считаются в общем пуле процессов (pair_pool). Координаты всех сегментов один раз кладутся
+    в общую память (shared_geometry), и в задачу уходят только индексы
+    плитки: ни сегменты, ни поля соседних плиток не пиклятся. От глобального
+    перебора результат может отличаться только для сегментов, которые на
+    границе плиток претендуют на одного партнёра.
+    """
+    import numpy as np
+
+    xy = _segment_xy(segments)
+    tiles = segment_tiles(segments, tile_size, xy)
+    owned_local = []
+    for owned, candidates in tiles:
+        local = {g: k for k, g in enumerate(candidates)}
+        owned_local.append([local[g] for g in owned])
+
+    if workers > 1 and len(tiles) > 1:
+        from concurrent.futures.process import BrokenProcessPool
+        from shared_geometry import SharedArrays
+
+        candidates = [np.asarray(c, dtype=np.int64) for _, c in tiles]
+        pool = pair_pool(workers)
+        try:
+            with SharedArrays({"xy": xy}) as shared:
+                local_pairs = list(pool.map(_pair_tile_shared, [shared.spec] * len(tiles), owned_local, candidates,
+                                            chunksize=max(1, len(tiles) // (4 * workers))))
+        except BrokenProcessPool:
+            # Процесс пула погиб — следующая сборка создаст пул заново
+            shutdown_pair_pool()
+            raise
+    else:
+        local_pairs = [_pair_tile(owned, [segments[g] for g in c])
+                       for owned, (_, c) in zip(owned_local, tiles)]
+
+    proposals = [
+        [(candidates[i], candidates[j], thickness) for i, j, thickness in tile_pairs]
+        for (_, candidates), tile_pairs in zip(tiles, local_pairs)
+    ]
+    return _merge_tile_pairs(segments, tiles, proposals)
+
+
 # -------------------------------------------------------------------
 # 5. Основной анализ
 # -------------------------------------------------------------------
 
-def analyze_walls(doc: ezdxf.EzDxfDocument) -> Dict[str, Any]:
-    """Основная точка входа для API."""
-    all_segments = _collect_segments(doc)
+def analyze_walls(doc: ezdxf.EzDxfDocument, workers: int = 1) -> Dict[str, Any]:
+    """
+    Основная точка входа для API.
+    workers > 1 — поиск пар по плиткам в пуле процессов (см. _pair_segments_tiled).
+    Широкие LWPOLYLINE и MLINE на слоях стен становятся стенами сразу, без поиска пар.
+    """
+    return analyze_wall_segments(_collect_segments(doc), tiled=workers > 1, workers=workers,
+                                 direct_walls=_collect_direct_walls(doc),
+                                 units=doc.header.get("$INSUNITS", 0))
+
+
+def analyze_wall_segments(raw_segments: List[Segment], tiled: bool = False,
+                          tile_size: float | None = None, workers: int = 1,
+                          suppress_noise: bool = True,
+                          direct_walls: List[DirectWall] | None = None,
+                          units: int = 0) -> Dict[str, Any]:
+    """
+    Стены из уже собранных сегментов (документ DXF не нужен).
+    tiled=True — поиск пар по плиткам, workers > 1 — плитки в пуле процессов.
+    suppress_noise — до поиска пар убрать кластеры штриховки и мусора (dxf_noise).
+    direct_walls — стены с уже известной осью и толщиной (direct_walls_of),
+    добавляются после найденных как есть.
+    units — $INSUNITS чертежа, масштаб для порогов шума.
+    """
+    noise = None
+    if suppress_noise:
+        keep, noise = find_noise_segments([(s.start, s.end) for s in raw_segments],
+                                          [s.layer for s in raw_segments], stage="walls", units=units)
+        if noise["removed"]:
+            raw_segments = [s for s, k in zip(raw_segments, keep) if k]
+    tol = guess_length_tolerance(raw_segments)
+    # Дубли линий (копии слоёв, рёбра полилиний поверх LINE) дают фантомные стены
+    unique_segments, dedup_stats = deduplicate_segments(raw_segments, tol)
+    # Фрагменты одной оси (лишние вершины полилиний) склеиваем до поиска пар
+    all_segments, fragments_merged = merge_collinear_segments(unique_segments, tol)
     segments = list(enumerate(all_segments)) 
     
     walls: List[Dict[str, Any]] = []
@@ -168,66 +554,54 @@ def analyze_walls(doc: ezdxf.EzDxfDocument) -> Dict[str, Any]:
     processed_indices = set()
     
     # 1. Поиск ПАРНЫХ СЕГМЕНТОВ (стены с толщиной)
-    for i, seg1 in segments:
-        if i in processed_indices: continue
-
-        best_pair = None
-        best_thickness = 0
+    if tiled:
+        pairs = _pair_segments_tiled(all_segments, tile_size, workers)
+    else:
+        pairs = _pair_segments(all_segments)
+
+    for i, best_pair, best_thickness in pairs:
+        seg1 = all_segments[i]
+        seg2 = all_segments[best_pair]
         
-        for j, seg2 in segments:
-            if j == i or j in processed_indices: continue
-
-            if segments_are_parallel_and_collinear(seg1, seg2):
-                dist1 = vector_distance_point_to_segment(seg2.start, seg1.start, seg1.end)
-                dist2 = vector_distance_point_to_segment(seg2.end, seg1.start, seg1.end)
-                thickness = (dist1 + dist2) / 2
-                
-                if thickness > best_thickness: 
-                    best_thickness = thickness
-                    best_pair = j
-
-        if best_pair is not None:
-            seg2 = segments[best_pair][1]
-            
-            # Вычисляем осевую
-            mid_start, mid_end = calculate_midline_segment(seg1, seg2) 
-
-            # Определяем координаты полигона (4 угла)
-            # Нужно правильно упорядочить точки двух сегментов
-            dist_start_to_start = math.dist(seg1.start, seg2.start)
-            dist_start_to_end = math.dist(seg1.start, seg2.end)
-
-            if dist_start_to_start < dist_start_to_end:
-                 # Сонаправлены
-                 # Порядок обхода: Start1 -> End1 -> End2 -> Start2 -> Start1
-                 corners = [seg1.start, seg1.end, seg2.end, seg2.start]
-            else:
-                 # Противонаправлены (seg2 перевернут относительно seg1)
-                 # Порядок обхода: Start1 -> End1 -> Start2 -> End2 -> Start1
-                 corners = [seg1.start, seg1.end, seg2.start, seg2.end]
-
-            material = determine_material(seg1.layer)
-            thickness_mm = round(to_mm(best_thickness), 1)
-
-            walls.append({
-                "id": f"wall-{wall_id}",
-                "type": "wall",
-                "layer": seg1.layer,
-                "material": material,
-
-                # Геометрия для совместимости (осевая)
-                "start": mid_start, 
-                "end": mid_end,
-                "length": math.dist(mid_start, mid_end),
-
-                # Новые поля
-                "thickness": thickness_mm,
-                "source_type": "paired_thick_wall",
-                "coordinates": corners,
-            })
-            processed_indices.add(i)
-            processed_indices.add(best_pair)
-            wall_id += 1
+        # Вычисляем осевую
+        mid_start, mid_end = calculate_midline_segment(seg1, seg2) 
+
+        # Определяем координаты полигона (4 угла)
+        # Нужно правильно упорядочить точки двух сегментов
+        dist_start_to_start = math.dist(seg1.start, seg2.start)
+        dist_start_to_end = math.dist(seg1.start, seg2.end)
+
+        if dist_start_to_start < dist_start_to_end:
+             # Сонаправлены
+             # Порядок обхода: Start1 -> End1 -> End2 -> Start2 -> Start1
+             corners = [seg1.start, seg1.end, seg2.end, seg2.start]
+        else:
+             # Противонаправлены (seg2 перевернут относительно seg1)
+             # Порядок обхода: Start1 -> End1 -> Start2 -> End2 -> Start1
+             corners = [seg1.start, seg1.end, seg2.start, seg2.end]
+
+        material = determine_material(seg1.layer)
+        thickness_mm = round(to_mm(best_thickness), 1)
+
+        walls.append({
+            "id": f"wall-{wall_id}",
+            "type": "wall",
+            "layer": seg1.layer,
+            "material": material,
+
+            # Геометрия для совместимости (осевая)
+            "start": mid_start, 
+            "end": mid_end,
+            "length": math.dist(mid_start, mid_end),
+
+            # Новые поля
+            "thickness": thickness_mm,
+            "source_type": "paired_thick_wall",
+            "coordinates": corners,
+        })
+        processed_indices.add(i)
+        processed_indices.add(best_pair)
+        wall_id += 1
 
     # 2. Обработка ОСТАВШИХСЯ СЕГМЕНТОВ
     remaining_segments = [seg for i, seg in segments if i not in processed_indices]
@@ -278,9 +652,32 @@ def analyze_walls(doc: ezdxf.EzDxfDocument) -> Dict[str, Any]:
             "coordinates": corners,
         })
         wall_id += 1
-        
+
+    # 3. Стены с собственной толщиной (широкая LWPOLYLINE, MLINE)
+    for dw in direct_walls or []:
+        walls.append({
+            "id": f"wall-{wall_id}",
+            "type": "wall",
+            "layer": dw.layer,
+            "material": determine_material(dw.layer),
+
+            "start": dw.start,
+            "end": dw.end,
+            "length": math.dist(dw.start, dw.end),
+
+            "thickness": round(to_mm(dw.thickness), 1),
+            "source_type": dw.source_type,
+            "coordinates": _get_wall_polygon_corners(dw.start, dw.end, dw.thickness),
+        })
+        wall_id += 1
+
     return {
         "total_segments": len(all_segments),
+        "segments_removed": dedup_stats["removed"],
+        "dedup": dedup_stats,
+        "fragments_merged": fragments_merged,
+        "noise": noise,
+        "direct_walls": len(direct_walls or []),
         "total_walls": len(walls),
         "wall_layers_used": sorted({w['layer'] for w in walls}),
         "walls": walls,
@@ -1,5 +1,6 @@
-from typing import Tuple
+from typing import Tuple, List, Dict, Iterator
 from wall_graph import Segment
+from spatial_index import PointSnapper, guess_tolerance
 import math
 
 Point = tuple[float, float]
@@ -40,6 +41,214 @@ def calculate_midline_segment(seg1: Segment, seg2: Segment) -> Tuple[Point, Poin
     )
 
     return mid_start, mid_end
-    
-# TODO: В будущем добавить функцию для объединения смежных осевых линий 
-# в единую полилинию (L_ось), чтобы избежать фрагментации.
\ No newline at end of file
+
+
+# -------------------------------------------------------------------
+# Очистка линий перед поиском пар: дубликаты и перекрытия
+# -------------------------------------------------------------------
+
+# Допуск по углу при группировке сегментов на одной прямой (радианы)
+COLLINEAR_ANGLE_EPS = 1e-3
+
+# Максимальный разрыв между фрагментами одной линии, в допусках точки (10 мм)
+MERGE_GAP_FACTOR = 10.0
+
+
+def guess_length_tolerance(segments: List[Segment]) -> float:
+    """
+    Допуск совпадения точек в единицах чертежа: 1 мм.
+    Масштаб угадываем по медианной длине сегмента (как и в dxf_walls.to_mm).
+    """
+    return guess_tolerance(s.length for s in segments)
+
+
+def canonical_segment_key(seg: Segment, snapper: PointSnapper) -> Tuple[int, int]:
+    """Ключ сегмента без учёта направления: упорядоченные номера узлов его концов."""
+    a = snapper.snap(seg.start)
+    b = snapper.snap(seg.end)
+    return (a, b) if a <= b else (b, a)
+
+
+def _collinear_groups(segments: List[Segment], tol: float,
+                      angle_eps: float = COLLINEAR_ANGLE_EPS) -> Iterator[List[Tuple[float, float, float, int]]]:
+    """
+    Группирует сегменты, лежащие на одной прямой (за O(n log n)).
+
+    Сначала сортировка по углу направления (по модулю π) и разбиение на
+    группы шириной не больше angle_eps от первого угла группы: при сравнении
+    только с соседом направления сцеплялись бы через промежуточные углы на
+    любой диапазон. Затем внутри группы — сортировка по смещению прямой от
+    начала координат и разбиение по разрывам больше tol.
+    Для каждой прямой отдаёт список (t0, t1, offset, index, angle), где
+    t0 <= t1 — проекции концов на направление группы, angle — собственное
+    направление сегмента.
+    """
+    items = []
+    for idx, seg in enumerate(segments):
+        dx = seg.end[0] - seg.start[0]
+        dy = seg.end[1] - seg.start[1]
+        ang = math.atan2(dy, dx) % math.pi
+        # Почти горизонтальные «с другой стороны» (угол ~π) переносим к нулю
+        if ang > math.pi - angle_eps:
+            ang -= math.pi
+        items.append((ang, idx))
+    items.sort()
+
+    def split(sorted_items, eps, from_first=False):
+        group = []
+        prev = None
+        for item in sorted_items:
+            if prev is not None and item[0] - prev > eps:
+                yield group
+                group = []
+            group.append(item)
+            prev = group[0][0] if from_first else item[0]
+        if group:
+            yield group
+
+    for angle_group in split(items, angle_eps, from_first=True):
+        ang = sum(a for a, _ in angle_group) / len(angle_group)
+        ux, uy = math.cos(ang), math.sin(ang)
+        nx, ny = -uy, ux
+        by_offset = []
+        for a, idx in angle_group:
+            seg = segments[idx]
+            mx = (seg.start[0] + seg.end[0]) / 2
+            my = (seg.start[1] + seg.end[1]) / 2
+            by_offset.append((mx * nx + my * ny, idx, a))
+        by_offset.sort()
+        for line in split(by_offset, tol):
+            out = []
+            for off, idx, a in line:
+                seg = segments[idx]
+                t0 = seg.start[0] * ux + seg.start[1] * uy
+                t1 = seg.end[0] * ux + seg.end[1] * uy
+                out.append((min(t0, t1), max(t0, t1), off, idx, a))
+            yield out
+
+
+def _sweep_merge(segments: List[Segment], tol: float, join_gap: float,
+                 group_key=None) -> Tuple[List[Segment], int]:
+    """
+    Сливает сегменты одной прямой, если следующий начинается не дальше
+    join_gap за концом текущего (join_gap < 0 — требуется перекрытие), а его
+    смещение и направление отличаются от первого сегмента цепочки не больше
+    tol и COLLINEAR_ANGLE_EPS: с большим join_gap иначе склеивались бы
+    стены с изломом.
+    group_key(seg) дополнительно разделяет прямую (например, по слою).
+    Возвращает сегменты в исходном порядке (по первому индексу группы)
+    и число поглощённых сегментов.
+    """
+    merged: List[Tuple[int, Segment]] = []
+    absorbed = 0
+
+    for line in _collinear_groups(segments, tol):
+        if group_key is not None:
+            buckets: Dict[object, list] = {}
+            for item in line:
+                buckets.setdefault(group_key(segments[item[3]]), []).append(item)
+            runs_source = buckets.values()
+        else:
+            runs_source = [line]
+
+        for items in runs_source:
+            items.sort()
+            run = [items[0]]
+            run_end = items[0][1]
+            for item in items[1:]:
+                t0, t1, off, _, ang = item
+                if (t0 <= run_end + join_gap and abs(off - run[0][2]) <= tol
+                        and abs(ang - run[0][4]) <= COLLINEAR_ANGLE_EPS):
+                    run.append(item)
+                    run_end = max(run_end, t1)
+                else:
+                    merged.append(_merge_run(segments, run))
+                    absorbed += len(run) - 1
+                    run = [item]
+                    run_end = t1
+            merged.append(_merge_run(segments, run))
+            absorbed += len(run) - 1
+
+    merged.sort(key=lambda m: m[0])
+    return [seg for _, seg in merged], absorbed
+
+
+def _merge_run(segments: List[Segment], run) -> Tuple[int, Segment]:
+    """
+    Один сегмент из цепочки: крайние точки берутся из исходных концов,
+    слой — от самого длинного куска (короткий торец другой стены,
+    лежащий на грани, не должен менять её материал).
+    """
+    first_idx = min(item[3] for item in run)
+    first = segments[first_idx]
+    if len(run) == 1:
+        return first_idx, first
+    layer = max((segments[item[3]] for item in run), key=lambda s: s.length).layer
+
+    dx = first.end[0] - first.start[0]
+    dy = first.end[1] - first.start[1]
+    points = []
+    for _, _, _, idx, _ in run:
+        seg = segments[idx]
+        points.append(seg.start)
+        points.append(seg.end)
+    # Проекция на направление первого сегмента сохраняет его ориентацию
+    start = min(points, key=lambda p: p[0] * dx + p[1] * dy)
+    end = max(points, key=lambda p: p[0] * dx + p[1] * dy)
+    return first_idx, Segment(start=start, end=end, layer=layer, length=math.dist(start, end))
+
+
+def deduplicate_segments(segments: List[Segment], tol: float | None = None) -> Tuple[List[Segment], Dict[str, int]]:
+    """
+    Убирает повторяющуюся линейную графику перед поиском пар стен:
+    - вырожденные сегменты (короче tol);
+    - точные и почти точные дубликаты (хэш по узлам концов, склеенных
+      с допуском tol; направление и слой не важны — копии слоёв тоже дубли);
+    - перекрывающиеся коллинеарные куски сливаются в один.
+
+    Порядок оставшихся сегментов сохраняется. Возвращает (сегменты, статистика).
+    """
+    if tol is None:
+        tol = guess_length_tolerance(segments)
+
+    stats = {"input": len(segments), "degenerate": 0, "duplicates": 0, "overlaps_merged": 0}
+
+    unique: List[Segment] = []
+    seen = set()
+    snapper = PointSnapper(tol)
+    for seg in segments:
+        if seg.length <= tol:
+            stats["degenerate"] += 1
+            continue
+        key = canonical_segment_key(seg, snapper)
+        if key in seen:
+            stats["duplicates"] += 1
+            continue
+        seen.add(key)
+        unique.append(seg)
+
+    result, stats["overlaps_merged"] = _sweep_merge(unique, tol, join_gap=-tol)
+
+    stats["removed"] = stats["input"] - len(result)
+    stats["output"] = len(result)
+    return result, stats
+
+
+def merge_collinear_segments(segments: List[Segment], tol: float | None = None,
+                             gap: float | None = None) -> Tuple[List[Segment], int]:
+    """
+    Объединяет фрагменты одной линии в непрерывные участки.
+
+    Сегменты группируются по направлению и смещению прямой (ключ линии),
+    сортируются вдоль неё, и проход слева направо склеивает касающиеся,
+    перекрывающиеся и разделённые разрывом не больше gap куски одного слоя.
+    Так фасад, нарисованный полилинией с лишними вершинами, становится
+    одним сегментом, а не десятком кандидатов на пару. Работает за O(n log n).
+
+    Возвращает (сегменты, число поглощённых фрагментов).
+    """
+    if tol is None:
+        tol = guess_length_tolerance(segments)
+    if gap is None:
+        gap = tol * MERGE_GAP_FACTOR
+    return _sweep_merge(segments, tol, join_gap=gap, group_key=lambda seg: seg.layer)
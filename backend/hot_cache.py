@@ -0,0 +1,107 @@
+# backend/hot_cache.py
+"""
+Горячий кэш последних результатов в памяти.
+
+Результат сериализуется в JSON и сжимается gzip один раз — при сборке;
+повторные запросы (перезагрузка вьюера, несколько вкладок) отдают готовые
+байты или 304 по ETag, без json.dumps и без чтения файла.
+
+ETag — sha256 от несжатого JSON, поэтому он сильный и одинаковый для
+сжатого и несжатого представления (различие — в Content-Encoding и Vary).
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+DEFAULT_MAX_ITEMS = 8
+DEFAULT_MAX_BYTES = 256 * 2**20     # по сумме сжатого и несжатого представлений
+GZIP_LEVEL = 6
+
+
+@dataclass(frozen=True)
+class HotEntry:
+    result_id: str
+    etag: str
+    body: bytes
+    gzip_body: bytes
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.body) + len(self.gzip_body)
+
+
+def serialize(result_id: str, data: Dict[str, Any]) -> HotEntry:
+    body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+    return HotEntry(result_id, etag, body, gzip.compress(body, GZIP_LEVEL, mtime=0))
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Сравнение по If-None-Match: список тегов, '*' или слабая форма W/"..."."""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if coding.strip().lower() in ("gzip", "*"):
+            return params.replace(" ", "") != "q=0"
+    return False
+
+
+class HotResultCache:
+    """LRU по числу записей и суммарному объёму; last() — последний добавленный результат."""
+
+    def __init__(self, max_items: int = DEFAULT_MAX_ITEMS, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._items: "OrderedDict[str, HotEntry]" = OrderedDict()
+        self._bytes = 0
+        self._last_id: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def put(self, result_id: str, data: Dict[str, Any], last: bool = True) -> HotEntry:
+        entry = serialize(result_id, data)
+        with self._lock:
+            old = self._items.pop(result_id, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._items[result_id] = entry
+            self._bytes += entry.nbytes
+            if last:
+                self._last_id = result_id
+            self._evict()
+        return entry
+
+    def get(self, result_id: str) -> Optional[HotEntry]:
+        with self._lock:
+            entry = self._items.get(result_id)
+            if entry is not None:
+                self._items.move_to_end(result_id)
+            return entry
+
+    def last(self) -> Optional[HotEntry]:
+        with self._lock:
+            return self._items.get(self._last_id) if self._last_id else None
+
+    def _evict(self) -> None:
+        # Самую свежую запись не вытесняем, даже если она одна больше лимита
+        while len(self._items) > 1 and (len(self._items) > self.max_items or self._bytes > self.max_bytes):
+            _, entry = self._items.popitem(last=False)
+            self._bytes -= entry.nbytes
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"items": len(self._items), "bytes": self._bytes, "last": self._last_id}
@@ -0,0 +1,33 @@
+# backend/layer_keywords.py
+"""
+Признаки слоёв стен по именам.
+
+WALL_LAYERS_CANDIDATES — слои двухлинейных стен (dxf_walls), WALL_KEYWORDS —
+подстроки слоёв штриховок стен (dxf_parser_v2). Вынесены в отдельный модуль,
+чтобы предупреждения dxf_inspect в API-процессе читали их без импорта ezdxf
+и NumPy.
+"""
+
+# Слои, где могут быть стены
+WALL_LAYERS_CANDIDATES = {
+    "СТЕНА",
+    "СТЕНЫ",
+    "STENA",
+    "СТЕНЫ2",
+    "стена",
+    "AR_WALL_OUTER",
+    "AR_WALL_INNER",
+    "АР_Газоблок наруж",
+    "АР_Газоблок 200мм",
+    "АР_ГКЛ",
+    "АР_Монолит",
+    "PEREG",
+    "PARTITION",
+    "GKL",
+    "BRICK",
+    "GAS",
+    "ПЕРЕГОРОДКИ",
+}
+
+# Подстроки имён слоёв штриховок стен
+WALL_KEYWORDS = ["WALL", "STEN", "MONOLIT", "BLOCK", "BRICK", "GAS", "PARTITION", "PEREG"]
@@ -0,0 +1,333 @@
+# backend/low_memory.py
+"""
+Режим ограниченной памяти для очень больших планов.
+
+Обычная сборка держит одновременно документ ezdxf, объекты сегментов и
+результат. Здесь документ читается один раз, за один проход из него
+извлекается только нужное анализу:
+
+    - LINE/LWPOLYLINE — компактные массивы numpy (координаты концов,
+      номер слоя в таблице слоёв, вид ребра);
+    - кандидаты в проёмы (OpeningCandidate) и подписи помещений;
+    - штриховки стен V2 — сразу в итоговом виде (SVG-путь), это и есть
+      их компактное представление;
+
+после чего документ освобождается (gc.collect — у документа циклические
+ссылки) ещё до стадий анализа. Пары стен ищутся по плиткам с полями
+(dxf_walls._pair_segments_tiled), помещения и проёмы строятся из массивов.
+
+Бюджет — это RSS процесса в МБ (то, за что убивает OOM). Он проверяется до
+чтения (оценка по размеру файла) и после каждой стадии; при превышении
+поднимается MemoryBudgetExceeded, а не приходит OOM-killer. Пик считается
+по VmHWM из /proc (сбрасывается перед сборкой через clear_refs), без /proc
+— по ru_maxrss (пик за всю жизнь процесса).
+
+    result = analyze_plan_low_memory(path, budget_mb=1500)
+    result["memory"]   # {"budget_mb", "peak_mb", "stages": {...}, ...}
+"""
+from __future__ import annotations
+
+import gc
+import logging
+import math
+import os
+import re
+import sys
+from array import array
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import ezdxf
+import numpy as np
+
+from wall_graph import Segment
+from dxf_walls import WALL_LAYERS_CANDIDATES, DirectWall, analyze_wall_segments, direct_walls_of
+from dxf_openings import OpeningCandidate, collect_opening_candidates, bind_openings
+from dxf_rooms import analyze_room_edges
+from dxf_room_labels import collect_text_labels
+from dxf_topology import analyze_topology
+from dxf_geometry import collect_source_info, analyze_section
+from dxf_parser_v2 import extract_walls_v2
+
+log = logging.getLogger(__name__)
+
+# Документ ezdxf занимает в памяти примерно столько размеров файла
+# (замерено на реальных планах: 8–12x)
+DOC_MEMORY_FACTOR = 12
+
+# Вид ребра в PlanArrays.seg_kind
+SEG_LINE = 0            # LINE: стены и грани помещений
+SEG_POLYLINE = 1        # ребро LWPOLYLINE: только стены
+SEG_RING = 2            # ребро замкнутой LWPOLYLINE (от 4 точек): стены и грани помещений
+SEG_WIDE_RING = 3       # ребро замкнутой широкой LWPOLYLINE-стены: только грани помещений
+
+
+class MemoryBudgetExceeded(MemoryError):
+    pass
+
+
+# -----------------------------------------------------------
+# Замер памяти процесса
+# -----------------------------------------------------------
+
+_MB = 2**20
+
+
+def _rss_mb() -> Optional[float]:
+    """Текущий RSS процесса; None, если узнать нельзя."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / _MB
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _peak_mb() -> Tuple[Optional[float], str]:
+    try:
+        with open("/proc/self/status") as f:
+            m = re.search(r"VmHWM:\s+(\d+)\s+kB", f.read())
+        if m:
+            return int(m.group(1)) / 1024, "VmHWM"
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None, "unavailable"
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux — килобайты, macOS — байты
+    return (peak / _MB if sys.platform == "darwin" else peak / 1024), "ru_maxrss"
+
+
+def _reset_peak() -> bool:
+    """Сброс VmHWM до текущего RSS (Linux 4.0+), чтобы пик относился к этой сборке."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+class MemoryMonitor:
+    """RSS после каждой стадии, проверка бюджета и пик за сборку."""
+
+    def __init__(self, budget_mb: float | None = None) -> None:
+        self.budget_mb = budget_mb
+        self.stages: Dict[str, float] = {}
+        self.baseline_mb: Optional[float] = None
+        self.peak_reset = False
+
+    def start(self) -> None:
+        self.peak_reset = _reset_peak()
+        self.baseline_mb = _rss_mb()
+
+    def check_file(self, path: str) -> float:
+        """Оценка памяти под документ до чтения: план, который заведомо не влезет, не читаем."""
+        estimate = os.path.getsize(path) * DOC_MEMORY_FACTOR / _MB
+        current = _rss_mb() or 0.0
+        if self.budget_mb is not None and current + estimate > self.budget_mb:
+            raise MemoryBudgetExceeded(
+                f"План {Path(path).name} требует ~{current + estimate:.0f} МБ "
+                f"(документ ~{estimate:.0f} МБ), бюджет {self.budget_mb:.0f} МБ")
+        return estimate
+
+    def check(self, stage: str) -> None:
+        rss = _rss_mb()
+        if rss is None:
+            return
+        self.stages[stage] = round(rss, 1)
+        if self.budget_mb is not None and rss > self.budget_mb:
+            raise MemoryBudgetExceeded(
+                f"Стадия {stage}: RSS {rss:.0f} МБ больше бюджета {self.budget_mb:.0f} МБ")
+
+    def report(self) -> Dict[str, Any]:
+        peak, source = _peak_mb()
+        return {
+            "budget_mb": self.budget_mb,
+            "baseline_mb": None if self.baseline_mb is None else round(self.baseline_mb, 1),
+            "peak_mb": None if peak is None else round(peak, 1),
+            # ru_maxrss и несброшенный VmHWM — пик за всю жизнь процесса, а не за сборку
+            "peak_source": source if self.peak_reset or source != "VmHWM" else "VmHWM (process)",
+            "stages": dict(self.stages),
+        }
+
+
+# -----------------------------------------------------------
+# Компактное представление плана
+# -----------------------------------------------------------
+
+@dataclass
+class PlanArrays:
+    units: int
+    entities: int                       # число сущностей модели
+    layers: List[str]
+    seg_xy: np.ndarray                  # (n, 4) float64: x1, y1, x2, y2 в порядке модели
+    seg_layer: np.ndarray               # (n,) int32: индекс в layers
+    seg_kind: np.ndarray                # (n,) int8: SEG_LINE / SEG_POLYLINE / SEG_RING / SEG_WIDE_RING
+    direct_walls: List[DirectWall] = field(default_factory=list)
+    openings: List[OpeningCandidate] = field(default_factory=list)
+    labels: List[Dict[str, Any]] = field(default_factory=list)
+    source_info: Dict[str, Any] = field(default_factory=dict)
+    v2_walls: Optional[List[Dict[str, Any]]] = None
+
+    @property
+    def nbytes(self) -> int:
+        return self.seg_xy.nbytes + self.seg_layer.nbytes + self.seg_kind.nbytes
+
+    def wall_segments(self) -> List[Segment]:
+        """Сегменты на слоях стен — в том же порядке, что и dxf_walls._collect_segments."""
+        wall_layers = np.array([
+            any(k.upper() in name.upper() for k in WALL_LAYERS_CANDIDATES) for name in self.layers
+        ], dtype=bool)
+        # Широкие полилинии-стены уже в direct_walls, их рёбра в поиск пар не идут
+        idx = (np.flatnonzero(wall_layers[self.seg_layer] & (self.seg_kind != SEG_WIDE_RING))
+               if len(self.layers) else np.empty(0, np.int64))
+        layers = self.layers
+        return [
+            Segment(start=(x1, y1), end=(x2, y2), layer=layers[li], length=math.dist((x1, y1), (x2, y2)))
+            for (x1, y1, x2, y2), li in zip(self.seg_xy[idx].tolist(), self.seg_layer[idx].tolist())
+        ]
+
+    def room_edges(self) -> List[Tuple[Tuple[float, float], Tuple[float, float]]]:
+        """Грани помещений — как dxf_rooms.extract_room_edges: сначала контуры, затем LINE."""
+        idx = np.concatenate([np.flatnonzero(np.isin(self.seg_kind, (SEG_RING, SEG_WIDE_RING))),
+                              np.flatnonzero(self.seg_kind == SEG_LINE)])
+        return [((x1, y1), (x2, y2)) for x1, y1, x2, y2 in self.seg_xy[idx].tolist()]
+
+
+def _extract_segments(msp) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray, List[DirectWall]]:
+    layers: Dict[str, int] = {}
+    coords = array("d")
+    seg_layer = array("i")
+    seg_kind = array("b")
+    direct: List[DirectWall] = []
+
+    for e in msp.query("LINE LWPOLYLINE MLINE"):
+        walls = direct_walls_of(e)
+        if walls is not None:
+            direct.extend(walls)
+        if e.dxftype() == "MLINE":
+            continue
+        li = layers.setdefault(e.dxf.layer, len(layers))
+        if e.dxftype() == "LINE":
+            s, t = e.dxf.start, e.dxf.end
+            coords.extend((float(s.x), float(s.y), float(t.x), float(t.y)))
+            seg_layer.append(li)
+            seg_kind.append(SEG_LINE)
+            continue
+
+        pts = [(float(x), float(y)) for x, y, *_ in e.get_points("xy")]
+        closed = e.closed and len(pts) > 2
+        kind = SEG_RING if e.closed and len(pts) >= 4 else SEG_POLYLINE
+        if walls is not None:
+            # Открытая широкая полилиния нужна только как стена
+            if kind != SEG_RING:
+                continue
+            kind = SEG_WIDE_RING
+        ring = pts + [pts[0]] if closed else pts
+        for (x1, y1), (x2, y2) in zip(ring, ring[1:]):
+            coords.extend((x1, y1, x2, y2))
+            seg_layer.append(li)
+            seg_kind.append(kind)
+
+    return (list(layers),
+            np.frombuffer(coords, dtype=np.float64).reshape(-1, 4).copy(),
+            np.frombuffer(seg_layer, dtype=np.int32).copy(),
+            np.frombuffer(seg_kind, dtype=np.int8).copy(),
+            direct)
+
+
+def extract_plan_arrays(plan_path: str, v2: bool = True, geometry: bool = True,
+                        doc_key: str | None = None) -> PlanArrays:
+    """
+    Читает план и извлекает всё нужное анализу. Документ живёт только внутри
+    функции: после возврата его держат лишь циклические ссылки (нужен gc.collect).
+    doc_key — ключ кэша легенды (sha256 плана), как в extract_walls_v2.
+    """
+    try:
+        doc = ezdxf.readfile(plan_path)
+    except Exception as e:
+        raise ValueError(f"Ошибка чтения DXF файла: {e}")
+
+    msp = doc.modelspace()
+    if geometry:
+        layers, seg_xy, seg_layer, seg_kind, direct = _extract_segments(msp)
+    else:
+        layers, seg_xy = [], np.empty((0, 4))
+        seg_layer, seg_kind, direct = np.empty(0, np.int32), np.empty(0, np.int8), []
+
+    arrays = PlanArrays(
+        units=doc.header.get("$INSUNITS", 0),
+        entities=len(msp),
+        layers=layers, seg_xy=seg_xy, seg_layer=seg_layer, seg_kind=seg_kind, direct_walls=direct,
+    )
+    if geometry:
+        arrays.openings = collect_opening_candidates(doc)
+        arrays.labels = collect_text_labels(msp)
+        arrays.source_info = collect_source_info(doc)
+    if v2:
+        arrays.v2_walls = extract_walls_v2(doc, doc_key)
+    return arrays
+
+
+# -----------------------------------------------------------
+# Сборка в режиме ограниченной памяти
+# -----------------------------------------------------------
+
+def analyze_plan_low_memory(plan_path: str, section_path: str | None = None,
+                            v2: bool = True, geometry: bool = True,
+                            budget_mb: float | None = None,
+                            tile_size: float | None = None,
+                            doc_key: str | None = None) -> Dict[str, Any]:
+    """
+    Возвращает {"v2": ..., "geometry": ..., "entities": ..., "memory": ...}:
+    v2 — как analyze_dxf_v2, geometry — как analyze_dxf_geometry (только запрошенные).
+    """
+    if not Path(plan_path).exists():
+        raise FileNotFoundError(f"DXF файл не найден: {plan_path}")
+
+    monitor = MemoryMonitor(budget_mb)
+    monitor.start()
+    monitor.check_file(plan_path)
+
+    arrays = extract_plan_arrays(plan_path, v2=v2, geometry=geometry, doc_key=doc_key)
+    gc.collect()
+    monitor.check("extract")
+    log.debug("Извлечено %d рёбер (%.1f МБ массивов), документ освобождён",
+              len(arrays.seg_xy), arrays.nbytes / _MB)
+
+    result: Dict[str, Any] = {"entities": arrays.entities}
+    if v2:
+        result["v2"] = {"scene": {"walls": arrays.v2_walls, "rooms": [], "openings": []}}
+        arrays.v2_walls = None
+
+    if geometry:
+        walls_detection = analyze_wall_segments(arrays.wall_segments(), tiled=True, tile_size=tile_size,
+                                                direct_walls=arrays.direct_walls, units=arrays.units)
+        walls_list = walls_detection.get("walls", [])
+        monitor.check("walls")
+
+        openings_detection = bind_openings(arrays.openings, walls_list)
+        monitor.check("openings")
+
+        rooms_detection = analyze_room_edges(arrays.room_edges(), arrays.labels, arrays.units)
+        monitor.check("rooms")
+
+        topology = analyze_topology(rooms_detection.get("rooms", []), walls_list, openings_detection)
+        monitor.check("topology")
+
+        result["geometry"] = {
+            "source_info": arrays.source_info,
+            "geometry_analysis": {
+                "walls_detection": walls_detection,
+                "rooms_detection": rooms_detection,
+                "levels_detection": analyze_section(section_path),
+                "openings_detection": openings_detection,
+                "topology": topology,
+            },
+        }
+
+    result["memory"] = monitor.report()
+    return result
@@ -1,12 +1,30 @@
 import os
+import asyncio
+import json
+import logging
+import threading
+import time
+import uuid
 from pathlib import Path
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-import ezdxf
+from fastapi.responses import JSONResponse, StreamingResponse, FileResponse, Response
 
-# Import V2 Parser
-from dxf_parser_v2 import analyze_dxf_v2
+# Только лёгкие модули: ezdxf, numpy и анализаторы импортируются лениво,
+# внутри обработчиков (или заранее — в прогреве воркеров), чтобы процесс
+# API стартовал быстро. Бюджет импорта проверяет bench_startup.py.
+from profiling import BuildProfiler, DEFAULT_TOP_N
+from diagnostics import DEFAULT_MAX_SAMPLES
+from dxf_inspect import inspect_dxf
+from result_store import ResultStore
+from parser_version import PARSER_VERSION
+from hot_cache import HotResultCache, HotEntry, etag_matches, accepts_gzip
+import build_worker
+from singleflight import SingleFlight
+
+logging.basicConfig(level=os.environ.get("BIM_LOG_LEVEL", "INFO").upper(),
+                    format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+log = logging.getLogger("bim")
 
 app = FastAPI(title="DWG/DXF → BIM Parser (V2 Hatch-Based)")
 
@@ -21,11 +39,103 @@ app.add_middleware(
 UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+RESULTS_DIR = "results"
+os.makedirs(RESULTS_DIR, exist_ok=True)
+
+# Старые каталоги, где тоже копятся результаты и загрузки (до индекса)
+LEGACY_RESULT_DIRS = [os.path.join("storage", "results")]
+LEGACY_UPLOAD_DIRS = [os.path.join("storage", "uploads")]
+
+# Политики очистки: пустое значение — без ограничения
+RETENTION_DAYS = float(os.environ["BIM_RETENTION_DAYS"]) if os.environ.get("BIM_RETENTION_DAYS") else None
+QUOTA_MB = float(os.environ["BIM_QUOTA_MB"]) if os.environ.get("BIM_QUOTA_MB") else None
+GC_INTERVAL = float(os.environ.get("BIM_GC_INTERVAL", 600))
+
+# С очередью (BIM_QUEUE_DB) индекс пишут и воркеры на других машинах — журнал
+# обычный rollback, WAL между машинами не работает
+STORE = ResultStore(RESULTS_DIR, upload_dirs=[UPLOAD_DIR, *LEGACY_UPLOAD_DIRS],
+                    retention_days=RETENTION_DAYS, quota_mb=QUOTA_MB,
+                    journal_mode="DELETE" if os.environ.get("BIM_QUEUE_DB") else "WAL")
+
+# Последние результаты уже сериализованы и сжаты — отдаются без повторного json.dumps
+HOT = HotResultCache()
+
+# BIM_WORKERS > 0 — сборки идут в пуле прогретых процессов;
+# BIM_PREWARM=1 без пула — прогрев модулей анализа в фоне самого API-процесса
+WORKERS = int(os.environ.get("BIM_WORKERS", 0))
+PREWARM = os.environ.get("BIM_PREWARM", "0") not in ("", "0", "false")
+POOL = None
+
+# Планы больше BIM_LOW_MEMORY_FILE_MB собираются в режиме ограниченной памяти
+# (low_memory.py); BIM_MEMORY_BUDGET_MB — бюджет RSS процесса сборки
+LOW_MEMORY_FILE_MB = float(os.environ.get("BIM_LOW_MEMORY_FILE_MB", 100))
+MEMORY_BUDGET_MB = float(os.environ["BIM_MEMORY_BUDGET_MB"]) if os.environ.get("BIM_MEMORY_BUDGET_MB") else None
+
+# Процессов для поиска пар стен по плиткам в потоковом анализе (1 — без пула).
+# Пул один на процесс API и форкается при старте, до потоков (dxf_walls.pair_pool)
+WALL_WORKERS = int(os.environ.get("BIM_WALL_WORKERS", 1))
+
+# BIM_QUEUE_DB — файл очереди (build_queue): сборки выполняют воркеры queue_worker.py,
+# в том числе на других машинах; API ждёт задачу не дольше BIM_QUEUE_TIMEOUT секунд
+QUEUE_DB = os.environ.get("BIM_QUEUE_DB") or None
+QUEUE_TIMEOUT = float(os.environ.get("BIM_QUEUE_TIMEOUT", 3600))
+QUEUE_POLL = float(os.environ.get("BIM_QUEUE_POLL", 0.5))
+QUEUE = None
+if QUEUE_DB:
+    from build_queue import SQLiteBroker
+    QUEUE = SQLiteBroker(QUEUE_DB)
+
+# Одинаковые одновременные сборки (тот же план и настройки) считаются один раз
+BUILDS = SingleFlight()
+
 STATE = {
     "plan_file": None,
+    "plan_hash": None,
     "section_file": None,
 }
 
+def _protected_paths():
+    """Текущие загруженные план и разрез очистка не трогает."""
+    return [STATE["plan_file"], STATE["section_file"]]
+
+@app.on_event("startup")
+def _start_pair_pool():
+    # Первым: поток GC и пул потоков Starlette ещё не запущены
+    if WALL_WORKERS > 1:
+        from dxf_walls import pair_pool
+        pair_pool(WALL_WORKERS)
+
+@app.on_event("startup")
+def _start_store():
+    STORE.adopt_orphans(LEGACY_RESULT_DIRS)
+    STORE.start_gc(GC_INTERVAL, protect=_protected_paths)
+
+@app.on_event("startup")
+def _start_workers():
+    global POOL
+    if WORKERS > 0:
+        POOL = build_worker.BuildPool(WORKERS)
+        POOL.prewarm()
+    elif PREWARM:
+        # Старт не ждёт прогрева: первый запрос, пришедший раньше, просто догрузит модули сам
+        threading.Thread(target=build_worker.warm_up, name="bim-prewarm", daemon=True).start()
+
+@app.on_event("shutdown")
+def _stop_store():
+    STORE.stop_gc()
+    if POOL is not None:
+        POOL.shutdown()
+    if WALL_WORKERS > 1:
+        from dxf_walls import shutdown_pair_pool
+        shutdown_pair_pool()
+
+def _quick_summary(path: str) -> dict:
+    """Мгновенная сводка по загруженному файлу (слои, объекты, предупреждения)."""
+    try:
+        return inspect_dxf(path)
+    except Exception as e:
+        return {"is_dxf": False, "error": str(e), "warnings": [f"Файл не удалось прочитать как DXF: {e}"]}
+
 @app.post("/api/plan/upload")
 async def upload_plan(file: UploadFile = File(...)):
     try:
@@ -37,7 +147,10 @@ async def upload_plan(file: UploadFile = File(...)):
             f.write(await file.read())
 
         STATE["plan_file"] = save_path
-        return {"status": "ok", "file_id": file_id, "path": save_path}
+        plan_hash = STORE.register_upload(save_path, "plan")
+        STATE["plan_hash"] = plan_hash
+        return {"status": "ok", "file_id": file_id, "path": save_path, "plan_hash": plan_hash,
+                "summary": _quick_summary(save_path)}
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -53,40 +166,286 @@ async def upload_section(file: UploadFile = File(...)):
             f.write(await file.read())
 
         STATE["section_file"] = save_path
+        STORE.register_upload(save_path, "section")
         return {"status": "ok", "file_id": file_id, "path": save_path}
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/bim/build")
-async def build_bim():
-    try:
-        plan_path = STATE["plan_file"]
+def _current_plan() -> str:
+    plan_path = STATE["plan_file"]
 
-        if plan_path is None:
-            raise HTTPException(status_code=400, detail="DXF План не загружен. Загрузите файл Плана (Шаг 1).")
-        
-        if not Path(plan_path).exists():
-             raise HTTPException(status_code=500, detail=f"Файл плана не найден на сервере по пути: {plan_path}")
+    if plan_path is None:
+        raise HTTPException(status_code=400, detail="DXF План не загружен. Загрузите файл Плана (Шаг 1).")
 
-        # --- ЗАГРУЗКА DXF ---
-        try:
-            doc = ezdxf.readfile(plan_path)
-        except Exception as e:
-            raise ValueError(f"Ошибка чтения DXF файла: {e}")
+    if not Path(plan_path).exists():
+        raise HTTPException(status_code=500, detail=f"Файл плана не найден на сервере по пути: {plan_path}")
+    return plan_path
 
-        # --- АНАЛИЗ ГЕОМЕТРИИ (V2 HATCH-BASED) ---
-        # Возвращает структуру { "scene": { "walls": [...], ... } }
-        bim_json = analyze_dxf_v2(doc)
+def _build_settings(plan_path: str, diagnostics: bool, diagnostics_samples: int,
+                    low_memory: bool | None, memory_budget_mb: float | None):
+    # Диагностика (счётчики и примеры пропусков) собирается только по запросу
+    samples = diagnostics_samples if diagnostics else None
+    # Без явного low_memory режим выбирается по размеру файла
+    if low_memory is None:
+        low_memory = os.path.getsize(plan_path) >= LOW_MEMORY_FILE_MB * 2**20
+    budget = memory_budget_mb if memory_budget_mb is not None else MEMORY_BUDGET_MB
+    return samples, low_memory, budget
 
-        return JSONResponse(content=bim_json)
+@app.post("/api/bim/build")
+async def build_bim(request: Request, profile: bool = False, profile_top: int = DEFAULT_TOP_N,
+                    diagnostics: bool = False, diagnostics_samples: int = DEFAULT_MAX_SAMPLES,
+                    low_memory: bool | None = None, memory_budget_mb: float | None = None):
+    try:
+        plan_path = _current_plan()
+        plan_hash = STATE["plan_hash"]
+        section_path = STATE["section_file"]
+        samples, low_memory, budget = _build_settings(plan_path, diagnostics, diagnostics_samples,
+                                                      low_memory, memory_budget_mb)
+        if profile:
+            # Профиль снимается только для этой сборки, в этом процессе, и кладётся рядом с результатом
+            # (такие сборки не схлопываются: профиль относится к конкретному запуску)
+            result_id = str(uuid.uuid4())
+            with BuildProfiler(top_n=profile_top) as profiler:
+                bim_json, timings = build_worker.run_build(plan_path, None, samples, low_memory, budget, plan_hash)
+            profiler.save(os.path.join(RESULTS_DIR, result_id))
+            return _serve_entry(_store_result(result_id, bim_json, timings, plan_path, section_path,
+                                              profile=profiler.summary()), request)
+
+        # Ключ — содержимое плана и всё, что влияет на результат; ждущие получают тот же result_id
+        key = (plan_hash, section_path, samples, low_memory, budget)
+        entry = await BUILDS.do(key, lambda: _build_and_store(plan_path, plan_hash, section_path, samples,
+                                                              low_memory, budget))
+        return _serve_entry(entry, request)
 
     except FileNotFoundError as fnf:
         raise HTTPException(status_code=404, detail=str(fnf))
+    except MemoryError as e:
+        # Бюджет памяти (low_memory.MemoryBudgetExceeded): план слишком велик для этого воркера
+        log.warning("Сборка остановлена по памяти: %s", e)
+        return JSONResponse(status_code=413, content={"error": str(e)})
+    except TimeoutError as e:
+        # Воркеры очереди не успели (или их нет) — задача остаётся в очереди
+        log.warning("%s", e)
+        return JSONResponse(status_code=504, content={"error": str(e)})
     except Exception as e:
-        print(f"CRITICAL ERROR: {e}")
+        log.exception("CRITICAL ERROR: %s", e)
         return JSONResponse(status_code=500, content={"error": str(e)})
 
+def _store_result(result_id: str, bim_json: dict, timings: dict, plan_path: str,
+                  section_path: str | None, profile: dict | None = None) -> HotEntry:
+    # Индекс помнит план и разрез результата — по ним лениво собирается 3D-меш
+    STORE.save_result(result_id, bim_json, plan_path, section_file=section_path,
+                      parser_version=PARSER_VERSION, timings=timings)
+    bim_json["result_id"] = result_id
+    if profile is not None:
+        # Профиль — только в ответе, в сохранённый результат он не попадает
+        bim_json["profile"] = profile
+    return HOT.put(result_id, bim_json)
+
+def _job_payload(plan_path: str, section_path: str | None, samples: int | None,
+                 low_memory: bool, budget: float | None) -> dict:
+    # Пути абсолютные: воркер запускается из другого каталога, часто на другой машине
+    return {"plan_file": os.path.abspath(plan_path), "plan_hash": STATE["plan_hash"],
+            "section_file": os.path.abspath(section_path) if section_path else None,
+            "diagnostics_samples": samples, "low_memory": low_memory, "memory_budget_mb": budget}
+
+async def _wait_job(job_id: str):
+    """Ожидание задачи очереди; результат уже лежит в STORE, его пишет воркер."""
+    deadline = time.monotonic() + QUEUE_TIMEOUT
+    while True:
+        job = await asyncio.to_thread(QUEUE.get, job_id)
+        if job is None:
+            raise RuntimeError(f"Задача {job_id} пропала из очереди")
+        if job.finished:
+            break
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Задача {job_id} не выполнена за {QUEUE_TIMEOUT:.0f} s (статус {job.status})")
+        await asyncio.sleep(QUEUE_POLL)
+    if job.status == "failed":
+        if job.error_type == "MemoryBudgetExceeded":
+            raise MemoryError(job.error)
+        if job.error_type == "FileNotFoundError":
+            raise FileNotFoundError(job.error)
+        raise RuntimeError(job.error)
+    return job
+
+async def _build_and_store(plan_path: str, plan_hash: str | None, section_path: str | None, samples: int | None,
+                           low_memory: bool, budget: float | None) -> HotEntry:
+    """Одна сборка с сохранением; результат общий для всех схлопнутых запросов."""
+    if QUEUE is not None:
+        job = await asyncio.to_thread(QUEUE.submit, _job_payload(plan_path, section_path, samples, low_memory, budget))
+        job = await _wait_job(job.id)
+        entry = _hot_result(job.result_id, last=True)
+        if entry is None:
+            raise RuntimeError(f"Результат {job.result_id} задачи {job.id} не найден в хранилище")
+        return entry
+    if POOL is not None:
+        bim_json, timings = await POOL.run(plan_path, samples, low_memory, budget, plan_hash)
+    else:
+        # В потоке, чтобы цикл событий принимал запросы (и присоединял их к этой сборке)
+        bim_json, timings = await asyncio.to_thread(
+            build_worker.run_build, plan_path, None, samples, low_memory, budget, plan_hash)
+    return _store_result(str(uuid.uuid4()), bim_json, timings, plan_path, section_path)
+
+@app.get("/api/bim/build/stats")
+def build_stats():
+    """Счётчики сборок: запущено, схлопнуто (сэкономлено), идёт сейчас; задачи очереди по статусам."""
+    return {"builds": BUILDS.stats(), "hot_cache": HOT.stats(),
+            "queue": QUEUE.stats() if QUEUE is not None else None}
+
+def _require_queue():
+    if QUEUE is None:
+        raise HTTPException(status_code=404, detail="Очередь сборок не настроена (BIM_QUEUE_DB)")
+    return QUEUE
+
+@app.post("/api/bim/jobs", status_code=202)
+def submit_job(diagnostics: bool = False, diagnostics_samples: int = DEFAULT_MAX_SAMPLES,
+               low_memory: bool | None = None, memory_budget_mb: float | None = None):
+    """Задача сборки без ожидания: статус — GET /api/bim/jobs/{id}, результат — по его result_id."""
+    queue = _require_queue()
+    plan_path = _current_plan()
+    samples, low_memory, budget = _build_settings(plan_path, diagnostics, diagnostics_samples,
+                                                  low_memory, memory_budget_mb)
+    job = queue.submit(_job_payload(plan_path, STATE["section_file"], samples, low_memory, budget))
+    return job.to_dict()
+
+@app.get("/api/bim/jobs/{job_id}")
+def get_job(job_id: str):
+    job = _require_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    return job.to_dict()
+
+def _sse_events(plan_path: str, chunk_size: int):
+    """Оборачивает события iter_dxf_geometry в формат Server-Sent Events."""
+    from dxf_geometry import iter_dxf_geometry
+    try:
+        for event in iter_dxf_geometry(plan_path, chunk_size=chunk_size, wall_workers=WALL_WORKERS):
+            payload = json.dumps(event, ensure_ascii=False)
+            yield f"event: {event['event']}\ndata: {payload}\n\n"
+    except Exception as e:
+        log.exception("CRITICAL ERROR (stream): %s", e)
+        payload = json.dumps({"event": "error", "error": str(e)}, ensure_ascii=False)
+        yield f"event: error\ndata: {payload}\n\n"
+
+@app.get("/api/bim/build/stream")
+def build_bim_stream(chunk_size: int | None = None):
+    """
+    Потоковая сборка: стены, проёмы и помещения отправляются по мере готовности (SSE).
+    """
+    plan_path = STATE["plan_file"]
+
+    if plan_path is None:
+        raise HTTPException(status_code=400, detail="DXF План не загружен. Загрузите файл Плана (Шаг 1).")
+
+    if not Path(plan_path).exists():
+        raise HTTPException(status_code=500, detail=f"Файл плана не найден на сервере по пути: {plan_path}")
+
+    if chunk_size is None:
+        from dxf_geometry import STREAM_CHUNK_SIZE
+        chunk_size = STREAM_CHUNK_SIZE
+
+    return StreamingResponse(
+        _sse_events(plan_path, chunk_size),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def _result_base(result_id: str) -> str:
+    try:
+        return os.path.join(RESULTS_DIR, str(uuid.UUID(result_id)))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некорректный идентификатор результата")
+
+@app.get("/api/bim/result/{result_id}/mesh.glb")
+def result_mesh(result_id: str):
+    """
+    3D-меш стен результата (glTF binary). Собирается при первом запросе
+    из сохранённых стен результата и кэшируется рядом с ним: results/<id>.glb.
+    """
+    result_base = _result_base(result_id)
+    glb_path = result_base + ".glb"
+    record = STORE.get(os.path.basename(result_base))
+    if record is None:
+        raise HTTPException(status_code=404, detail="Результат не найден")
+
+    if not Path(glb_path).exists():
+        if not record["plan_file"] or not Path(record["plan_file"]).exists():
+            raise HTTPException(status_code=410, detail="Файл плана для этого результата удалён")
+        section = record["section_file"]
+        if section and not Path(section).exists():
+            section = None
+        result = STORE.load(record["id"])
+        if result is None:
+            raise HTTPException(status_code=404, detail="Результат не найден")
+        try:
+            from mesh_export import export_result_glb
+            export_result_glb(result, record["plan_file"], glb_path, section)
+        except Exception as e:
+            log.exception("CRITICAL ERROR (mesh): %s", e)
+            return JSONResponse(status_code=500, content={"error": str(e)})
+        STORE.refresh_size(record["id"])
+
+    return FileResponse(glb_path, media_type="model/gltf-binary", filename=f"{result_id}.glb")
+
+@app.get("/api/results")
+def list_results(plan_hash: str | None = None, current_parser: bool = False,
+                 limit: int = 50, offset: int = 0):
+    """Список результатов из индекса (без чтения JSON), новые первыми."""
+    parser_version = PARSER_VERSION if current_parser else None
+    return {
+        "results": STORE.list_results(plan_hash, parser_version,
+                                      limit=min(max(limit, 1), 500), offset=max(offset, 0)),
+        "usage": STORE.usage(),
+    }
+
+def _serve_entry(entry: HotEntry, request: Request) -> Response:
+    """Готовые байты результата: 304 по If-None-Match, gzip если клиент его принимает."""
+    headers = {
+        "ETag": entry.etag,
+        "Vary": "Accept-Encoding",
+        # Клиент может хранить копию, но обязан перепроверять её по ETag
+        "Cache-Control": "no-cache",
+        "X-Result-Id": entry.result_id,
+    }
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=headers)
+    if accepts_gzip(request.headers.get("accept-encoding")):
+        headers["Content-Encoding"] = "gzip"
+        return Response(entry.gzip_body, media_type="application/json", headers=headers)
+    return Response(entry.body, media_type="application/json", headers=headers)
+
+def _hot_result(result_id: str, last: bool = False) -> HotEntry | None:
+    """Результат из горячего кэша, иначе с диска (и в кэш)."""
+    entry = HOT.get(result_id)
+    if entry is None:
+        data = STORE.load(result_id)
+        if data is None:
+            return None
+        data.setdefault("result_id", result_id)
+        entry = HOT.put(result_id, data, last=last)
+    return entry
+
+@app.get("/api/results/{result_id}")
+def get_result(result_id: str, request: Request):
+    entry = _hot_result(os.path.basename(_result_base(result_id)))
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Результат не найден")
+    return _serve_entry(entry, request)
+
+@app.get("/api/plan/last")
+def plan_last(request: Request):
+    """Последний собранный результат: из памяти, после перезапуска — последний из индекса."""
+    entry = HOT.last()
+    if entry is None:
+        latest = STORE.list_results(limit=1)
+        if latest:
+            entry = _hot_result(latest[0]["id"], last=True)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Ещё нет ни одного результата сборки")
+    return _serve_entry(entry, request)
+
 @app.get("/")
 def root():
     return {"status": "backend is running (V2)", "state": STATE}
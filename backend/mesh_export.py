@@ -0,0 +1,537 @@
+# backend/mesh_export.py
+"""
+Выдавливание стен плана в 3D и запись в glTF 2.0 (GLB).
+
+Источники геометрии:
+    - стены analyze_walls (четырёхугольники "coordinates"); стена с проёмами
+      режется по оси на куски: простенки на всю высоту, под окном — подоконная
+      часть, над окном и дверью — перемычка;
+    - штриховки стен (как в extract_walls_v2): контуры с отверстиями
+      триангулируются mapbox earcut из ezdxf и выдавливаются призмой.
+      Проёмы привязаны к стенам analyze_walls, штриховки ими не режутся.
+
+Высота этажа берётся из отметок разреза (dxf_sections): самый частый шаг
+между соседними отметками; без разреза — DEFAULT_FLOOR_HEIGHT.
+
+Выдавливание векторизовано: все четырёхугольники собираются в один массив
+(N, 4, 2) и превращаются в вершины (N, 8, 3) и индексы по шаблону коробки.
+Результат — один меш, по примитиву на материал; координаты в метрах,
+ось Y glTF направлена вверх (план XY → glTF X, -Z).
+
+Для API меш строится по сохранённому результату (export_result_glb), без
+повторного анализа плана; export_plan_glb — полный путь для CLI.
+
+Пример:
+    python mesh_export.py plan.dxf plan.glb --section section.dxf
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import struct
+import tempfile
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+Point = Tuple[float, float]
+
+DEFAULT_FLOOR_HEIGHT = 3.0          # м, если разреза нет
+FLOOR_HEIGHT_RANGE = (2.4, 6.0)     # правдоподобный шаг отметок этажей, м
+LEVEL_STEP_ROUND = 0.05             # шаги отметок группируются с точностью 5 см
+
+DOOR_HEIGHT = 2.0                   # м
+WINDOW_SILL = 0.9
+WINDOW_HEIGHT = 1.5
+
+HATCH_FLATTEN_DISTANCE = 5.0        # допуск аппроксимации дуг штриховок, мм
+
+# $INSUNITS → метров в единице чертежа
+LENGTH_SCALE_BY_UNITS = {4: 0.001, 5: 0.01, 6: 1.0, 14: 0.1}
+
+MATERIAL_COLORS = {
+    "concrete": "#A9A9A9",
+    "brick": "#CD5C5C",
+    "partition": "#D8D0C0",
+    "generic": "#999999",
+}
+
+# Коробка из 8 вершин: 0-3 низ (обход четырёхугольника), 4-7 верх
+_BOX_FACES = np.array([
+    0, 2, 1, 0, 3, 2,           # низ
+    4, 5, 6, 4, 6, 7,           # верх
+    0, 1, 5, 0, 5, 4,
+    1, 2, 6, 1, 6, 5,
+    2, 3, 7, 2, 7, 6,
+    3, 0, 4, 3, 4, 7,
+], dtype=np.uint32)
+
+
+@dataclass
+class PlanMesh:
+    """Меш по материалам: {материал: (вершины (N, 3) float32 в метрах, индексы uint32)}."""
+    primitives: Dict[str, Tuple[np.ndarray, np.ndarray]] = field(default_factory=dict)
+    floor_height: float = DEFAULT_FLOOR_HEIGHT
+    base_level: float = 0.0
+
+    @property
+    def vertex_count(self) -> int:
+        return sum(len(v) for v, _ in self.primitives.values())
+
+    @property
+    def triangle_count(self) -> int:
+        return sum(len(i) // 3 for _, i in self.primitives.values())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "vertices": self.vertex_count,
+            "triangles": self.triangle_count,
+            "materials": sorted(self.primitives),
+            "floor_height": self.floor_height,
+            "base_level": self.base_level,
+        }
+
+
+# -----------------------------------------------------------
+# Отметки разреза → высота этажа
+# -----------------------------------------------------------
+
+def floor_height_from_levels(levels: Iterable[Dict[str, Any]]) -> Tuple[float, float]:
+    """
+    (высота этажа, отметка низа) по отметкам разреза: самый частый шаг между
+    соседними отметками в FLOOR_HEIGHT_RANGE, низ — отметка, ближайшая к ±0.000.
+    """
+    values = sorted({float(l["value"]) for l in levels if l.get("value") is not None})
+    if not values:
+        return DEFAULT_FLOOR_HEIGHT, 0.0
+    base = min(values, key=abs)
+
+    lo, hi = FLOOR_HEIGHT_RANGE
+    steps = Counter(
+        round(round((b - a) / LEVEL_STEP_ROUND) * LEVEL_STEP_ROUND, 3)
+        for a, b in zip(values, values[1:])
+        if lo <= b - a <= hi
+    )
+    if not steps:
+        return DEFAULT_FLOOR_HEIGHT, base
+    # При равной частоте — меньший шаг (типовой этаж, а не технический)
+    height = min(steps.items(), key=lambda kv: (-kv[1], kv[0]))[0]
+    return height, base
+
+
+def length_scale(doc, lengths: Sequence[float] = ()) -> float:
+    """Метров в единице чертежа: по $INSUNITS, иначе по величине длин (как to_mm)."""
+    units = doc.header.get("$INSUNITS", 0) if doc is not None else 0
+    if units in LENGTH_SCALE_BY_UNITS:
+        return LENGTH_SCALE_BY_UNITS[units]
+    values = sorted(v for v in lengths if v > 0)
+    return 0.001 if values and values[len(values) // 2] > 50.0 else 1.0
+
+
+# -----------------------------------------------------------
+# Векторизованное выдавливание
+# -----------------------------------------------------------
+
+def extrude_quads(quads: np.ndarray, z0: np.ndarray, z1: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    quads (N, 4, 2), z0/z1 (N,) → вершины (N*8, 3) и индексы (N*36,).
+    Порядок вершин четырёхугольника может быть любым по направлению:
+    отрицательные по обходу коробки разворачиваются.
+    """
+    n = len(quads)
+    if n == 0:
+        return np.zeros((0, 3), np.float32), np.zeros(0, np.uint32)
+
+    quads = quads.astype(float, copy=True)
+    x, y = quads[:, :, 0], quads[:, :, 1]
+    signed = (x * np.roll(y, -1, axis=1) - np.roll(x, -1, axis=1) * y).sum(axis=1)
+    quads[signed < 0] = quads[signed < 0][:, ::-1]
+
+    verts = np.empty((n, 8, 3), dtype=float)
+    verts[:, :4, :2] = quads
+    verts[:, 4:, :2] = quads
+    verts[:, :4, 2] = z0[:, None]
+    verts[:, 4:, 2] = z1[:, None]
+
+    indices = (_BOX_FACES[None, :] + (np.arange(n, dtype=np.uint32) * 8)[:, None]).ravel()
+    return verts.reshape(-1, 3), indices
+
+
+def extrude_polygon(triangles: np.ndarray, rings: List[np.ndarray], z0: float, z1: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Призма по триангулированному контуру с отверстиями.
+    triangles (T, 3, 2) — треугольники крышки, rings — контуры (внешний и отверстия)
+    для боковых граней. Вершины не переиспользуются между крышкой и стенками:
+    так у граней получаются резкие рёбра при плоском затенении.
+    """
+    t = len(triangles)
+    tri = triangles.reshape(-1, 2)
+    bottom = np.column_stack([tri, np.full(len(tri), z0)])
+    top = np.column_stack([tri, np.full(len(tri), z1)])
+    cap_idx = np.arange(t * 3, dtype=np.uint32).reshape(t, 3)
+    parts_v = [bottom, top]
+    parts_i = [cap_idx[:, ::-1].ravel(), (cap_idx + t * 3).ravel()]
+    offset = t * 6
+
+    for ring in rings:
+        a = ring
+        b = np.roll(ring, -1, axis=0)
+        m = len(ring)
+        side = np.empty((m, 4, 3))
+        side[:, 0, :2], side[:, 1, :2] = a, b
+        side[:, 2, :2], side[:, 3, :2] = b, a
+        side[:, :2, 2], side[:, 2:, 2] = z0, z1
+        base = offset + np.arange(m, dtype=np.uint32)[:, None] * 4
+        quad = np.array([0, 1, 2, 0, 2, 3], dtype=np.uint32)
+        parts_v.append(side.reshape(-1, 3))
+        parts_i.append((base + quad).ravel())
+        offset += m * 4
+
+    return np.concatenate(parts_v), np.concatenate(parts_i).astype(np.uint32)
+
+
+# -----------------------------------------------------------
+# Стены с проёмами → куски-четырёхугольники
+# -----------------------------------------------------------
+
+def _wall_frame(wall: Dict[str, Any]) -> Optional[Tuple[np.ndarray, np.ndarray, float, float]]:
+    """Начало оси, направление, длина и полутолщина (в единицах чертежа)."""
+    start = np.asarray(wall["start"], dtype=float)
+    end = np.asarray(wall["end"], dtype=float)
+    length = float(np.hypot(*(end - start)))
+    corners = np.asarray(wall.get("coordinates") or [], dtype=float)
+    if length == 0 or len(corners) < 3:
+        return None
+    u = (end - start) / length
+    n = np.array([-u[1], u[0]])
+    half = float(np.abs((corners - start) @ n).max())
+    return start, u, length, half
+
+
+def wall_pieces(walls: List[Dict[str, Any]], openings: List[Dict[str, Any]],
+                scale: float, floor_height: float) -> Dict[str, Tuple[List[np.ndarray], List[float], List[float]]]:
+    """
+    Куски стен по материалам: {материал: (четырёхугольники, z0, z1)} в единицах чертежа
+    (высоты — в метрах, переводятся при сборке).
+    """
+    by_wall: Dict[str, List[Dict[str, Any]]] = {}
+    for o in openings:
+        by_wall.setdefault(o.get("wall_id"), []).append(o)
+
+    pieces: Dict[str, Tuple[List[np.ndarray], List[float], List[float]]] = {}
+
+    def add(material: str, quad: np.ndarray, z0: float, z1: float) -> None:
+        q, lo, hi = pieces.setdefault(material, ([], [], []))
+        q.append(quad)
+        lo.append(z0)
+        hi.append(z1)
+
+    for wall in walls:
+        material = wall.get("material") or "generic"
+        hosted = by_wall.get(wall["id"])
+        if not hosted:
+            add(material, np.asarray(wall["coordinates"], dtype=float)[:4], 0.0, floor_height)
+            continue
+
+        frame = _wall_frame(wall)
+        if frame is None:
+            continue
+        start, u, length, half = frame
+        n = np.array([-u[1], u[0]]) * half
+
+        def quad(t0: float, t1: float) -> np.ndarray:
+            a, b = start + u * t0, start + u * t1
+            return np.array([a - n, b - n, b + n, a + n])
+
+        # Интервалы проёмов вдоль оси (ширина проёма в метрах)
+        spans = []
+        for o in hosted:
+            t = float((np.asarray(o["position"], dtype=float) - start) @ u)
+            w = float(o.get("width") or 0.9) / scale
+            t0, t1 = max(t - w / 2, 0.0), min(t + w / 2, length)
+            if t1 > t0:
+                spans.append((t0, t1, o.get("type")))
+        spans.sort()
+
+        cursor = 0.0
+        for t0, t1, kind in spans:
+            t0 = max(t0, cursor)
+            if t1 <= t0:
+                continue
+            if t0 > cursor:
+                add(material, quad(cursor, t0), 0.0, floor_height)
+            top = DOOR_HEIGHT if kind == "door" else WINDOW_SILL + WINDOW_HEIGHT
+            if kind == "window":
+                add(material, quad(t0, t1), 0.0, min(WINDOW_SILL, floor_height))
+            if top < floor_height:
+                add(material, quad(t0, t1), top, floor_height)
+            cursor = t1
+        if cursor < length:
+            add(material, quad(cursor, length), 0.0, floor_height)
+
+    return pieces
+
+
+# -----------------------------------------------------------
+# Штриховки стен → контуры с отверстиями
+# -----------------------------------------------------------
+
+def hatch_polygons(doc, scale: float = 0.001,
+                   materials: Optional[Dict[str, str]] = None) -> List[Tuple[str, List[np.ndarray]]]:
+    """
+    [(материал, [внешний контур, отверстия...])] по штриховкам слоёв стен.
+    scale — метров в единице чертежа (length_scale).
+    materials — {handle: материал} стен сохранённого результата: берутся только
+    эти штриховки и с этими материалами.
+    """
+    from ezdxf import path
+    from ezdxf.path import nesting
+    from dxf_parser_v2 import MaterialMapper, WALL_KEYWORDS
+
+    mapper = MaterialMapper(doc) if materials is None else None
+    flatten = HATCH_FLATTEN_DISTANCE / 1000.0 / scale
+    result: List[Tuple[str, List[np.ndarray]]] = []
+    for hatch in doc.modelspace().query("HATCH"):
+        layer = hatch.dxf.layer
+        if materials is not None:
+            if hatch.dxf.handle not in materials:
+                continue
+            material = materials[hatch.dxf.handle]
+        else:
+            if not any(k in layer.upper() for k in WALL_KEYWORDS):
+                continue
+            # Образцы легенды лежат на слоях стен, но стенами не являются
+            if hatch.dxf.handle in mapper.legend_samples:
+                continue
+            material = mapper.get_material_props(layer, hatch.dxf.pattern_name)["material"]
+        try:
+            paths = [p for p in path.from_hatch(hatch) if len(p) > 0]
+            for group in nesting.group_paths(paths):
+                rings = []
+                for p in group:
+                    ring = np.array([(v.x, v.y) for v in p.flattening(flatten)], dtype=float)
+                    if len(ring) > 1 and np.allclose(ring[0], ring[-1]):
+                        ring = ring[:-1]
+                    if len(ring) >= 3:
+                        rings.append(ring)
+                if rings:
+                    result.append((material, rings))
+        except Exception:
+            continue
+    return result
+
+
+def triangulate(rings: List[np.ndarray]) -> np.ndarray:
+    """Треугольники (T, 3, 2) для контура rings[0] с отверстиями rings[1:]."""
+    from ezdxf.math import Vec2
+    from ezdxf.math.triangulation import mapbox_earcut_2d
+
+    exterior = [Vec2(p) for p in rings[0]]
+    holes = [[Vec2(p) for p in r] for r in rings[1:]]
+    tris = mapbox_earcut_2d(exterior, holes)
+    if not tris:
+        return np.zeros((0, 3, 2))
+    return np.array([[(v.x, v.y) for v in t] for t in tris], dtype=float)
+
+
+# -----------------------------------------------------------
+# Сборка меша
+# -----------------------------------------------------------
+
+def build_plan_mesh(doc, walls: List[Dict[str, Any]], openings: List[Dict[str, Any]],
+                    levels: Iterable[Dict[str, Any]] = (), include_hatches: bool = True,
+                    hatch_materials: Optional[Dict[str, str]] = None) -> PlanMesh:
+    """Меш стен одного этажа плана в метрах (hatch_materials — см. hatch_polygons)."""
+    floor_height, base_level = floor_height_from_levels(levels)
+    scale = length_scale(doc, [w.get("length", 0.0) for w in walls])
+
+    parts: Dict[str, Tuple[List[np.ndarray], List[np.ndarray], int]] = {}
+
+    def append(material: str, verts: np.ndarray, idx: np.ndarray) -> None:
+        vs, ids, count = parts.setdefault(material, ([], [], 0))
+        vs.append(verts)
+        ids.append(idx + count)
+        parts[material] = (vs, ids, count + len(verts))
+
+    for material, (quads, z0, z1) in wall_pieces(walls, openings, scale, floor_height).items():
+        verts, idx = extrude_quads(np.array(quads), np.array(z0) / scale, np.array(z1) / scale)
+        append(material, verts, idx)
+
+    if include_hatches and doc is not None:
+        for material, rings in hatch_polygons(doc, scale, hatch_materials):
+            tris = triangulate(rings)
+            if len(tris):
+                verts, idx = extrude_polygon(tris, rings, 0.0, floor_height / scale)
+                append(material, verts, idx)
+
+    mesh = PlanMesh(floor_height=floor_height, base_level=base_level)
+    for material, (vs, ids, _count) in sorted(parts.items()):
+        verts = np.concatenate(vs) * scale
+        verts[:, 2] += base_level
+        # План XY, высота Z → glTF (X, Y вверх, Z к зрителю)
+        gltf = np.column_stack([verts[:, 0], verts[:, 2], -verts[:, 1]]).astype(np.float32)
+        mesh.primitives[material] = (gltf, np.concatenate(ids).astype(np.uint32))
+    return mesh
+
+
+# -----------------------------------------------------------
+# GLB
+# -----------------------------------------------------------
+
+def _hex_to_rgba(color: str) -> List[float]:
+    color = color.lstrip("#")
+    return [int(color[i:i + 2], 16) / 255.0 for i in (0, 2, 4)] + [1.0]
+
+
+def _pad(data: bytes, fill: bytes) -> bytes:
+    return data + fill * (-len(data) % 4)
+
+
+def glb_bytes(mesh: PlanMesh) -> bytes:
+    """Сериализует меш в бинарный glTF 2.0 (один буфер, по примитиву на материал)."""
+    buffer = bytearray()
+    buffer_views: List[Dict[str, Any]] = []
+    accessors: List[Dict[str, Any]] = []
+    materials: List[Dict[str, Any]] = []
+    primitives: List[Dict[str, Any]] = []
+
+    def add_view(data: bytes, target: int) -> int:
+        buffer.extend(b"\0" * (-len(buffer) % 4))
+        buffer_views.append({"buffer": 0, "byteOffset": len(buffer), "byteLength": len(data), "target": target})
+        buffer.extend(data)
+        return len(buffer_views) - 1
+
+    for material, (verts, idx) in mesh.primitives.items():
+        if len(verts) == 0:
+            continue
+        pos_view = add_view(verts.tobytes(), 34962)      # ARRAY_BUFFER
+        accessors.append({
+            "bufferView": pos_view, "componentType": 5126, "count": len(verts), "type": "VEC3",
+            "min": verts.min(axis=0).tolist(), "max": verts.max(axis=0).tolist(),
+        })
+        idx_view = add_view(idx.tobytes(), 34963)        # ELEMENT_ARRAY_BUFFER
+        accessors.append({"bufferView": idx_view, "componentType": 5125, "count": len(idx), "type": "SCALAR"})
+        materials.append({
+            "name": material,
+            # Обход крышек штриховок после earcut не согласован — рисуем обе стороны
+            "doubleSided": True,
+            "pbrMetallicRoughness": {
+                "baseColorFactor": _hex_to_rgba(MATERIAL_COLORS.get(material, MATERIAL_COLORS["generic"])),
+                "metallicFactor": 0.0,
+                "roughnessFactor": 0.9,
+            },
+        })
+        primitives.append({
+            "attributes": {"POSITION": len(accessors) - 2},
+            "indices": len(accessors) - 1,
+            "material": len(materials) - 1,
+        })
+
+    gltf: Dict[str, Any] = {
+        "asset": {"version": "2.0", "generator": "dxf-bim mesh_export"},
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [{"name": "walls", "mesh": 0}] if primitives else [{"name": "walls"}],
+        "extras": mesh.stats(),
+    }
+    if primitives:
+        gltf.update({
+            "meshes": [{"name": "walls", "primitives": primitives}],
+            "materials": materials,
+            "accessors": accessors,
+            "bufferViews": buffer_views,
+            "buffers": [{"byteLength": len(buffer)}],
+        })
+
+    json_chunk = _pad(json.dumps(gltf, separators=(",", ":")).encode("utf-8"), b" ")
+    bin_chunk = _pad(bytes(buffer), b"\0")
+    total = 12 + 8 + len(json_chunk) + (8 + len(bin_chunk) if buffer else 0)
+
+    out = bytearray(struct.pack("<4sII", b"glTF", 2, total))
+    out += struct.pack("<I4s", len(json_chunk), b"JSON") + json_chunk
+    if buffer:
+        out += struct.pack("<I4s", len(bin_chunk), b"BIN\0") + bin_chunk
+    return bytes(out)
+
+
+def write_glb(mesh: PlanMesh, out_path: str | Path) -> Path:
+    """Атомарная запись .glb (через временный файл), чтобы кэш не видел недописанный файл."""
+    out = Path(out_path)
+    # Уникальное имя: параллельные первые запросы к одному результату не пишут в один файл
+    with tempfile.NamedTemporaryFile(dir=out.parent, prefix=out.name + ".", suffix=".tmp", delete=False) as f:
+        tmp = Path(f.name)
+        f.write(glb_bytes(mesh))
+    try:
+        tmp.replace(out)
+    except OSError:
+        tmp.unlink(missing_ok=True)
+        raise
+    return out
+
+
+def export_plan_glb(plan_path: str, out_path: str | Path, section_path: str | None = None) -> Dict[str, Any]:
+    """Полный путь: чтение плана, стены, проёмы, отметки разреза → .glb. Возвращает статистику меша."""
+    import ezdxf
+    from dxf_walls import analyze_walls
+    from dxf_openings import analyze_openings
+    from dxf_sections import extract_levels_from_dxf
+
+    doc = ezdxf.readfile(plan_path)
+    walls = analyze_walls(doc)["walls"]
+    openings = analyze_openings(doc, walls)
+    levels = extract_levels_from_dxf(section_path) if section_path else []
+    mesh = build_plan_mesh(doc, walls, openings, levels)
+    write_glb(mesh, out_path)
+    return mesh.stats()
+
+
+def export_result_glb(result: Dict[str, Any], plan_path: str, out_path: str | Path,
+                      section_path: str | None = None) -> Dict[str, Any]:
+    """
+    .glb по сохранённому результату: стены и проёмы берутся из него, а не
+    пересчитываются, так что меш совпадает с результатом. План читается только
+    ради штриховок и единиц. Результат V2 (scene) — его штриховые стены;
+    полный результат (geometry_analysis) — walls_detection/openings_detection.
+    """
+    import ezdxf
+    from dxf_sections import extract_levels_from_dxf
+
+    geometry = result.get("geometry_analysis") or {}
+    walls = (geometry.get("walls_detection") or {}).get("walls", [])
+    openings = geometry.get("openings_detection") or []
+    levels = geometry.get("levels_detection")
+    if not isinstance(levels, list):
+        levels = extract_levels_from_dxf(section_path) if section_path else []
+
+    hatch_materials = None
+    if "scene" in result:
+        hatch_materials = {
+            w["id"][len("hatch_"):]: w.get("material", "generic")
+            for w in result["scene"].get("walls", [])
+            if str(w.get("id", "")).startswith("hatch_")
+        }
+
+    doc = ezdxf.readfile(plan_path)
+    mesh = build_plan_mesh(doc, walls, openings, levels, hatch_materials=hatch_materials)
+    write_glb(mesh, out_path)
+    return mesh.stats()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Экспорт стен плана DXF в GLB.")
+    parser.add_argument("plan", help="DXF плана")
+    parser.add_argument("out", help="путь к .glb")
+    parser.add_argument("--section", default=None, help="DXF разреза (отметки этажей)")
+    args = parser.parse_args(argv)
+    stats = export_plan_glb(args.plan, args.out, args.section)
+    print(f"{args.out}: {stats['vertices']} вершин, {stats['triangles']} треугольников, "
+          f"высота этажа {stats['floor_height']} м")
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
@@ -0,0 +1,10 @@
+# backend/parser_version.py
+"""
+Версия формата результата парсера.
+
+Хранится в индексе результатов, чтобы не отдавать сборку, сделанную старым
+парсером. Вынесена из dxf_parser_v2, чтобы API и воркер очереди читали её
+без импорта ezdxf.
+"""
+
+PARSER_VERSION = "2.2"
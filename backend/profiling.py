@@ -0,0 +1,104 @@
+# backend/profiling.py
+"""
+Профилирование одной сборки по запросу: cProfile + tracemalloc.
+
+    with BuildProfiler(top_n=15) as prof:
+        result = analyze_dxf_v2(doc)
+    prof.save("results/<id>")        # results/<id>.prof и results/<id>.profile.json
+    summary = prof.summary()         # компактная сводка для ответа API
+
+Файл .prof открывается стандартными средствами (python -m pstats, snakeviz).
+"""
+from __future__ import annotations
+
+import cProfile
+import json
+import pstats
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict, List
+
+DEFAULT_TOP_N = 15
+# Глубина стека для tracemalloc: 1 кадр — достаточно для «строки-виновника»
+TRACE_FRAMES = 1
+
+
+class BuildProfiler:
+    def __init__(self, top_n: int = DEFAULT_TOP_N, memory: bool = True) -> None:
+        self.top_n = top_n
+        self.memory = memory
+        self._profile = cProfile.Profile()
+        self._snapshot: tracemalloc.Snapshot | None = None
+        self._peak = 0
+        self._started_tracing = False
+        self.elapsed = 0.0
+
+    def __enter__(self) -> "BuildProfiler":
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+            self._started_tracing = True
+        self._t0 = time.perf_counter()
+        self._profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._profile.disable()
+        self.elapsed = time.perf_counter() - self._t0
+        if self._started_tracing:
+            self._snapshot = tracemalloc.take_snapshot()
+            self._peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    # -----------------------------------------------------------
+    # Сводка
+    # -----------------------------------------------------------
+
+    def top_functions(self) -> List[Dict[str, Any]]:
+        stats = pstats.Stats(self._profile)
+        rows = []
+        # stats.stats: {(file, line, func): (cc, nc, tottime, cumtime, callers)}
+        for (file, line, func), (cc, nc, tt, ct, _callers) in stats.stats.items():
+            rows.append({
+                "function": f"{Path(file).name}:{line}({func})",
+                "ncalls": nc,
+                "tottime": round(tt, 4),
+                "cumtime": round(ct, 4),
+            })
+        rows.sort(key=lambda r: r["tottime"], reverse=True)
+        return rows[:self.top_n]
+
+    def top_allocations(self) -> List[Dict[str, Any]]:
+        if self._snapshot is None:
+            return []
+        snapshot = self._snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen *>"),
+        ))
+        rows = []
+        for stat in snapshot.statistics("lineno")[:self.top_n]:
+            frame = stat.traceback[0]
+            rows.append({
+                "location": f"{Path(frame.filename).name}:{frame.lineno}",
+                "size_kb": round(stat.size / 1024, 1),
+                "count": stat.count,
+            })
+        return rows
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "elapsed": round(self.elapsed, 4),
+            "peak_memory_mb": round(self._peak / 2**20, 2) if self._started_tracing else None,
+            "top_functions": self.top_functions(),
+            "top_allocations": self.top_allocations(),
+        }
+
+    def save(self, base_path: str | Path) -> Dict[str, str]:
+        """Сохраняет .prof (pstats) и .profile.json (сводка) рядом с результатом."""
+        base = Path(base_path)
+        prof_path = base.with_name(base.name + ".prof")
+        summary_path = base.with_name(base.name + ".profile.json")
+        self._profile.dump_stats(str(prof_path))
+        with open(summary_path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, ensure_ascii=False, indent=2)
+        return {"pstats": str(prof_path), "summary": str(summary_path)}
@@ -0,0 +1,161 @@
+# backend/queue_worker.py
+"""
+Воркер очереди сборок (build_queue).
+
+Забирает задачи из брокера, собирает результат (build_worker.run_build) и
+сохраняет его в ResultStore — тот же каталог results/ и индекс, что у API,
+поэтому на других машинах каталоги очереди, результатов и загрузок должны
+быть общими (и смонтированы по тем же путям, что у API).
+
+Пока идёт сборка, фоновый поток продлевает аренду каждые lease/3 секунд.
+Упавший воркер перестаёт продлевать аренду, и после её истечения задачу
+заберёт другой.
+
+Пример:
+    python queue_worker.py --queue results/queue.sqlite3 --results results
+    python queue_worker.py --queue /mnt/bim/queue.sqlite3 --results /mnt/bim/results --once
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import socket
+import sys
+import threading
+import uuid
+from pathlib import Path
+from typing import List
+
+from build_queue import BuildBroker, Job, SQLiteBroker, DEFAULT_LEASE_SECONDS
+from parser_version import PARSER_VERSION
+from result_store import ResultStore, file_sha256
+
+log = logging.getLogger("bim.queue_worker")
+
+DEFAULT_POLL = 1.0
+
+
+class _Heartbeat(threading.Thread):
+    """Продление аренды задачи, пока идёт сборка; lost — аренду забрали."""
+
+    def __init__(self, broker: BuildBroker, job_id: str, worker: str, lease_seconds: float) -> None:
+        super().__init__(name=f"heartbeat-{job_id[:8]}", daemon=True)
+        self.broker = broker
+        self.job_id = job_id
+        self.worker = worker
+        self.lease_seconds = lease_seconds
+        self.lost = False
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.lease_seconds / 3):
+            try:
+                if not self.broker.heartbeat(self.job_id, self.worker, self.lease_seconds):
+                    self.lost = True
+                    log.warning("Аренда задачи %s потеряна", self.job_id)
+                    return
+            except Exception as e:
+                # Брокер временно недоступен — попробуем на следующем такте
+                log.warning("Не удалось продлить аренду %s: %s", self.job_id, e)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+def process_job(broker: BuildBroker, store: ResultStore, job: Job, worker: str,
+                lease_seconds: float = DEFAULT_LEASE_SECONDS) -> bool:
+    """Сборка одной арендованной задачи. True — результат сохранён и задача закрыта."""
+    import build_worker
+
+    p = job.payload
+    plan_file = p["plan_file"]
+    heartbeat = _Heartbeat(broker, job.id, worker, lease_seconds)
+    heartbeat.start()
+    try:
+        if not Path(plan_file).exists():
+            raise FileNotFoundError(f"Файл плана не найден: {plan_file}")
+        if p.get("plan_hash") and file_sha256(Path(plan_file)) != p["plan_hash"]:
+            raise ValueError(f"Файл плана изменился после постановки в очередь: {plan_file}")
+        bim_json, timings = build_worker.run_build(plan_file, None, p.get("diagnostics_samples"),
+                                                   bool(p.get("low_memory")), p.get("memory_budget_mb"),
+                                                   p.get("plan_hash"))
+    except Exception as e:
+        heartbeat.stop()
+        # Нет файла или он не читается как DXF — повтор не поможет; остальное — на следующую попытку
+        retry = not isinstance(e, (FileNotFoundError, ValueError))
+        log.warning("Задача %s (попытка %d/%d): %s", job.id, job.attempts, job.max_attempts, e)
+        broker.fail(job.id, worker, str(e), type(e).__name__, retry=retry)
+        return False
+    heartbeat.stop()
+    if heartbeat.lost:
+        # Задача уже у другого воркера — его результат и будет записан
+        log.warning("Результат задачи %s отброшен: аренда потеряна", job.id)
+        return False
+
+    result_id = str(uuid.uuid4())
+    bim_json["result_id"] = result_id
+    store.save_result(result_id, bim_json, plan_file, section_file=p.get("section_file"),
+                      parser_version=PARSER_VERSION, timings=timings)
+    if not broker.complete(job.id, worker, result_id):
+        log.warning("Задача %s закрыта другим воркером, результат %s лишний", job.id, result_id)
+        return False
+    log.info("Задача %s готова: %s (%s)", job.id, result_id, timings)
+    return True
+
+
+def run_worker(broker: BuildBroker, store: ResultStore, worker: str | None = None,
+               lease_seconds: float = DEFAULT_LEASE_SECONDS, poll: float = DEFAULT_POLL,
+               once: bool = False, max_jobs: int | None = None,
+               stop: threading.Event | None = None) -> int:
+    """
+    Цикл воркера: аренда → сборка → результат. once — выйти, когда очередь
+    пуста; max_jobs — выйти после стольких задач. Возвращает число задач.
+    """
+    import build_worker
+
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    stop = stop or threading.Event()
+    build_worker.warm_up()
+    done = 0
+    while not stop.is_set() and (max_jobs is None or done < max_jobs):
+        job = broker.lease(worker, lease_seconds)
+        if job is None:
+            if once:
+                break
+            stop.wait(poll)
+            continue
+        log.info("Задача %s взята воркером %s (попытка %d)", job.id, worker, job.attempts)
+        process_job(broker, store, job, worker, lease_seconds)
+        done += 1
+    return done
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Воркер очереди сборок BIM.")
+    parser.add_argument("--queue", default=os.environ.get("BIM_QUEUE_DB", os.path.join("results", "queue.sqlite3")),
+                        help="файл очереди SQLite (общий для API и воркеров)")
+    parser.add_argument("--results", default="results", help="каталог результатов (общий с API)")
+    parser.add_argument("--lease", type=float, default=DEFAULT_LEASE_SECONDS, help="аренда задачи, с")
+    parser.add_argument("--poll", type=float, default=DEFAULT_POLL, help="пауза при пустой очереди, с")
+    parser.add_argument("--worker-id", default=None, help="имя воркера (по умолчанию host:pid)")
+    parser.add_argument("--once", action="store_true", help="выйти, когда очередь опустеет")
+    parser.add_argument("--max-jobs", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=os.environ.get("BIM_LOG_LEVEL", "INFO").upper(),
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    broker = SQLiteBroker(args.queue)
+    # Индекс общий с API и другими машинами — без WAL
+    store = ResultStore(args.results, upload_dirs=[], journal_mode="DELETE")
+    try:
+        done = run_worker(broker, store, args.worker_id, args.lease, args.poll, args.once, args.max_jobs)
+    except KeyboardInterrupt:
+        return 130
+    log.info("Воркер завершён, задач: %d", done)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
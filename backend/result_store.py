@@ -0,0 +1,360 @@
+# backend/result_store.py
+"""
+Хранилище результатов сборки с индексом в SQLite.
+
+Файлы остаются там же, где были (results/<id>.json и артефакты рядом:
+.glb, .prof, .profile.json), а индекс хранит по каждому результату хэш
+плана, версию парсера, время создания и последнего доступа, размер на
+диске и время стадий — список и поиск по плану не открывают JSON.
+Загрузки (uploads/) тоже индексируются: хэш, размер, время.
+
+Очистка (gc):
+    - retention: результаты и загрузки, к которым не обращались дольше
+      retention_days, удаляются;
+    - quota: если всё вместе занимает больше quota_mb, удаляются самые давно
+      использованные записи, пока объём не станет меньше квоты.
+Защищённые пути (например, текущий загруженный план) не удаляются.
+Файлы, появившиеся без индекса (старые результаты, ручное копирование),
+подхватываются adopt_orphans() по stat() — время и размер берутся из ФС.
+
+Журнал индекса по умолчанию WAL. Если индекс общий с воркерами очереди на
+других машинах (build_queue), нужен journal_mode="DELETE": WAL требует
+общей памяти и по сетевой ФС не работает.
+
+    store = ResultStore("results", upload_dirs=["uploads"], quota_mb=2048)
+    store.save_result(result_id, bim_json, plan_path, timings=timings)
+    store.start_gc(interval=600)
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+log = logging.getLogger(__name__)
+
+DB_NAME = "index.sqlite3"
+DEFAULT_GC_INTERVAL = 600.0         # с
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    plan_hash TEXT,
+    plan_file TEXT,
+    section_file TEXT,
+    parser_version TEXT,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    size_bytes INTEGER NOT NULL DEFAULT 0,
+    timings TEXT
+);
+CREATE INDEX IF NOT EXISTS results_plan ON results (plan_hash, parser_version, created_at);
+CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed_at);
+
+CREATE TABLE IF NOT EXISTS uploads (
+    path TEXT PRIMARY KEY,
+    plan_hash TEXT,
+    kind TEXT,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    size_bytes INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS uploads_hash ON uploads (plan_hash);
+CREATE INDEX IF NOT EXISTS uploads_accessed ON uploads (accessed_at);
+"""
+
+
+def file_sha256(path: Path, block_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _artifacts(result_path: str) -> List[Path]:
+    """Файл результата и всё, что лежит рядом с тем же id: <id>.json, <id>.glb, <id>.prof, ..."""
+    path = Path(result_path)
+    result_id = path.name.split(".", 1)[0]
+    if not path.parent.exists():
+        return []
+    return sorted(p for p in path.parent.glob(result_id + ".*") if p.is_file())
+
+
+def _upload_key(path: str | Path) -> str:
+    # Один файл — одна запись: API передаёт пути загрузок относительными,
+    # воркер очереди — абсолютными
+    return os.path.abspath(path)
+
+
+def _size(paths: Iterable[Path]) -> int:
+    total = 0
+    for p in paths:
+        try:
+            total += p.stat().st_size
+        except OSError:
+            pass
+    return total
+
+
+class ResultStore:
+    def __init__(self, root: str = "results", upload_dirs: Iterable[str] = ("uploads",),
+                 db_path: str | None = None, retention_days: float | None = None,
+                 quota_mb: float | None = None, journal_mode: str = "WAL") -> None:
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.upload_dirs = [Path(d) for d in upload_dirs]
+        self.db_path = str(db_path or self.root / DB_NAME)
+        self.retention_days = retention_days
+        self.quota_mb = quota_mb
+        self.journal_mode = journal_mode
+        self._gc_lock = threading.Lock()
+        self._gc_stop = threading.Event()
+        self._gc_thread: threading.Thread | None = None
+        with self._connect() as db:
+            db.executescript(_SCHEMA)
+            # Записи загрузок из старых индексов — с относительными путями
+            for row in db.execute("SELECT path FROM uploads").fetchall():
+                key = _upload_key(row["path"])
+                if key != row["path"]:
+                    db.execute("UPDATE OR REPLACE uploads SET path = ? WHERE path = ?", (key, row["path"]))
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # Соединение на операцию: индекс пишут и обработчики запросов, и поток GC
+        db = sqlite3.connect(self.db_path, timeout=30)
+        db.row_factory = sqlite3.Row
+        try:
+            db.execute(f"PRAGMA journal_mode={self.journal_mode}")
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    # -----------------------------------------------------------
+    # Загрузки
+    # -----------------------------------------------------------
+
+    def register_upload(self, path: str, kind: str = "plan") -> str:
+        """Индексирует загруженный файл, возвращает его sha256."""
+        plan_hash = file_sha256(Path(path))
+        now = time.time()
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO uploads (path, plan_hash, kind, created_at, accessed_at, size_bytes) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (_upload_key(path), plan_hash, kind, now, now, os.path.getsize(path)),
+            )
+        return plan_hash
+
+    def upload_hash(self, path: str) -> Optional[str]:
+        with self._connect() as db:
+            row = db.execute("SELECT plan_hash FROM uploads WHERE path = ?", (_upload_key(path),)).fetchone()
+        if row and row["plan_hash"]:
+            return row["plan_hash"]
+        return self.register_upload(path) if Path(path).exists() else None
+
+    # -----------------------------------------------------------
+    # Результаты
+    # -----------------------------------------------------------
+
+    def result_path(self, result_id: str) -> Path:
+        return self.root / f"{result_id}.json"
+
+    def save_result(self, result_id: str, data: Dict[str, Any], plan_file: str,
+                    section_file: str | None = None, parser_version: str | None = None,
+                    timings: Dict[str, float] | None = None) -> Dict[str, Any]:
+        """Атомарно пишет results/<id>.json и добавляет запись в индекс."""
+        path = self.result_path(result_id)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        tmp.replace(path)
+
+        plan_hash = self.upload_hash(plan_file)
+        now = time.time()
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO results (id, path, plan_hash, plan_file, section_file, parser_version, "
+                "created_at, accessed_at, size_bytes, timings) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (result_id, str(path), plan_hash, plan_file, section_file, parser_version,
+                 now, now, _size(_artifacts(str(path))), json.dumps(timings or {})),
+            )
+            db.execute("UPDATE uploads SET accessed_at = ? WHERE path IN (?, ?)",
+                       (now, _upload_key(plan_file), _upload_key(section_file) if section_file else None))
+        return self.get(result_id, touch=False)
+
+    def refresh_size(self, result_id: str) -> None:
+        """Пересчитывает размер после появления артефактов (.glb, .prof)."""
+        with self._connect() as db:
+            row = db.execute("SELECT path FROM results WHERE id = ?", (result_id,)).fetchone()
+            if row:
+                db.execute("UPDATE results SET size_bytes = ? WHERE id = ?",
+                           (_size(_artifacts(row["path"])), result_id))
+
+    def get(self, result_id: str, touch: bool = True) -> Optional[Dict[str, Any]]:
+        """Запись индекса (без чтения JSON); touch обновляет время доступа для LRU-очистки."""
+        with self._connect() as db:
+            if touch:
+                db.execute("UPDATE results SET accessed_at = ? WHERE id = ?", (time.time(), result_id))
+            row = db.execute("SELECT * FROM results WHERE id = ?", (result_id,)).fetchone()
+        return self._record(row) if row else None
+
+    def load(self, result_id: str) -> Optional[Dict[str, Any]]:
+        record = self.get(result_id)
+        if record is None or not Path(record["path"]).exists():
+            return None
+        with open(record["path"], encoding="utf-8") as f:
+            return json.load(f)
+
+    def list_results(self, plan_hash: str | None = None, parser_version: str | None = None,
+                     limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+        """Последние результаты (новые первыми), опционально по хэшу плана и версии парсера."""
+        where, args = [], []
+        if plan_hash:
+            where.append("plan_hash = ?")
+            args.append(plan_hash)
+        if parser_version:
+            where.append("parser_version = ?")
+            args.append(parser_version)
+        sql = "SELECT * FROM results"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY created_at DESC LIMIT ? OFFSET ?"
+        with self._connect() as db:
+            rows = db.execute(sql, (*args, int(limit), int(offset))).fetchall()
+        return [self._record(r) for r in rows]
+
+    def latest_for_plan(self, plan_hash: str, parser_version: str | None = None) -> Optional[Dict[str, Any]]:
+        rows = self.list_results(plan_hash, parser_version, limit=1)
+        return rows[0] if rows else None
+
+    @staticmethod
+    def _record(row: sqlite3.Row) -> Dict[str, Any]:
+        record = dict(row)
+        record["timings"] = json.loads(record["timings"] or "{}")
+        return record
+
+    # -----------------------------------------------------------
+    # Подхват файлов без индекса
+    # -----------------------------------------------------------
+
+    def adopt_orphans(self, result_dirs: Iterable[str] = ()) -> Dict[str, int]:
+        """
+        Добавляет в индекс результаты (*.json) и загрузки, которых там нет.
+        Время и размер берутся из stat(); JSON не читается, хэш плана неизвестен.
+        """
+        adopted = {"results": 0, "uploads": 0}
+        with self._connect() as db:
+            known_results = {r["path"] for r in db.execute("SELECT path FROM results")}
+            known_uploads = {r["path"] for r in db.execute("SELECT path FROM uploads")}
+
+            for directory in [self.root, *map(Path, result_dirs)]:
+                if not directory.is_dir():
+                    continue
+                for p in directory.glob("*.json"):
+                    # Побочные файлы (<id>.profile.json) учитываются в размере основного
+                    if "." in p.stem or str(p) in known_results:
+                        continue
+                    st = p.stat()
+                    db.execute(
+                        "INSERT OR IGNORE INTO results (id, path, created_at, accessed_at, size_bytes, timings) "
+                        "VALUES (?, ?, ?, ?, ?, '{}')",
+                        (p.stem, str(p), st.st_mtime, st.st_atime, _size(_artifacts(str(p)))),
+                    )
+                    adopted["results"] += 1
+
+            for directory in self.upload_dirs:
+                if not directory.is_dir():
+                    continue
+                for p in directory.iterdir():
+                    if not p.is_file() or _upload_key(p) in known_uploads:
+                        continue
+                    st = p.stat()
+                    db.execute(
+                        "INSERT OR IGNORE INTO uploads (path, kind, created_at, accessed_at, size_bytes) "
+                        "VALUES (?, NULL, ?, ?, ?)",
+                        (_upload_key(p), st.st_mtime, max(st.st_mtime, st.st_atime), st.st_size),
+                    )
+                    adopted["uploads"] += 1
+        return adopted
+
+    # -----------------------------------------------------------
+    # Очистка
+    # -----------------------------------------------------------
+
+    def usage(self) -> Dict[str, int]:
+        with self._connect() as db:
+            r = db.execute("SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM results").fetchone()
+            u = db.execute("SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM uploads").fetchone()
+        return {"results": r[0], "results_bytes": r[1], "uploads": u[0], "uploads_bytes": u[1],
+                "total_bytes": r[1] + u[1]}
+
+    def gc(self, protect: Iterable[str] = (), now: float | None = None) -> Dict[str, int]:
+        """Одна итерация очистки по retention и квоте. Возвращает число удалённых и освобождённые байты."""
+        now = time.time() if now is None else now
+        protected = {_upload_key(p) for p in protect if p}
+        stats = {"results": 0, "uploads": 0, "bytes": 0}
+
+        with self._gc_lock, self._connect() as db:
+            # Все кандидаты одним списком, самые давно использованные первыми
+            entries = [("results", r["id"], r["path"], r["accessed_at"], r["size_bytes"])
+                       for r in db.execute("SELECT id, path, accessed_at, size_bytes FROM results")]
+            entries += [("uploads", r["path"], r["path"], r["accessed_at"], r["size_bytes"])
+                        for r in db.execute("SELECT path, accessed_at, size_bytes FROM uploads")]
+            # Защищённые файлы занимают место в квоте, но не удаляются
+            total = sum(e[4] for e in entries)
+            entries = [e for e in entries if _upload_key(e[2]) not in protected]
+            entries.sort(key=lambda e: e[3])
+
+            quota = self.quota_mb * 2**20 if self.quota_mb is not None else None
+            cutoff = now - self.retention_days * 86400 if self.retention_days is not None else None
+
+            for table, key, path, accessed, size in entries:
+                expired = cutoff is not None and accessed < cutoff
+                over_quota = quota is not None and total > quota
+                if not expired and not over_quota:
+                    # Список по возрастанию времени доступа — дальше только свежее
+                    break
+                files = _artifacts(path) if table == "results" else [Path(path)]
+                for f in files:
+                    try:
+                        f.unlink()
+                    except FileNotFoundError:
+                        pass
+                column = "id" if table == "results" else "path"
+                db.execute(f"DELETE FROM {table} WHERE {column} = ?", (key,))
+                stats[table] += 1
+                stats["bytes"] += size
+                total -= size
+        return stats
+
+    def start_gc(self, interval: float = DEFAULT_GC_INTERVAL, protect=lambda: ()) -> None:
+        """Фоновая очистка раз в interval секунд; protect() возвращает пути, которые трогать нельзя."""
+        if self._gc_thread is not None or (self.retention_days is None and self.quota_mb is None):
+            return
+        self._gc_stop.clear()
+
+        def loop() -> None:
+            while not self._gc_stop.wait(interval):
+                try:
+                    self.gc(protect())
+                except Exception as e:
+                    log.exception("ResultStore GC error: %s", e)
+
+        self._gc_thread = threading.Thread(target=loop, name="result-store-gc", daemon=True)
+        self._gc_thread.start()
+
+    def stop_gc(self) -> None:
+        self._gc_stop.set()
+        if self._gc_thread is not None:
+            self._gc_thread.join(timeout=5)
+            self._gc_thread = None
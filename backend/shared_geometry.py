@@ -0,0 +1,128 @@
+# backend/shared_geometry.py
+"""
+Массивы геометрии в общей памяти для воркеров пула процессов.
+
+Вместо пиклинга сегментов в каждую задачу процесс сборки один раз кладёт
+массивы numpy в блоки multiprocessing.shared_memory, а в задачи уходит
+только spec — имена блоков, dtype и shape. Воркер подключается к блокам по
+имени и читает те же страницы памяти без копирования.
+
+    with SharedArrays({"xy": xy}) as shared:
+        pool.map(task, [shared.spec] * n, ...)
+
+    def task(spec, ...):
+        xy = attach(spec)["xy"]
+
+Блоки живут, пока на них есть ссылки: создатель держит одну, каждый
+потребитель, которому нужно пережить блок with, берёт свою через acquire().
+Последний release() закрывает и удаляет блоки. Если процесс сборки упал,
+блоки удалит resource_tracker.
+
+В воркере подключения кэшируются: задачи одной сборки не открывают блоки
+заново, а при первой задаче следующей сборки старые блоки закрываются.
+"""
+from __future__ import annotations
+
+import sys
+import threading
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, Tuple
+
+import numpy as np
+
+# {ключ: (имя блока, dtype, shape)}
+Spec = Dict[str, Tuple[str, str, Tuple[int, ...]]]
+
+
+class SharedArrays:
+    def __init__(self, arrays: Dict[str, np.ndarray]) -> None:
+        self._blocks: Dict[str, SharedMemory] = {}
+        self.spec: Spec = {}
+        self._refs = 1
+        self._lock = threading.Lock()
+        try:
+            for key, arr in arrays.items():
+                arr = np.ascontiguousarray(arr)
+                # Блок нулевого размера создать нельзя
+                shm = SharedMemory(create=True, size=max(arr.nbytes, 1))
+                self._blocks[key] = shm
+                np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+                self.spec[key] = (shm.name, arr.dtype.str, arr.shape)
+        except BaseException:
+            self._free()
+            raise
+
+    @property
+    def nbytes(self) -> int:
+        return sum(shm.size for shm in self._blocks.values())
+
+    def acquire(self) -> "SharedArrays":
+        with self._lock:
+            if self._refs == 0:
+                raise RuntimeError("Блоки общей памяти уже освобождены")
+            self._refs += 1
+        return self
+
+    def release(self) -> None:
+        with self._lock:
+            self._refs -= 1
+            last = self._refs == 0
+        if last:
+            self._free()
+
+    def _free(self) -> None:
+        for shm in self._blocks.values():
+            shm.close()
+            shm.unlink()
+        self._blocks.clear()
+
+    def __enter__(self) -> "SharedArrays":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+
+# -----------------------------------------------------------
+# Сторона воркера
+# -----------------------------------------------------------
+
+_attached: Dict[Tuple[str, ...], Tuple[Dict[str, SharedMemory], Dict[str, np.ndarray]]] = {}
+
+
+def _open(name: str) -> SharedMemory:
+    if sys.version_info >= (3, 13):
+        return SharedMemory(name=name, track=False)
+    # До 3.13 подключение тоже регистрируется в resource_tracker, но воркеры
+    # пула делят его с создателем: повторная регистрация имени безвредна,
+    # а unregister здесь снял бы регистрацию самого создателя
+    return SharedMemory(name=name)
+
+
+def attach(spec: Spec) -> Dict[str, np.ndarray]:
+    """Массивы по spec (только чтение). Подключения прошлых сборок закрываются."""
+    key = tuple(sorted(name for name, _, _ in spec.values()))
+    cached = _attached.get(key)
+    if cached is not None:
+        return cached[1]
+
+    for old_key in list(_attached):
+        blocks, arrays = _attached.pop(old_key)
+        arrays.clear()
+        for shm in blocks.values():
+            try:
+                shm.close()
+            except BufferError:
+                # Кто-то ещё держит view — блок закроется вместе с процессом
+                pass
+
+    blocks: Dict[str, SharedMemory] = {}
+    arrays: Dict[str, np.ndarray] = {}
+    for k, (name, dtype, shape) in spec.items():
+        shm = _open(name)
+        blocks[k] = shm
+        arr = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        arr.flags.writeable = False
+        arrays[k] = arr
+    _attached[key] = (blocks, arrays)
+    return arrays
@@ -0,0 +1,62 @@
+# backend/singleflight.py
+"""
+Схлопывание одинаковых одновременных сборок (single flight).
+
+Когда несколько пользователей открывают один и тот же план, запросы на
+сборку приходят почти одновременно. Первый запрос с данным ключом
+(хэш плана + настройки анализа) запускает вычисление, остальные, пришедшие
+до его окончания, ждут ту же задачу и получают тот же результат — или то же
+исключение. После завершения ключ освобождается: следующий запрос снова
+считает заново (повторы по готовым результатам — забота кэшей).
+
+Вычисление идёт отдельной задачей asyncio: отключение клиента, который его
+начал, не отменяет сборку для остальных ожидающих.
+
+Все методы вызываются из одного цикла событий, поэтому блокировки не нужны.
+"""
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    def __init__(self) -> None:
+        self._flights: Dict[Hashable, asyncio.Future] = {}
+        self._waiters: Dict[Hashable, int] = {}
+        self.computations = 0   # сколько вычислений запущено
+        self.coalesced = 0      # сколько запросов получили чужой результат (сэкономленные сборки)
+        self.failed = 0         # сколько вычислений закончились ошибкой
+        self.max_waiters = 0    # наибольшее число запросов на одно вычисление
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        flight = self._flights.get(key)
+        if flight is None:
+            self.computations += 1
+            flight = asyncio.ensure_future(fn())
+            self._flights[key] = flight
+            self._waiters[key] = 1
+            flight.add_done_callback(lambda f: self._finish(key, f))
+        else:
+            self.coalesced += 1
+            self._waiters[key] += 1
+            self.max_waiters = max(self.max_waiters, self._waiters[key])
+        return await asyncio.shield(flight)
+
+    def _finish(self, key: Hashable, flight: asyncio.Future) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+            self._waiters.pop(key, None)
+        if flight.cancelled() or flight.exception() is not None:
+            self.failed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "computations": self.computations,
+            "coalesced": self.coalesced,
+            "failed": self.failed,
+            "in_flight": len(self._flights),
+            "max_waiters": max(self.max_waiters, 1) if self.computations else 0,
+        }
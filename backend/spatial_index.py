@@ -0,0 +1,220 @@
+# backend/spatial_index.py
+"""
+Пространственное хэширование по сетке ячеек.
+
+PointSnapper — склейка точек в узлы с настоящим допуском по расстоянию:
+точка попадает в ячейку размером eps и сравнивается с узлами соседних
+ячеек (3x3), поэтому две точки в 0.01 мм по разные стороны линии сетки
+попадут в один узел, а точки почти в eps друг от друга — только если
+расстояние действительно не больше eps. Номера узлов стабильны: это
+порядок первого появления.
+
+GridIndex — индекс прямоугольников (bbox) для выборки кандидатов рядом
+с точкой или областью вместо перебора всех объектов.
+
+PolygonIndex — контуры (помещений) в GridIndex: для пачки точек находит
+наименьший содержащий их контур.
+"""
+from __future__ import annotations
+
+import math
+from typing import Dict, Hashable, Iterable, List, Set, Tuple
+
+Point = tuple[float, float]
+BBox = Tuple[float, float, float, float]  # (min_x, min_y, max_x, max_y)
+
+# Если bbox покрывает больше ячеек, он кладётся в общий список «крупных»
+MAX_CELLS_PER_ITEM = 4096
+
+
+def guess_tolerance(lengths: Iterable[float]) -> float:
+    """
+    Допуск совпадения точек в единицах чертежа: 1 мм.
+    Масштаб угадываем по медианной длине (как и в dxf_walls.to_mm):
+    чертёж в миллиметрах → 1.0, в метрах → 0.001.
+    """
+    values = sorted(v for v in lengths if v > 0)
+    if not values:
+        return 1.0
+    median = values[len(values) // 2]
+    return 1.0 if median > 50.0 else 0.001
+
+
+class PointSnapper:
+    def __init__(self, eps: float) -> None:
+        if eps <= 0:
+            raise ValueError("eps должен быть положительным")
+        self.eps = eps
+        self._eps2 = eps * eps
+        self._cells: Dict[Tuple[int, int], List[int]] = {}
+        self.points: List[Point] = []
+
+    def _cell(self, p: Point) -> Tuple[int, int]:
+        return (math.floor(p[0] / self.eps), math.floor(p[1] / self.eps))
+
+    def find(self, p: Point) -> int | None:
+        """Ближайший узел не дальше eps или None."""
+        cx, cy = self._cell(p)
+        best, best_d2 = None, self._eps2
+        for ix in (cx - 1, cx, cx + 1):
+            for iy in (cy - 1, cy, cy + 1):
+                for node in self._cells.get((ix, iy), ()):
+                    q = self.points[node]
+                    d2 = (q[0] - p[0]) ** 2 + (q[1] - p[1]) ** 2
+                    if d2 < best_d2 or (d2 == best_d2 and (best is None or node < best)):
+                        best, best_d2 = node, d2
+        return best
+
+    def snap(self, p: Point) -> int:
+        """Номер узла для точки; новый узел, если рядом ничего нет."""
+        node = self.find(p)
+        if node is not None:
+            return node
+        node = len(self.points)
+        self.points.append((float(p[0]), float(p[1])))
+        self._cells.setdefault(self._cell(p), []).append(node)
+        return node
+
+    def snap_point(self, p: Point) -> Point:
+        """Координаты узла (первой точки кластера)."""
+        return self.points[self.snap(p)]
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+
+class GridIndex:
+    def __init__(self, cell_size: float) -> None:
+        if cell_size <= 0:
+            raise ValueError("cell_size должен быть положительным")
+        self.cell_size = cell_size
+        self._cells: Dict[Tuple[int, int], List[Hashable]] = {}
+        self._large: List[Hashable] = []
+        self._bboxes: Dict[Hashable, BBox] = {}
+
+    def _range(self, bbox: BBox) -> Tuple[int, int, int, int]:
+        k = self.cell_size
+        return (math.floor(bbox[0] / k), math.floor(bbox[1] / k),
+                math.floor(bbox[2] / k), math.floor(bbox[3] / k))
+
+    def insert(self, item: Hashable, bbox: BBox) -> None:
+        self._bboxes[item] = bbox
+        x0, y0, x1, y1 = self._range(bbox)
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > MAX_CELLS_PER_ITEM:
+            self._large.append(item)
+            return
+        for ix in range(x0, x1 + 1):
+            for iy in range(y0, y1 + 1):
+                self._cells.setdefault((ix, iy), []).append(item)
+
+    def bbox(self, item: Hashable) -> BBox:
+        return self._bboxes[item]
+
+    def query(self, bbox: BBox) -> Set[Hashable]:
+        """Объекты, чей bbox пересекает заданный (точная проверка bbox включена)."""
+        x0, y0, x1, y1 = self._range(bbox)
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > len(self._bboxes):
+            # Область больше, чем объектов в индексе — дешевле проверить все bbox
+            return {i for i, b in self._bboxes.items() if _bbox_overlap(b, bbox)}
+        found: Set[Hashable] = set()
+        for ix in range(x0, x1 + 1):
+            for iy in range(y0, y1 + 1):
+                found.update(self._cells.get((ix, iy), ()))
+        found.update(self._large)
+        return {i for i in found if _bbox_overlap(self._bboxes[i], bbox)}
+
+    def query_point(self, p: Point, radius: float = 0.0) -> Set[Hashable]:
+        return self.query((p[0] - radius, p[1] - radius, p[0] + radius, p[1] + radius))
+
+    def __len__(self) -> int:
+        return len(self._bboxes)
+
+
+def _bbox_overlap(a: BBox, b: BBox) -> bool:
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def points_bbox(points: Iterable[Point]) -> BBox:
+    xs, ys = zip(*points)
+    return (min(xs), min(ys), max(xs), max(ys))
+
+
+def points_in_polygon(points, polygon) -> "np.ndarray":
+    """
+    Векторизованная проверка «точка в многоугольнике» (чётность пересечений луча).
+    points — массив (N, 2), polygon — список вершин (замыкание не обязательно).
+    Возвращает булев массив длины N. Точки на границе могут попасть в любую сторону.
+    """
+    import numpy as np
+
+    pts = np.asarray(points, dtype=float).reshape(-1, 2)
+    poly = np.asarray(polygon, dtype=float)
+    if len(pts) == 0 or len(poly) < 3:
+        return np.zeros(len(pts), dtype=bool)
+
+    x1, y1 = poly[:, 0], poly[:, 1]
+    x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+    px = pts[:, 0:1]
+    py = pts[:, 1:2]
+
+    # Ребро пересекает горизонтальный луч вправо от точки: (N, E)
+    straddles = (y1 > py) != (y2 > py)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_cross = x1 + (py - y1) * (x2 - x1) / (y2 - y1)
+    crossings = straddles & (px < x_cross)
+    return (np.count_nonzero(crossings, axis=1) % 2) == 1
+
+
+class PolygonIndex:
+    """
+    Поиск многоугольников по точкам. locate() для каждой точки возвращает
+    номер наименьшего по площади содержащего её многоугольника (или -1),
+    так что вложенный контур побеждает охватывающий. Индексируются точки
+    запроса, а не контуры: для каждого контура точки-кандидаты берутся из
+    его bbox и проверяются разом (points_in_polygon).
+    """
+
+    def __init__(self, polygons: List[List[Point]], areas: List[float] | None = None) -> None:
+        self.polygons = polygons
+        self.areas = list(areas) if areas is not None else [_polygon_area(p) for p in polygons]
+        self.bboxes = [points_bbox(p) for p in polygons]
+        # Ячейка индекса точек — медианный размер контура
+        sizes = sorted(max(b[2] - b[0], b[3] - b[1]) for b in self.bboxes)
+        self.cell_size = max(sizes[len(sizes) // 2], 1e-6) if sizes else 1.0
+
+    def locate(self, points) -> "np.ndarray":
+        import numpy as np
+
+        pts = np.asarray(points, dtype=float).reshape(-1, 2)
+        owner = np.full(len(pts), -1, dtype=int)
+        if len(pts) == 0 or not self.polygons:
+            return owner
+        owner_area = np.full(len(pts), np.inf)
+
+        # Индекс строится по точкам, кандидаты для контура — точки из его bbox
+        point_index = GridIndex(self.cell_size)
+        for i, (x, y) in enumerate(pts):
+            point_index.insert(i, (x, y, x, y))
+
+        for pi, polygon in enumerate(self.polygons):
+            candidates = np.fromiter(point_index.query(self.bboxes[pi]), dtype=int)
+            if len(candidates) == 0:
+                continue
+            inside = candidates[points_in_polygon(pts[candidates], polygon)]
+            area = self.areas[pi]
+            better = inside[area < owner_area[inside]]
+            owner[better] = pi
+            owner_area[better] = area
+        return owner
+
+    def __len__(self) -> int:
+        return len(self.polygons)
+
+
+def _polygon_area(poly: List[Point]) -> float:
+    area = 0.0
+    for i in range(len(poly)):
+        x1, y1 = poly[i]
+        x2, y2 = poly[(i + 1) % len(poly)]
+        area += x1 * y2 - x2 * y1
+    return abs(area) / 2
@@ -0,0 +1,264 @@
+# backend/synthetic_plan.py
+"""
+Генератор синтетических DXF-планов заданного размера.
+
+План строится как сетка помещений: по линиям сетки идут двухлинейные стены
+(пары LINE на слое стен), часть стен залита HATCH, в каждое помещение
+ставится замкнутая полилиния контура и текстовые подписи, на стены
+вставляются блоки окон и дверей (часть дверей — с вложенными блоками).
+Один и тот же seed всегда даёт одну и ту же геометрию (служебные даты и
+GUID в заголовке DXF ezdxf проставляет сам).
+
+generate_bent_walls строит регрессионную сцену для склейки коллинеарных
+сегментов: две касающиеся стены с изломом в несколько градусов и рядом
+плотные короткие линии промежуточных направлений (ими направления раньше
+сцеплялись в одну группу, и излом стирался).
+
+Пример:
+    python synthetic_plan.py out.dxf --entities 10000 --seed 42
+    python synthetic_plan.py test_bent_walls.dxf --bent-walls
+"""
+from __future__ import annotations
+
+import argparse
+import math
+import random
+from dataclasses import dataclass, asdict
+from typing import Tuple
+
+import ezdxf
+
+# Слои подобраны так, чтобы их распознали анализаторы
+WALL_LAYER = "СТЕНА"                 # layer_keywords.WALL_LAYERS_CANDIDATES
+HATCH_LAYER = "AR_WALL_MONOLIT"      # layer_keywords.WALL_KEYWORDS
+ROOM_LAYER = "АР_Помещения"
+TEXT_LAYER = "АР_Текст"
+WINDOW_LAYER = "АР_Окна"             # dxf_openings: слой окон
+DOOR_LAYER = "АР_Дверь"              # dxf_openings: слой дверей
+
+CELL_W = 4000.0                      # размер ячейки сетки, мм
+CELL_H = 5000.0
+WALL_THICKNESS = 200.0
+
+
+@dataclass
+class SyntheticPlanSpec:
+    walls: int = 40              # двухлинейные стены (по 2 LINE)
+    hatched_walls: int = 20      # стены, залитые HATCH
+    rooms: int = 10              # контуры помещений (+ подпись TEXT)
+    windows: int = 10
+    doors: int = 10
+    nested_doors: int = 5        # двери, блок которых содержит вложенный INSERT
+    seed: int = 0
+
+    @property
+    def entity_count(self) -> int:
+        """Число сущностей модели, которое получится в плане."""
+        return (2 * self.walls + self.hatched_walls + 2 * self.rooms
+                + self.windows + self.doors + self.nested_doors)
+
+
+def spec_for_entities(n: int, seed: int = 0) -> SyntheticPlanSpec:
+    """Распределяет примерно n сущностей по типам в «типичной» для планов пропорции."""
+    n = max(n, 20)
+    return SyntheticPlanSpec(
+        walls=int(n * 0.20),
+        hatched_walls=int(n * 0.15),
+        rooms=int(n * 0.10),
+        windows=int(n * 0.10),
+        doors=int(n * 0.10),
+        nested_doors=int(n * 0.05),
+        seed=seed,
+    )
+
+
+# -----------------------------------------------------------
+# Блоки
+# -----------------------------------------------------------
+
+def _define_blocks(doc) -> None:
+    win = doc.blocks.new(name="WINDOW_1200")
+    win.add_lwpolyline([(-600, -100), (600, -100), (600, 100), (-600, 100)], close=True)
+    win.add_line((-600, 0), (600, 0))
+
+    door = doc.blocks.new(name="DOOR_900")
+    door.add_line((-450, 0), (450, 0))
+    door.add_arc((-450, 0), 900, 0, 90)
+
+    leaf = doc.blocks.new(name="DOOR_LEAF")
+    leaf.add_lwpolyline([(0, 0), (900, 0), (900, 40), (0, 40)], close=True)
+
+    nested = doc.blocks.new(name="DOOR_NESTED_900")
+    nested.add_line((-450, 0), (450, 0))
+    nested.add_blockref("DOOR_LEAF", (-450, 0))
+
+
+# -----------------------------------------------------------
+# Генерация
+# -----------------------------------------------------------
+
+def _grid_size(spec: SyntheticPlanSpec) -> Tuple[int, int]:
+    # Ячеек должно хватить и на помещения, и на стены (по 2 стены на ячейку)
+    cells = max(spec.rooms, (spec.walls + spec.hatched_walls + 1) // 2, 1)
+    cols = max(1, int(math.ceil(math.sqrt(cells))))
+    rows = max(1, int(math.ceil(cells / cols)))
+    return cols, rows
+
+
+def _wall_axis(slot: int, cols: int, rows: int) -> Tuple[Tuple[float, float], Tuple[float, float], bool]:
+    """Осевая линия стены №slot: нижняя или левая грань ячейки сетки."""
+    cell = slot // 2
+    ci, cj = cell % cols, (cell // cols) % rows
+    x0, y0 = ci * CELL_W, cj * CELL_H
+    if slot % 2 == 0:
+        return (x0, y0), (x0 + CELL_W, y0), True
+    return (x0, y0), (x0, y0 + CELL_H), False
+
+
+def generate_plan(spec: SyntheticPlanSpec):
+    """Строит документ ezdxf по спецификации."""
+    rng = random.Random(spec.seed)
+    doc = ezdxf.new("R2010")
+    doc.header["$INSUNITS"] = 4  # мм
+    for name in (WALL_LAYER, HATCH_LAYER, ROOM_LAYER, TEXT_LAYER, WINDOW_LAYER, DOOR_LAYER):
+        doc.layers.add(name)
+    _define_blocks(doc)
+    msp = doc.modelspace()
+
+    cols, rows = _grid_size(spec)
+    half = WALL_THICKNESS / 2.0
+
+    # Слоты стен перемешиваем, чтобы порядок сущностей не был «идеальным»
+    slots = list(range(spec.walls + spec.hatched_walls))
+    rng.shuffle(slots)
+    wall_axes = []
+
+    # 1. Двухлинейные стены
+    for slot in slots[:spec.walls]:
+        (x1, y1), (x2, y2), horizontal = _wall_axis(slot, cols, rows)
+        # Небольшое укорочение, чтобы стены не сливались в углах в один контур
+        trim = rng.uniform(0.0, 150.0)
+        if horizontal:
+            x1, x2 = x1 + trim, x2 - trim
+            msp.add_line((x1, y1 - half), (x2, y2 - half), dxfattribs={"layer": WALL_LAYER})
+            msp.add_line((x1, y1 + half), (x2, y2 + half), dxfattribs={"layer": WALL_LAYER})
+        else:
+            y1, y2 = y1 + trim, y2 - trim
+            msp.add_line((x1 - half, y1), (x2 - half, y2), dxfattribs={"layer": WALL_LAYER})
+            msp.add_line((x1 + half, y1), (x2 + half, y2), dxfattribs={"layer": WALL_LAYER})
+        wall_axes.append(((x1, y1), (x2, y2), horizontal))
+
+    # 2. Стены, заданные штриховкой
+    for slot in slots[spec.walls:]:
+        (x1, y1), (x2, y2), horizontal = _wall_axis(slot, cols, rows)
+        if horizontal:
+            boundary = [(x1, y1 - half), (x2, y1 - half), (x2, y1 + half), (x1, y1 + half)]
+        else:
+            boundary = [(x1 - half, y1), (x1 + half, y1), (x1 + half, y2), (x1 - half, y2)]
+        hatch = msp.add_hatch(dxfattribs={"layer": HATCH_LAYER})
+        if rng.random() < 0.5:
+            hatch.set_pattern_fill("ANSI31", scale=10.0)
+        hatch.paths.add_polyline_path(boundary, is_closed=True)
+        wall_axes.append(((x1, y1), (x2, y2), horizontal))
+
+    # 3. Помещения: контур + подпись
+    for n in range(spec.rooms):
+        ci, cj = n % cols, (n // cols) % rows
+        x0, y0 = ci * CELL_W + half, cj * CELL_H + half
+        x1, y1 = x0 + CELL_W - WALL_THICKNESS, y0 + CELL_H - WALL_THICKNESS
+        msp.add_lwpolyline([(x0, y0), (x1, y0), (x1, y1), (x0, y1)], close=True,
+                           dxfattribs={"layer": ROOM_LAYER})
+        area_m2 = (x1 - x0) * (y1 - y0) / 1e6
+        msp.add_text(f"{100 + n} Комната {area_m2:.2f}",
+                     dxfattribs={"layer": TEXT_LAYER, "height": 250,
+                                 "insert": ((x0 + x1) / 2, (y0 + y1) / 2)})
+
+    # 4. Окна и двери на осях стен
+    def place(block: str, layer: str) -> None:
+        if not wall_axes:
+            return
+        (x1, y1), (x2, y2), horizontal = wall_axes[rng.randrange(len(wall_axes))]
+        t = rng.uniform(0.2, 0.8)
+        pos = (x1 + (x2 - x1) * t, y1 + (y2 - y1) * t)
+        msp.add_blockref(block, pos, dxfattribs={"layer": layer,
+                                                 "rotation": 0.0 if horizontal else 90.0})
+
+    for _ in range(spec.windows):
+        place("WINDOW_1200", WINDOW_LAYER)
+    for _ in range(spec.doors):
+        place("DOOR_900", DOOR_LAYER)
+    for _ in range(spec.nested_doors):
+        place("DOOR_NESTED_900", DOOR_LAYER)
+
+    return doc
+
+
+BENT_WALL_LENGTH = 10000.0
+BENT_WALL_ANGLE = 5.7                # излом между стенами, градусы
+BENT_FILLER_LINES = 199
+BENT_FILLER_LENGTH = 500.0
+
+
+def generate_bent_walls(seed: int = 0):
+    """Две касающиеся стены с изломом BENT_WALL_ANGLE и линии-«наполнитель» промежуточных углов."""
+    rng = random.Random(seed)
+    doc = ezdxf.new("R2010")
+    doc.header["$INSUNITS"] = 4  # мм
+    doc.layers.add(WALL_LAYER)
+    msp = doc.modelspace()
+    half = WALL_THICKNESS / 2.0
+
+    theta = math.radians(BENT_WALL_ANGLE)
+    corner = (BENT_WALL_LENGTH, 0.0)
+    for (x1, y1), angle in (((0.0, 0.0), 0.0), (corner, theta)):
+        ux, uy = math.cos(angle), math.sin(angle)
+        x2, y2 = x1 + ux * BENT_WALL_LENGTH, y1 + uy * BENT_WALL_LENGTH
+        for side in (-half, half):
+            nx, ny = -uy * side, ux * side
+            msp.add_line((x1 + nx, y1 + ny), (x2 + nx, y2 + ny), dxfattribs={"layer": WALL_LAYER})
+
+    # Наполнитель в стороне от стен: направления от 0 до излома с мелким шагом
+    for k in range(BENT_FILLER_LINES):
+        angle = theta * (k + 1) / (BENT_FILLER_LINES + 1)
+        x, y = 50000.0 + k * 300.0, 50000.0 + rng.uniform(0.0, 1000.0)
+        msp.add_line((x, y), (x + BENT_FILLER_LENGTH * math.cos(angle), y + BENT_FILLER_LENGTH * math.sin(angle)),
+                     dxfattribs={"layer": WALL_LAYER})
+    return doc
+
+
+def write_plan(spec: SyntheticPlanSpec, file_path: str) -> None:
+    generate_plan(spec).saveas(file_path)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Генератор синтетических DXF-планов.")
+    parser.add_argument("output", help="путь к создаваемому DXF")
+    parser.add_argument("--entities", type=int, default=None,
+                        help="целевое число сущностей (перекрывает счётчики ниже)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--bent-walls", action="store_true",
+                        help="регрессионная сцена generate_bent_walls вместо сетки помещений")
+    for field, default in asdict(SyntheticPlanSpec()).items():
+        if field != "seed":
+            parser.add_argument(f"--{field.replace('_', '-')}", type=int, default=default)
+    args = parser.parse_args(argv)
+
+    if args.bent_walls:
+        generate_bent_walls(args.seed).saveas(args.output)
+        print(f"Записан {args.output}: стены с изломом {BENT_WALL_ANGLE}°")
+        return 0
+    if args.entities is not None:
+        spec = spec_for_entities(args.entities, seed=args.seed)
+    else:
+        spec = SyntheticPlanSpec(
+            walls=args.walls, hatched_walls=args.hatched_walls, rooms=args.rooms,
+            windows=args.windows, doors=args.doors, nested_doors=args.nested_doors,
+            seed=args.seed,
+        )
+    write_plan(spec, args.output)
+    print(f"Записан {args.output}: {spec.entity_count} сущностей ({spec})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
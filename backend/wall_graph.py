@@ -4,6 +4,8 @@ from typing import List, Dict, Tuple
 import math
 import numpy as np  # <--- ДОЛЖЕН БЫТЬ ЭТОТ ИМПОРТ!
 
+from spatial_index import PointSnapper
+
 Point = tuple[float, float]
 
 @dataclass
@@ -24,30 +26,30 @@ class GraphSegment:
 class WallGraph:
     """
     Граф сегментов стен — объединяет сегменты по совпадающим концам
-    (с привязкой snap_eps).
+    (концы ближе snap_eps считаются одним узлом, см. spatial_index.PointSnapper).
     """
 
     def __init__(self, segments: List[GraphSegment], snap_eps: float = 1.0) -> None:
         self.segments = segments
         self.snap_eps = snap_eps
         self._adj: Dict[int, List[int]] = {}
+        self.nodes: List[Point] = []
         self._build()
 
-    def _snap(self, p: Point) -> Point:
-        x, y = p
-        k = self.snap_eps
-        return (round(x / k) * k, round(y / k) * k)
-
     def _build(self) -> None:
-        node_map: Dict[Point, List[int]] = {}
+        snapper = PointSnapper(self.snap_eps)
+        node_map: Dict[int, List[int]] = {}
 
         for seg in self.segments:
-            s = self._snap(seg.start)
-            e = self._snap(seg.end)
+            s = snapper.snap(seg.start)
+            e = snapper.snap(seg.end)
 
             node_map.setdefault(s, []).append(seg.index)
             node_map.setdefault(e, []).append(seg.index)
 
+        # Координаты узлов по их стабильным номерам
+        self.nodes = snapper.points
+
         # Строим список смежности
         for ids in node_map.values():
             for i in ids:
@@ -124,6 +126,11 @@ def get_segment_direction(seg: Segment) -> tuple[float, float]:
     dy = seg.end[1] - seg.start[1]
     return vector_normalize((dx, dy))
 
+# Допустимая толщина стены: в метрах и в миллиметрах. Дальше MAX_WALL_THICKNESS
+# пары не ищутся — это же ширина «полей» у плиток при поиске пар по частям
+WALL_THICKNESS_RANGES = ((0.08, 0.6), (80.0, 600.0))
+MAX_WALL_THICKNESS = max(hi for _, hi in WALL_THICKNESS_RANGES)
+
 def segments_are_parallel_and_collinear(seg1: Segment, seg2: Segment, angle_eps: float = 0.01, snap_eps: float = 1.0) -> bool:
     """Проверяет, параллельны ли сегменты и достаточно ли близки для толщины."""
     dir1 = get_segment_direction(seg1)
@@ -142,10 +149,7 @@ def segments_are_parallel_and_collinear(seg1: Segment, seg2: Segment, angle_eps:
     
     # Проверяем, что толщина лежит в реалистичных пределах (80мм до 600мм, как ты просил)
     # Поддерживаем и метры (0.08 - 0.6) и миллиметры (80 - 600)
-    if (0.08 < distance < 0.6) or (80 < distance < 600):
-        return True
-        
-    return False
+    return any(lo < distance < hi for lo, hi in WALL_THICKNESS_RANGES)
 
 # ВАЖНО: Не забудьте добавить import numpy в начало wall_graph.py,
 # если его там нет (хотя, ezdxf иногда тянет его за собой)